@@ -0,0 +1,407 @@
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from embedding_index import normalize_rows
+
+ANN_FORMAT_VERSION = 1
+
+# Below this many vectors a single list (exact search) is used
+MIN_TRAIN_SIZE = 1024
+
+
+def _kmeans(matrix: np.ndarray, nlist: int, iterations: int, seed: int) -> np.ndarray:
+    """Spherical k-means on unit rows. Returns nlist unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(matrix, centroids)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(matrix[order], starts[nonempty], axis=0)
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(~nonempty)
+        if empty.size:
+            sums[empty] = matrix[rng.choice(len(matrix), empty.size, replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """Nearest centroid (by inner product) for every row, computed in chunks."""
+    assignment = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), chunk):
+        assignment[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ centroids.T, axis=1)
+    return assignment
+
+
+class _InvertedList:
+    """Contiguous vectors of one cluster. Deletes swap the last row into the hole."""
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.thought_ids = np.zeros(capacity, dtype=np.int64)
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, thought_id: int, user_id: int, vector: np.ndarray) -> int:
+        if self.size == len(self.thought_ids):
+            capacity = max(16, 2 * self.size)
+            self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+            self.thought_ids = np.resize(self.thought_ids, capacity)
+            self.user_ids = np.resize(self.user_ids, capacity)
+        pos = self.size
+        self.vectors[pos] = vector
+        self.thought_ids[pos] = thought_id
+        self.user_ids[pos] = user_id
+        self.size += 1
+        return pos
+
+    def remove_at(self, pos: int) -> Optional[int]:
+        """Remove a row. Returns the thought id moved into pos, if any."""
+        last = self.size - 1
+        moved = None
+        if pos != last:
+            self.vectors[pos] = self.vectors[last]
+            self.thought_ids[pos] = self.thought_ids[last]
+            self.user_ids[pos] = self.user_ids[last]
+            moved = int(self.thought_ids[pos])
+        self.size = last
+        return moved
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over thought embeddings.
+
+    Vectors are clustered with spherical k-means into nlist lists. A search
+    scores the query against the centroids, then scans only the nprobe closest
+    lists, so cost grows with nprobe / nlist of the collection rather than
+    all of it. Raise nprobe for recall, lower it for latency. Small
+    collections use one list, which is exact.
+
+    Inserts go to the nearest existing centroid and deletes swap-remove, so
+    the index stays current without retraining. needs_retrain() reports when
+    the collection has grown well past what the centroids were trained on.
+    save()/load() persist centroids and lists for fast restarts;
+    save_if_changed() skips the write when nothing changed since the last one.
+    """
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, kmeans_iterations: int = 10,
+                 retrain_factor: float = 4.0, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self.retrain_factor = retrain_factor
+        self.seed = seed
+        self.model = None
+        self._lock = threading.RLock()
+        self._reset(None)
+        self._changes = 0  # bumped by every build, load, add and remove
+        self._saved_changes = 0
+
+        self._searches = 0
+        self._candidates_scanned = 0
+        self._search_seconds = 0.0
+
+    def _reset(self, dim: Optional[int]):
+        self._dim = dim
+        self._centroids = None
+        self._lists: List[_InvertedList] = [_InvertedList(dim)] if dim else []
+        self._where: Dict[int, Tuple[int, int]] = {}  # thought_id -> (list, position)
+        self._trained_size = 0
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def build(self, thought_ids, user_ids, matrix: np.ndarray, model: str = None):
+        """Train centroids on the given vectors and index all of them."""
+        matrix = normalize_rows(matrix) if len(matrix) else matrix
+        with self._lock:
+            self.model = model
+            self._changes += 1
+            if len(matrix) == 0:
+                self._reset(None)
+                return
+            self._reset(matrix.shape[1])
+            nlist = self.nlist or (1 if len(matrix) < MIN_TRAIN_SIZE else int(np.sqrt(len(matrix))))
+            nlist = max(1, min(nlist, len(matrix)))
+            if nlist > 1:
+                rng = np.random.default_rng(self.seed)
+                sample_size = min(len(matrix), nlist * 64)
+                sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+                self._centroids = _kmeans(sample, nlist, self.kmeans_iterations, self.seed)
+                self._lists = [_InvertedList(self._dim) for _ in range(nlist)]
+                assignment = _assign(matrix, self._centroids)
+            else:
+                assignment = np.zeros(len(matrix), dtype=np.int64)
+            self._trained_size = len(matrix)
+            self._bulk_insert(np.asarray(thought_ids), np.asarray(user_ids), matrix, assignment)
+
+    def needs_retrain(self) -> bool:
+        with self._lock:
+            size = len(self._where)
+            if self._centroids is None:
+                return self.nlist != 1 and size >= MIN_TRAIN_SIZE
+            return size > self.retrain_factor * self._trained_size
+
+    def add(self, thought_id: int, user_id: int, embedding):
+        """Insert (or replace) one thought."""
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32))[0]
+        with self._lock:
+            if self._dim is None:
+                self._reset(vector.shape[0])
+            elif vector.shape[0] != self._dim:
+                raise ValueError(f"Embedding dimension {vector.shape[0]} does not match index dimension {self._dim}")
+            self.remove(thought_id)
+            list_no = int(np.argmax(self._centroids @ vector)) if self._centroids is not None else 0
+            pos = self._lists[list_no].append(thought_id, user_id, vector)
+            self._where[thought_id] = (list_no, pos)
+            self._changes += 1
+
+    def remove(self, thought_id: int) -> bool:
+        with self._lock:
+            location = self._where.pop(thought_id, None)
+            if location is None:
+                return False
+            list_no, pos = location
+            moved = self._lists[list_no].remove_at(pos)
+            if moved is not None:
+                self._where[moved] = (list_no, pos)
+            self._changes += 1
+            return True
+
+    def remove_user(self, user_id: int) -> int:
+        with self._lock:
+            thought_ids = [
+                int(tid)
+                for inverted in self._lists
+                for tid in inverted.thought_ids[:inverted.size][inverted.user_ids[:inverted.size] == user_id]
+            ]
+            for thought_id in thought_ids:
+                self.remove(thought_id)
+            return len(thought_ids)
+
+    def reconcile(self, thought_ids, user_ids, matrix: np.ndarray):
+        """Bring a loaded index in line with the authoritative rows: drop stale ids, add missing ones."""
+        with self._lock:
+            wanted = {int(tid) for tid in thought_ids}
+            stale = [tid for tid in self._where if tid not in wanted]
+            for thought_id in stale:
+                self.remove(thought_id)
+            added = 0
+            for tid, uid, vector in zip(thought_ids, user_ids, matrix):
+                if int(tid) not in self._where:
+                    self.add(int(tid), int(uid), vector)
+                    added += 1
+            return len(stale), added
+
+    def similar_to_queries(self, queries: np.ndarray, threshold: float = -1.0, limit: int = 20,
+                           exclude_user_id: Optional[int] = None, nprobe: Optional[int] = None) -> List[tuple]:
+        """
+        (thought_id, score) pairs best first, where score is the highest cosine
+        similarity to any query row. Only the nprobe nearest lists per query are scanned.
+        """
+        scores, thought_ids, _ = self._scan(queries, exclude_user_id, nprobe)
+        if scores is None:
+            return []
+        best = scores.max(axis=1)
+        keep = best >= threshold
+        best, thought_ids = best[keep], thought_ids[keep]
+        if limit and best.size > limit:
+            top = np.argpartition(-best, limit - 1)[:limit]
+            best, thought_ids = best[top], thought_ids[top]
+        order = np.argsort(-best, kind='stable')
+        return list(zip(thought_ids[order].tolist(), best[order].tolist()))
+
+    def search(self, embedding, k: int = 10, threshold: float = -1.0, exclude_user_id: Optional[int] = None,
+               nprobe: Optional[int] = None) -> List[tuple]:
+        """Approximate top-k (thought_id, score) neighbours of one embedding."""
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        return self.similar_to_queries(query, threshold, k, exclude_user_id, nprobe)
+
+    def neighbour_users(self, queries: np.ndarray, per_query: int = 20, exclude_user_id: Optional[int] = None,
+                        nprobe: Optional[int] = None) -> Set[int]:
+        """Authors of the approximate top per_query neighbours of each query row."""
+        scores, _, owners = self._scan(queries, exclude_user_id, nprobe)
+        if scores is None:
+            return set()
+        if scores.shape[0] > per_query:
+            top = np.argpartition(-scores, per_query - 1, axis=0)[:per_query]
+            top = top[np.isfinite(np.take_along_axis(scores, top, axis=0))]
+            return set(np.unique(owners[top]).tolist())
+        return set(owners[np.isfinite(scores).any(axis=1)].tolist())
+
+    def _scan(self, queries: np.ndarray, exclude_user_id: Optional[int], nprobe: Optional[int]):
+        """
+        Score the probed lists against the queries: (scores, thought_ids, user_ids).
+        scores has one column per query; each query is only scored against its own
+        nprobe lists (-inf elsewhere), so several queries cost no more than each alone.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        started = time.perf_counter()
+        with self._lock:
+            if not self._where or len(queries) == 0:
+                return None, None, None
+            if self._centroids is not None:
+                nprobe = min(nprobe or self.nprobe, len(self._lists))
+                probe_scores = queries @ self._centroids.T
+                probed = np.argpartition(-probe_scores, nprobe - 1, axis=1)[:, :nprobe]
+            else:
+                probed = np.zeros((len(queries), 1), dtype=np.int64)
+
+            # list -> queries that probe it
+            query_nos = np.repeat(np.arange(len(queries)), probed.shape[1])
+            order = np.argsort(probed.ravel(), kind='stable')
+            list_nos, starts = np.unique(probed.ravel()[order], return_index=True)
+            groups = np.split(query_nos[order], starts[1:])
+            parts = [(self._lists[i], group) for i, group in zip(list_nos.tolist(), groups) if self._lists[i].size]
+            if not parts:
+                return None, None, None
+
+            total = sum(inverted.size for inverted, _ in parts)
+            scores = np.full((total, len(queries)), -np.inf, dtype=np.float32)
+            thought_ids = np.empty(total, dtype=np.int64)
+            owners = np.empty(total, dtype=np.int64)
+            offset = 0
+            for inverted, group in parts:
+                end = offset + inverted.size
+                block = inverted.vectors[:inverted.size] @ queries[group].T
+                if len(group) == len(queries):
+                    scores[offset:end] = block
+                else:
+                    scores[offset:end, group] = block
+                thought_ids[offset:end] = inverted.thought_ids[:inverted.size]
+                owners[offset:end] = inverted.user_ids[:inverted.size]
+                offset = end
+
+            self._searches += 1
+            self._candidates_scanned += total
+            self._search_seconds += time.perf_counter() - started
+
+        if exclude_user_id is not None:
+            keep = owners != exclude_user_id
+            scores, thought_ids, owners = scores[keep], thought_ids[keep], owners[keep]
+        if len(thought_ids) == 0:
+            return None, None, None
+        return scores, thought_ids, owners
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            sizes = [inverted.size for inverted in self._lists]
+            return {
+                'size': len(self._where),
+                'nlist': len(self._lists),
+                'nprobe': self.nprobe,
+                'trained_size': self._trained_size,
+                'largest_list': max(sizes) if sizes else 0,
+                'needs_retrain': self.needs_retrain(),
+                'unsaved_changes': self._changes - self._saved_changes,
+                'searches': self._searches,
+                'avg_candidates_scanned': round(self._candidates_scanned / self._searches, 1) if self._searches else 0.0,
+                'avg_search_ms': round(1000 * self._search_seconds / self._searches, 3) if self._searches else 0.0,
+            }
+
+    def save(self, path: str):
+        """Write centroids and lists to an .npz file (atomically replaced)."""
+        with self._lock:
+            changes = self._changes
+            if self._dim is None:
+                self._saved_changes = changes
+                return
+            parts = [inverted for inverted in self._lists]
+            list_nos = np.concatenate([np.full(p.size, i, dtype=np.int64) for i, p in enumerate(parts)])
+            payload = {
+                'version': np.array(ANN_FORMAT_VERSION),
+                'model': np.array(self.model or ''),
+                'trained_size': np.array(self._trained_size),
+                'nlist': np.array(len(parts)),
+                'centroids': self._centroids if self._centroids is not None else np.zeros((0, self._dim), np.float32),
+                'vectors': np.concatenate([p.vectors[:p.size] for p in parts]),
+                'thought_ids': np.concatenate([p.thought_ids[:p.size] for p in parts]),
+                'user_ids': np.concatenate([p.user_ids[:p.size] for p in parts]),
+                'list_nos': list_nos,
+            }
+        # Unique temp file in the target directory, so concurrent saves (e.g. two
+        # workers sharing the path) never write into each other's file
+        directory, name = os.path.split(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._saved_changes = max(self._saved_changes, changes)
+
+    def save_if_changed(self, path: str) -> bool:
+        """save() unless nothing changed since the last save or load. Returns True if written."""
+        with self._lock:
+            if self._changes == self._saved_changes:
+                return False
+        self.save(path)
+        return True
+
+    def load(self, path: str, model: str = None) -> bool:
+        """
+        Replace the contents with a saved index. Returns False (leaving the
+        index empty) if the file is missing, unreadable or built for another model.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != ANN_FORMAT_VERSION or (model and str(data['model']) != model):
+                    return False
+                centroids = data['centroids']
+                vectors = data['vectors']
+                thought_ids, user_ids, list_nos = data['thought_ids'], data['user_ids'], data['list_nos']
+                nlist, trained_size = int(data['nlist']), int(data['trained_size'])
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Could not load ANN index from {path}: {e}")
+            return False
+
+        with self._lock:
+            self.model = model
+            self._reset(vectors.shape[1])
+            if len(centroids):
+                self._centroids = centroids
+                self._lists = [_InvertedList(self._dim) for _ in range(nlist)]
+            self._trained_size = trained_size
+            self._bulk_insert(thought_ids, user_ids, vectors, list_nos)
+            self._changes += 1
+            self._saved_changes = self._changes
+        return True
+
+    def _bulk_insert(self, thought_ids: np.ndarray, user_ids: np.ndarray, matrix: np.ndarray, assignment: np.ndarray):
+        # Caller holds the lock
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=len(self._lists))
+        start = 0
+        for list_no, count in enumerate(counts):
+            rows = order[start:start + count]
+            start += count
+            inverted = self._lists[list_no]
+            capacity = max(16, int(count * 1.25))
+            inverted.vectors = np.zeros((capacity, self._dim), dtype=np.float32)
+            inverted.thought_ids = np.zeros(capacity, dtype=np.int64)
+            inverted.user_ids = np.zeros(capacity, dtype=np.int64)
+            inverted.vectors[:count] = matrix[rows]
+            inverted.thought_ids[:count] = thought_ids[rows]
+            inverted.user_ids[:count] = user_ids[rows]
+            inverted.size = int(count)
+            for pos, tid in enumerate(inverted.thought_ids[:count].tolist()):
+                self._where[tid] = (list_no, pos)
@@ -1,11 +1,37 @@
+# Socket.IO serves on eventlet when it is installed. Patch the standard library
+# before anything else is imported so threads, locks, sockets and sleeps used by
+# request handlers and background workers (embedding batcher, match worker) yield
+# to the event loop instead of blocking every connection. CPU-bound match scoring
+# is handed to native threads (match_worker.run_off_loop)
+try:
+    import eventlet
+    eventlet.monkey_patch()
+except ImportError:
+    pass
+
 from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-from database import Database
+from database import create_database, encode_cursor
 from embedding_service import EmbeddingService
-from auth_middleware import requires_auth, optional_auth
+from embedding_providers import create_provider
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from embedding_index import EmbeddingIndex
+from ann_index import IVFIndex
+from user_profiles import UserProfileIndex
+from match_worker import MatchRecomputeWorker
+from reembed import backfill_untracked_embeddings
+from auth_middleware import requires_auth, optional_auth, set_user_resolver, authenticate_socket, jwks_store, token_cache
+from user_cache import UserCache
+from socket_queue import create_client_manager
+from realtime import SocketRooms, FEED_ROOM, COALESCED_EVENTS, user_room, thought_room, conversation_room, thought_counts_event
+from emit_scheduler import EmitScheduler
 from typing import List, Dict
 import os
+import sys
+import signal
+import atexit
 import uuid
 import base64
 from werkzeug.utils import secure_filename
@@ -16,14 +42,132 @@ app = Flask(__name__)
 
 # CORS configuration - update with your Vercel domain after deployment
 allowed_origins = os.getenv('ALLOWED_ORIGINS', '*').split(',')
-CORS(app, resources={r"/api/*": {"origins": allowed_origins}})
+CORS(app, resources={r"/api/*": {"origins": allowed_origins}}, expose_headers=['X-Next-Cursor', 'X-Counts-Version'])
 
-# Initialize SocketIO with CORS support
+# Initialize SocketIO with CORS support. With SOCKETIO_MESSAGE_QUEUE set, several app
+# processes share rooms through the queue and any of them can emit to any socket.
+# Like events are paced per socket on delivery (rate/burst per second) and deferred
+# for sockets whose send queue is backed up
 cors_origins = os.getenv('ALLOWED_ORIGINS', '*')
-socketio = SocketIO(app, cors_allowed_origins=cors_origins)
-
-db = Database()
-embedding_service = EmbeddingService()
+socket_client_manager = create_client_manager(paced=True)
+socket_client_manager.configure_pacing(
+    events=COALESCED_EVENTS,
+    rate=float(os.getenv('SOCKET_EVENT_RATE', 20)),
+    burst=float(os.getenv('SOCKET_EVENT_BURST', 40)),
+    max_queued_packets=int(os.getenv('SOCKET_MAX_QUEUED_PACKETS', 64)),
+    max_deferred=int(os.getenv('SOCKET_MAX_DEFERRED_EVENTS', 200))
+)
+socketio = SocketIO(app, cors_allowed_origins=cors_origins, client_manager=socket_client_manager)
+
+# SQLite locally, PostgreSQL when DATABASE_URL is set
+db = create_database()
+
+# Optional startup check that reports full table scans in Database queries
+if os.getenv('CHECK_QUERY_PLANS', 'false').lower() == 'true' and not os.getenv('DATABASE_URL'):
+    from query_plan_check import check_query_plans, print_report
+    print_report(check_query_plans())
+
+# Embedding provider comes from EMBEDDING_PROVIDER (azure or local); with
+# EMBEDDING_FALLBACK=local, thoughts are still accepted when the provider fails
+embedding_fallback = create_provider('local') if os.getenv('EMBEDDING_FALLBACK', '').lower() == 'local' else None
+
+# Identical content is embedded once: in-process LRU backed by the embedding_cache table
+embedding_cache = EmbeddingCache(db, max_bytes=int(os.getenv('EMBEDDING_CACHE_MAX_MB', 64)) * 1024 * 1024)
+embedding_service = EmbeddingService(cache=embedding_cache, fallback=embedding_fallback)
+
+# Concurrent cache misses share one embeddings request (window in ms, up to max batch texts)
+embedding_batcher = EmbeddingBatcher(
+    embedding_service.provider,
+    max_batch_size=int(os.getenv('EMBEDDING_MAX_BATCH', 16)),
+    window_ms=float(os.getenv('EMBEDDING_BATCH_WINDOW_MS', 10)),
+    timeout=float(os.getenv('EMBEDDING_TIMEOUT_SECONDS', 30))
+)
+embedding_service.batcher = embedding_batcher
+
+# Thoughts stored before embedding_model was tracked are attributed once, to
+# LEGACY_EMBEDDING_MODEL or (dimension permitting) the current model; the rest
+# stay out of the index until `manage.py reembed`
+_attributed = backfill_untracked_embeddings(db, embedding_service, os.getenv('LEGACY_EMBEDDING_MODEL'))
+if _attributed:
+    print(f"Attributed {_attributed} untracked thought embeddings")
+
+# Load every thought embedding once; routes keep it in sync on create/delete
+embedding_index = EmbeddingIndex()
+# Only vectors from the current model are comparable; run `manage.py reembed` after switching
+embedding_index.load(db.get_all_thought_embeddings(model=embedding_service.model))
+
+# Approximate nearest-neighbour index for similar thoughts and thoughtmate candidates.
+# Reconciled with the database on start and retrained when stale. Saved after
+# startup, every ANN_SAVE_INTERVAL_SECONDS while it has changes, and on exit.
+ANN_INDEX_PATH = os.getenv('ANN_INDEX_PATH', 'ann_index.npz')
+ann_index = IVFIndex(
+    nlist=int(os.getenv('ANN_NLIST', 0)) or None,
+    nprobe=int(os.getenv('ANN_NPROBE', 8))
+)
+_matrix, _thought_ids, _user_ids = embedding_index.snapshot()
+if ann_index.load(ANN_INDEX_PATH, model=embedding_service.model) and ann_index.dim in (None, embedding_index.dim):
+    removed, added = ann_index.reconcile(_thought_ids, _user_ids, _matrix)
+    print(f"Loaded ANN index from {ANN_INDEX_PATH} ({removed} stale, {added} new thoughts)")
+    if ann_index.needs_retrain():
+        ann_index.build(_thought_ids, _user_ids, _matrix, model=embedding_service.model)
+else:
+    ann_index.build(_thought_ids, _user_ids, _matrix, model=embedding_service.model)
+try:
+    ann_index.save_if_changed(ANN_INDEX_PATH)
+except OSError as e:
+    print(f"[ANN] Could not save index to {ANN_INDEX_PATH}: {e}")
+atexit.register(ann_index.save_if_changed, ANN_INDEX_PATH)
+
+def save_ann_index_periodically(interval: float):
+    while True:
+        socketio.sleep(interval)
+        try:
+            ann_index.save_if_changed(ANN_INDEX_PATH)
+        except Exception as e:
+            print(f"[ANN] Periodic save failed: {e}")
+
+socketio.start_background_task(save_ann_index_periodically, float(os.getenv('ANN_SAVE_INTERVAL_SECONDS', 300)))
+
+# Platforms stop the process with SIGTERM, which skips atexit handlers by default;
+# exit the same way as Ctrl+C so the final index save runs
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+# Mean + sub-centroid profile per user, kept current on create/delete and stored in user_profiles
+user_profiles = UserProfileIndex(
+    db,
+    model=embedding_service.model,
+    sub_centroids=int(os.getenv('PROFILE_SUB_CENTROIDS', 3))
+)
+user_profiles.sync(_thought_ids, _user_ids, _matrix)
+del _matrix, _thought_ids, _user_ids
+
+# Thoughtmate matches are recomputed in the background, off the request path,
+# against candidates from the profile and ANN indexes
+match_worker = MatchRecomputeWorker(
+    db,
+    embedding_index,
+    embedding_service,
+    ann_index=ann_index,
+    user_profiles=user_profiles,
+    candidate_users=int(os.getenv('MATCH_CANDIDATE_USERS', 100))
+)
+match_worker.start()
+
+# Auth decorators resolve request.current_user through a short-lived auth0_id cache;
+# routes that change a user row invalidate it
+user_cache = UserCache(db.get_user_by_auth0_id, ttl=float(os.getenv('USER_CACHE_TTL_SECONDS', 30)))
+set_user_resolver(user_cache.get)
+
+# Sockets authenticate in the handshake and get events only for the rooms they joined
+socket_rooms = SocketRooms(socketio, db, authenticate_socket)
+
+# Like events are coalesced per thought and emitted once per flush interval (last count wins)
+emit_scheduler = EmitScheduler(
+    socketio,
+    flush_interval=float(os.getenv('SOCKET_FLUSH_INTERVAL_MS', 100)) / 1000,
+    delivery=socket_client_manager
+)
+emit_scheduler.start()
 
 # Avatar upload configuration
 UPLOAD_FOLDER = 'uploads/avatars'
@@ -31,6 +175,10 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 AVATAR_SIZE = (512, 512)
 
+# Feed pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -39,11 +187,39 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def health():
     return jsonify({'status': 'healthy'})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'matches': match_worker.get_metrics(),
+        'embedding_cache': embedding_cache.get_metrics(),
+        'embedding_batcher': embedding_batcher.get_metrics(),
+        'ann_index': ann_index.get_metrics(),
+        'user_profiles': user_profiles.get_metrics(),
+        'jwks': jwks_store.get_metrics(),
+        'token_cache': token_cache.get_metrics(),
+        'user_cache': user_cache.get_metrics(),
+        'sockets': socket_rooms.get_metrics(),
+        'socket_emits': emit_scheduler.get_metrics()
+    })
+
 # ========== Helper functions ==========
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def get_page_params():
+    """Read the keyset pagination cursor and page size from the query string"""
+    limit = request.args.get('limit', default=DEFAULT_PAGE_SIZE, type=int)
+    return request.args.get('cursor'), max(1, min(limit, MAX_PAGE_SIZE))
+
+def paginated_response(rows, limit, time_key='created_at'):
+    """JSON list response; a full page carries the next page's cursor in X-Next-Cursor"""
+    response = jsonify(rows)
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last[time_key], last['id'])
+    return response
+
 # ========== Upload endpoints ==========
 
 @app.route('/api/upload/avatar', methods=['POST'])
@@ -62,9 +238,7 @@ def upload_avatar():
         return jsonify({'error': 'Invalid file type. Allowed: jpg, png, gif, webp'}), 400
 
     # Get authenticated user
-    auth0_user = request.auth0_user
-    auth0_id = auth0_user.get('sub')
-    user = db.get_user_by_auth0_id(auth0_id)
+    user = request.current_user
 
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -105,6 +279,7 @@ def upload_avatar():
 
         # Store base64 data in database
         db.update_user_avatar_data(user['id'], img_base64)
+        user_cache.invalidate(user_id=user['id'])
 
         # Return data URL that frontend can use directly
         avatar_url = f"data:image/jpeg;base64,{img_base64}"
@@ -160,13 +335,12 @@ def auth_callback():
         email = f"{auth0_id}@auth0.local"
 
     # Check if user exists
-    user = db.get_user_by_auth0_id(auth0_id)
+    user = request.current_user
 
     if user:
         # Existing user - return their data
         # Get additional counts
-        thoughts = db.get_user_thoughts(user['id'])
-        user['thoughts_count'] = len(thoughts)
+        user['thoughts_count'] = db.count_user_thoughts(user['id'])
         thoughtmates = db.get_thoughtmates(user['id'])
         user['thoughtmates_count'] = len(thoughtmates)
         follow_counts = db.get_follow_counts(user['id'])
@@ -196,16 +370,12 @@ def auth_callback():
 @requires_auth
 def get_current_user():
     """Get current authenticated user"""
-    auth0_user = request.auth0_user
-    auth0_id = auth0_user.get('sub')
-
-    user = db.get_user_by_auth0_id(auth0_id)
+    user = request.current_user
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
     # Get additional counts
-    thoughts = db.get_user_thoughts(user['id'])
-    user['thoughts_count'] = len(thoughts)
+    user['thoughts_count'] = db.count_user_thoughts(user['id'])
     thoughtmates = db.get_thoughtmates(user['id'])
     user['thoughtmates_count'] = len(thoughtmates)
     follow_counts = db.get_follow_counts(user['id'])
@@ -217,10 +387,7 @@ def get_current_user():
 @requires_auth
 def complete_profile():
     """Complete user profile setup"""
-    auth0_user = request.auth0_user
-    auth0_id = auth0_user.get('sub')
-
-    user = db.get_user_by_auth0_id(auth0_id)
+    user = request.current_user
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
@@ -239,11 +406,11 @@ def complete_profile():
 
     # Update profile
     db.update_user_profile(user['id'], username, avatar_url, bio)
+    user_cache.invalidate(user_id=user['id'])
 
     # Get updated user
     updated_user = db.get_user(user['id'])
-    thoughts = db.get_user_thoughts(user['id'])
-    updated_user['thoughts_count'] = len(thoughts)
+    updated_user['thoughts_count'] = db.count_user_thoughts(user['id'])
     thoughtmates = db.get_thoughtmates(user['id'])
     updated_user['thoughtmates_count'] = len(thoughtmates)
     follow_counts = db.get_follow_counts(user['id'])
@@ -286,8 +453,7 @@ def get_user(user_id):
         return jsonify({'error': 'User not found'}), 404
 
     # Get user's thoughts count
-    thoughts = db.get_user_thoughts(user_id)
-    user['thoughts_count'] = len(thoughts)
+    user['thoughts_count'] = db.count_user_thoughts(user_id)
 
     # Get thoughtmates count
     thoughtmates = db.get_thoughtmates(user_id)
@@ -305,6 +471,7 @@ def update_user_bio(user_id):
     bio = data.get('bio', '')
 
     db.update_user_bio(user_id, bio)
+    user_cache.invalidate(user_id=user_id)
     return jsonify({'success': True})
 
 @app.route('/api/users', methods=['GET'])
@@ -330,60 +497,52 @@ def create_thought():
 
     # Generate embedding
     try:
-        embedding = embedding_service.get_embedding(content)
+        embedding, embedding_model = embedding_service.embed_for_storage(content)
     except Exception as e:
         return jsonify({'error': f'Failed to generate embedding: {str(e)}'}), 500
 
-    # Save thought
-    thought_id = db.create_thought(user_id, content, embedding)
-    print(f"[DEBUG] Thought {thought_id} created for user {user_id}, calling update_user_matches...")
-
-    # Update matches with other users
-    update_user_matches(user_id)
-    print(f"[DEBUG] Finished update_user_matches for user {user_id}")
+    # Save thought; fallback vectors stay out of the index until `manage.py reembed`
+    thought_id = db.create_thought(user_id, content, embedding, embedding_model)
+    if embedding_model == embedding_service.model:
+        try:
+            embedding_index.add(thought_id, user_id, embedding)
+            ann_index.add(thought_id, user_id, embedding)
+            user_profiles.add_thought(user_id, embedding)
+        except ValueError as e:
+            # The index holds vectors of another dimension; the thought is saved and
+            # joins the index once `manage.py reembed` has moved every thought over
+            print(f"Thought {thought_id} not indexed: {e}")
+
+    # Recompute matches with other users in the background
+    match_worker.enqueue(user_id)
 
     thought = db.get_thought(thought_id)
-    # Remove embedding from response
-    thought.pop('embedding', None)
-    thought['like_count'] = 0
-    thought['comment_count'] = 0
     thought['is_liked'] = False
     thought['is_saved'] = False
 
-    # Broadcast new thought to all clients
-    socketio.emit('thought_created', {'thought': thought})
+    # Notify feed subscribers and the author's other sessions
+    socketio.emit('thought_created', {'thought': thought}, to=[FEED_ROOM, user_room(user_id)])
 
     return jsonify(thought), 201
 
 @app.route('/api/thoughts', methods=['GET'])
 def get_all_thoughts():
     user_id = request.args.get('user_id', type=int)
+    cursor, limit = get_page_params()
 
-    thoughts = db.get_all_thoughts(user_id)
+    try:
+        thoughts = db.get_all_thoughts(user_id, cursor=cursor, limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
     # Calculate similarity scores if user_id is provided
     if user_id:
-        user_thoughts = db.get_user_thoughts(user_id)
-        if user_thoughts:
-            user_embeddings = [t['embedding'] for t in user_thoughts]
-
-            for thought in thoughts:
-                if thought['user_id'] != user_id:
-                    full_thought = db.get_thought(thought['id'])
-                    max_similarity = 0.0
-                    for user_embedding in user_embeddings:
-                        similarity = embedding_service.cosine_similarity(
-                            user_embedding,
-                            full_thought['embedding']
-                        )
-                        max_similarity = max(max_similarity, similarity)
-                    thought['similarity_score'] = max_similarity
-
-    # Remove embeddings from response
-    for thought in thoughts:
-        thought.pop('embedding', None)
+        scores = embedding_index.max_similarity_to_user(user_id, [t['id'] for t in thoughts])
+        for thought in thoughts:
+            if thought['id'] in scores:
+                thought['similarity_score'] = max(0.0, scores[thought['id']])
 
-    return jsonify(thoughts)
+    return paginated_response(thoughts, limit)
 
 @app.route('/api/thoughts/trending', methods=['GET'])
 def get_trending_thoughts():
@@ -392,10 +551,6 @@ def get_trending_thoughts():
 
     thoughts = db.get_trending_thoughts(user_id, hours)
 
-    # Remove embeddings from response
-    for thought in thoughts:
-        thought.pop('embedding', None)
-
     return jsonify(thoughts)
 
 @app.route('/api/thoughts/following', methods=['GET'])
@@ -405,13 +560,13 @@ def get_following_thoughts():
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    thoughts = db.get_following_thoughts(user_id)
-
-    # Remove embeddings from response
-    for thought in thoughts:
-        thought.pop('embedding', None)
+    cursor, limit = get_page_params()
+    try:
+        thoughts = db.get_following_thoughts(user_id, cursor=cursor, limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
-    return jsonify(thoughts)
+    return paginated_response(thoughts, limit)
 
 @app.route('/api/thoughts/<int:thought_id>', methods=['GET'])
 def get_thought_route(thought_id):
@@ -419,9 +574,6 @@ def get_thought_route(thought_id):
     if not thought:
         return jsonify({'error': 'Thought not found'}), 404
 
-    # Remove embedding from response
-    thought.pop('embedding', None)
-
     return jsonify(thought)
 
 @app.route('/api/thoughts/<int:thought_id>', methods=['DELETE'])
@@ -436,23 +588,28 @@ def delete_thought_route(thought_id):
     if not deleted:
         return jsonify({'error': 'Thought not found or not authorized'}), 404
 
-    # Broadcast deletion to all clients
+    if embedding_index.remove(thought_id):
+        user_profiles.rebuild_user(user_id, embedding_index.get_user_matrix(user_id))
+    ann_index.remove(thought_id)
+    match_worker.enqueue(user_id)
+
+    # Notify sockets showing the thought and the author's sessions
     socketio.emit('thought_deleted', {
         'thought_id': thought_id,
         'user_id': user_id
-    })
+    }, to=[thought_room(thought_id), user_room(user_id)])
 
     return jsonify({'success': True, 'message': 'Thought deleted successfully'})
 
 @app.route('/api/users/<int:user_id>/thoughts', methods=['GET'])
 def get_user_thoughts(user_id):
-    thoughts = db.get_user_thoughts(user_id)
-
-    # Remove embeddings from response
-    for thought in thoughts:
-        thought.pop('embedding', None)
+    cursor, limit = get_page_params()
+    try:
+        thoughts = db.get_user_thoughts(user_id, cursor=cursor, limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
-    return jsonify(thoughts)
+    return paginated_response(thoughts, limit)
 
 @app.route('/api/users/<int:user_id>/thoughts', methods=['DELETE'])
 def delete_all_user_thoughts_route(user_id):
@@ -467,12 +624,16 @@ def delete_all_user_thoughts_route(user_id):
         return jsonify({'error': 'Not authorized to delete thoughts for this user'}), 403
 
     count = db.delete_all_user_thoughts(user_id)
+    embedding_index.remove_user(user_id)
+    ann_index.remove_user(user_id)
+    user_profiles.remove_user(user_id)
+    match_worker.enqueue(user_id)
 
-    # Broadcast bulk deletion to all clients
+    # Notify feed subscribers and the author's sessions
     socketio.emit('thoughts_bulk_deleted', {
         'user_id': user_id,
         'count': count
-    })
+    }, to=[FEED_ROOM, user_room(user_id)])
 
     return jsonify({'success': True, 'message': f'Deleted {count} thoughts', 'count': count})
 
@@ -486,15 +647,17 @@ def like_thought(thought_id):
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    db.like_thought(thought_id, user_id)
+    counts = db.like_thought(thought_id, user_id)
+    if counts is None:
+        return jsonify({'error': 'Thought not found'}), 404
 
-    # Get updated thought data and broadcast to all clients
-    thoughts = db.get_all_thoughts(user_id)
-    thought = next((t for t in thoughts if t['id'] == thought_id), None)
-    if thought:
-        socketio.emit('thought_liked', {'thought_id': thought_id, 'thought': thought})
+    # Queue the new counts for sockets subscribed to the thought (coalesced per flush)
+    if counts['changed']:
+        emit_scheduler.emit('thought_liked', thought_counts_event(thought_id, user_id, counts),
+                           room=thought_room(thought_id), entity=thought_id)
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'like_count': counts['like_count'], 'comment_count': counts['comment_count'],
+                    'counts_version': counts['counts_version']})
 
 @app.route('/api/thoughts/<int:thought_id>/unlike', methods=['POST'])
 def unlike_thought(thought_id):
@@ -504,15 +667,17 @@ def unlike_thought(thought_id):
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    db.unlike_thought(thought_id, user_id)
+    counts = db.unlike_thought(thought_id, user_id)
+    if counts is None:
+        return jsonify({'error': 'Thought not found'}), 404
 
-    # Get updated thought data and broadcast to all clients
-    thoughts = db.get_all_thoughts(user_id)
-    thought = next((t for t in thoughts if t['id'] == thought_id), None)
-    if thought:
-        socketio.emit('thought_unliked', {'thought_id': thought_id, 'thought': thought})
+    # Queue the new counts for sockets subscribed to the thought (coalesced per flush)
+    if counts['changed']:
+        emit_scheduler.emit('thought_unliked', thought_counts_event(thought_id, user_id, counts),
+                           room=thought_room(thought_id), entity=thought_id)
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'like_count': counts['like_count'], 'comment_count': counts['comment_count'],
+                    'counts_version': counts['counts_version']})
 
 @app.route('/api/thoughts/<int:thought_id>/likes', methods=['GET'])
 def get_thought_likes(thought_id):
@@ -531,21 +696,32 @@ def create_comment(thought_id):
         return jsonify({'error': 'user_id and content are required'}), 400
 
     comment_id = db.create_comment(thought_id, user_id, content)
-    comments = db.get_thought_comments(thought_id)
-
-    # Find the comment we just created
-    comment = next((c for c in comments if c['id'] == comment_id), None)
+    if comment_id is None:
+        return jsonify({'error': 'Thought not found'}), 404
+    comment = db.get_comment(comment_id)
 
-    # Broadcast the new comment to all clients
+    # Send the new comment and counts to sockets subscribed to the thought
     if comment:
-        socketio.emit('comment_posted', {'thought_id': thought_id, 'comment': comment})
+        counts = {
+            'like_count': comment.pop('thought_like_count'),
+            'comment_count': comment.pop('thought_comment_count'),
+            'counts_version': comment.pop('thought_counts_version'),
+        }
+        socketio.emit('comment_posted', thought_counts_event(thought_id, user_id, counts, comment=comment),
+                      to=thought_room(thought_id))
 
     return jsonify(comment), 201
 
 @app.route('/api/thoughts/<int:thought_id>/comments', methods=['GET'])
 def get_thought_comments(thought_id):
+    # Read the counter version first: every comment_posted event at or below it
+    # is already reflected in the list, so clients can skip those
+    thought = db.get_thought(thought_id)
     comments = db.get_thought_comments(thought_id)
-    return jsonify(comments)
+    response = jsonify(comments)
+    if thought:
+        response.headers['X-Counts-Version'] = str(thought['counts_version'])
+    return response
 
 @app.route('/api/comments/<int:comment_id>', methods=['DELETE'])
 def delete_comment(comment_id):
@@ -614,7 +790,8 @@ def save_thought(thought_id):
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    db.save_thought(user_id, thought_id)
+    if not db.save_thought(user_id, thought_id):
+        return jsonify({'error': 'Thought not found'}), 404
     return jsonify({'success': True})
 
 @app.route('/api/thoughts/<int:thought_id>/unsave', methods=['POST'])
@@ -630,13 +807,13 @@ def unsave_thought(thought_id):
 
 @app.route('/api/users/<int:user_id>/saved', methods=['GET'])
 def get_saved_thoughts(user_id):
-    thoughts = db.get_saved_thoughts(user_id)
-
-    # Remove embeddings from response
-    for thought in thoughts:
-        thought.pop('embedding', None)
+    cursor, limit = get_page_params()
+    try:
+        thoughts = db.get_saved_thoughts(user_id, cursor=cursor, limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
-    return jsonify(thoughts)
+    return paginated_response(thoughts, limit, time_key='saved_at')
 
 # ========== Thoughtmates endpoints ==========
 
@@ -647,8 +824,7 @@ def get_thoughtmates(user_id):
 
     # Add thought counts for each thoughtmate
     for tm in thoughtmates:
-        thoughts = db.get_user_thoughts(tm['id'])
-        tm['thoughts_count'] = len(thoughts)
+        tm['thoughts_count'] = db.count_user_thoughts(tm['id'])
 
     return jsonify(thoughtmates)
 
@@ -657,36 +833,22 @@ def get_similar_thoughts(user_id):
     """Get thoughts similar to a user's thoughts."""
     threshold = request.args.get('threshold', default=0.7, type=float)
 
-    user_thoughts = db.get_user_thoughts(user_id)
-    if not user_thoughts:
+    # Scan only the ANN lists nearest to the user's thoughts, keeping the top 20
+    similar = ann_index.similar_to_queries(
+        embedding_index.get_user_matrix(user_id),
+        threshold,
+        limit=20,
+        exclude_user_id=user_id
+    )
+    if not similar:
         return jsonify([])
 
-    all_thoughts = db.get_all_thoughts()
-
-    # Filter out user's own thoughts
-    other_thoughts = [t for t in all_thoughts if t['user_id'] != user_id]
-
-    similar_thoughts = []
-    for user_thought in user_thoughts:
-        similar = embedding_service.find_similar_thoughts(
-            user_thought['embedding'],
-            other_thoughts,
-            threshold
-        )
-        similar_thoughts.extend(similar)
-
-    # Remove duplicates and sort by similarity
-    seen = set()
-    unique_similar = []
-    for thought in similar_thoughts:
-        if thought['id'] not in seen:
-            seen.add(thought['id'])
-            thought.pop('embedding', None)
-            unique_similar.append(thought)
-
-    unique_similar.sort(key=lambda x: x['similarity_score'], reverse=True)
+    scores = dict(similar)
+    thoughts = db.get_thoughts_by_ids([thought_id for thought_id, _ in similar])
+    for thought in thoughts:
+        thought['similarity_score'] = scores[thought['id']]
 
-    return jsonify(unique_similar[:20])  # Return top 20
+    return jsonify(thoughts)
 
 # ========== Chat/Messaging endpoints ==========
 
@@ -714,8 +876,19 @@ def get_messages(conversation_id):
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    messages = db.get_conversation_messages(conversation_id, user_id)
-    return jsonify(messages)
+    # Windows by message id: since_id catches up after the newest message the client
+    # has, before_id pages back through older history
+    since_id = request.args.get('since_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = max(1, min(request.args.get('limit', default=DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+    messages = db.get_conversation_messages(conversation_id, user_id, since_id=since_id,
+                                            before_id=before_id, limit=limit)
+    response = jsonify(messages)
+    # A full page of history has older messages before it; fetch them with before_id
+    if since_id is None and len(messages) == limit:
+        response.headers['X-Next-Cursor'] = str(messages[0]['id'])
+    return response
 
 @app.route('/api/conversations/<int:conversation_id>/messages', methods=['POST'])
 def send_message(conversation_id):
@@ -726,18 +899,22 @@ def send_message(conversation_id):
     if not sender_id or not content:
         return jsonify({'error': 'sender_id and content are required'}), 400
 
-    message_id = db.send_message(conversation_id, sender_id, content)
+    # Check if sender exists and is part of this conversation
+    if not db.get_user(sender_id):
+        return jsonify({'error': 'User not found'}), 404
+    if not db.is_conversation_member(conversation_id, sender_id):
+        return jsonify({'error': 'Not authorized to send messages in this conversation'}), 403
 
-    # Get the message we just created
-    messages = db.get_conversation_messages(conversation_id, sender_id)
-    message = next((m for m in messages if m['id'] == message_id), None)
+    message = db.send_message(conversation_id, sender_id, content)
+    if message is None:
+        return jsonify({'error': 'User not found'}), 404
 
-    # Broadcast the new message to all clients in real-time
-    if message:
-        socketio.emit('message_sent', {
-            'conversation_id': conversation_id,
-            'message': message
-        })
+    # Deliver to the open conversation and to both members' sessions (chat list, unread badge)
+    member_rooms = [user_room(member_id) for member_id in db.get_conversation_member_ids(conversation_id)]
+    socketio.emit('message_sent', {
+        'conversation_id': conversation_id,
+        'message': message
+    }, to=[conversation_room(conversation_id)] + member_rooms)
 
     return jsonify(message), 201
 
@@ -750,25 +927,19 @@ def clear_conversation_messages(conversation_id):
         return jsonify({'error': 'user_id is required'}), 400
 
     # Verify user is part of this conversation
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT * FROM conversations WHERE id = ? AND (user1_id = ? OR user2_id = ?)',
-        (conversation_id, user_id, user_id)
-    )
-    conversation = cursor.fetchone()
-    conn.close()
-
-    if not conversation:
+    if not db.is_conversation_member(conversation_id, user_id):
         return jsonify({'error': 'Conversation not found or not authorized'}), 404
 
+    member_ids = db.get_conversation_member_ids(conversation_id)
+
     # Delete the conversation entirely (CASCADE will delete messages)
     db.delete_conversation(conversation_id)
 
-    # Broadcast conversation deletion to all clients
+    # Notify both members, then drop the conversation's room
     socketio.emit('conversation_deleted', {
         'conversation_id': conversation_id
-    })
+    }, to=[conversation_room(conversation_id)] + [user_room(member_id) for member_id in member_ids])
+    socketio.close_room(conversation_room(conversation_id))
 
     return jsonify({'success': True, 'message': 'Conversation deleted successfully'})
 
@@ -777,44 +948,6 @@ def get_unread_count(user_id):
     count = db.get_unread_message_count(user_id)
     return jsonify({'unread_count': count})
 
-# ========== Helper functions ==========
-
-def update_user_matches(user_id: int):
-    """Update similarity scores between a user and all other users."""
-    print(f"[DEBUG] Updating matches for user {user_id}")
-    user_thoughts = db.get_user_thoughts(user_id)
-    print(f"[DEBUG] User {user_id} has {len(user_thoughts)} thoughts")
-    if not user_thoughts:
-        print(f"[DEBUG] No thoughts for user {user_id}, skipping")
-        return
-
-    all_users = db.get_all_users()
-    print(f"[DEBUG] Found {len(all_users)} users in database")
-
-    for other_user in all_users:
-        if other_user['id'] == user_id:
-            continue
-
-        other_thoughts = db.get_user_thoughts(other_user['id'])
-        print(f"[DEBUG] User {other_user['id']} has {len(other_thoughts)} thoughts")
-        if not other_thoughts:
-            continue
-
-        # Calculate similarity
-        similarity = embedding_service.calculate_user_similarity(
-            user_thoughts,
-            other_thoughts
-        )
-        print(f"[DEBUG] Similarity between user {user_id} and {other_user['id']}: {similarity:.4f}")
-
-        # Update matches in both directions
-        if similarity > 0.25:  # Only store meaningful matches (lowered from 0.5)
-            print(f"[DEBUG] Creating match (similarity {similarity:.4f} > 0.25 threshold)")
-            db.create_or_update_match(user_id, other_user['id'], similarity)
-            db.create_or_update_match(other_user['id'], user_id, similarity)
-        else:
-            print(f"[DEBUG] Skipping match (similarity {similarity:.4f} <= 0.25 threshold)")
-
 if __name__ == '__main__':
     # Use PORT environment variable for production (Railway sets this)
     port = int(os.getenv('PORT', 5001))
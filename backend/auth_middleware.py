@@ -2,8 +2,9 @@ import os
 from functools import wraps
 from flask import request, jsonify
 from jose import jwt, JWTError
-import requests
 from dotenv import load_dotenv
+from jwks_store import JWKSKeyStore
+from token_cache import VerifiedTokenCache
 
 load_dotenv()
 
@@ -11,24 +12,31 @@ AUTH0_DOMAIN = os.getenv('AUTH0_DOMAIN')
 AUTH0_AUDIENCE = os.getenv('AUTH0_AUDIENCE')
 ALGORITHMS = [os.getenv('AUTH0_ALGORITHMS', 'RS256')]
 
-# Cache for Auth0 public keys
-_jwks_cache = None
-
-def get_auth0_public_key():
-    """Fetch Auth0 public keys for JWT verification"""
-    global _jwks_cache
-    if _jwks_cache:
-        return _jwks_cache
-
-    jwks_url = f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'
-    try:
-        response = requests.get(jwks_url)
-        response.raise_for_status()
-        _jwks_cache = response.json()
-        return _jwks_cache
-    except Exception as e:
-        print(f"Error fetching Auth0 public keys: {e}")
+# Signing keys, constructed once per kid and refreshed after JWKS_TTL_SECONDS.
+# AUTH0_JWKS_URL can point at a local JWKS file server for testing.
+jwks_store = JWKSKeyStore(
+    os.getenv('AUTH0_JWKS_URL') or f'https://{AUTH0_DOMAIN}/.well-known/jwks.json',
+    ALGORITHMS,
+    ttl=float(os.getenv('JWKS_TTL_SECONDS', 600)),
+    timeout=float(os.getenv('JWKS_TIMEOUT_SECONDS', 5))
+)
+
+# Decoded payloads of verified tokens, kept until each token's exp
+token_cache = VerifiedTokenCache(int(os.getenv('TOKEN_CACHE_SIZE', 10000)))
+
+# Maps an auth0_id to the local user row; set by the app (see set_user_resolver)
+_user_resolver = None
+
+def set_user_resolver(resolver):
+    """Resolve request.current_user with resolver(auth0_id) in the auth decorators"""
+    global _user_resolver
+    _user_resolver = resolver
+
+def resolve_current_user(payload):
+    """Local user for a verified token payload, or None"""
+    if not payload or _user_resolver is None:
         return None
+    return _user_resolver(payload.get('sub'))
 
 def get_token_from_header():
     """Extract token from Authorization header"""
@@ -48,28 +56,15 @@ def get_token_from_header():
 
 def verify_token(token):
     """Verify and decode JWT token"""
-    try:
-        jwks = get_auth0_public_key()
-        if not jwks:
-            return None
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
 
+    try:
         # Get the key id from the token header
         unverified_header = jwt.get_unverified_header(token)
-        rsa_key = {}
-
-        # Find the matching key
-        for key in jwks['keys']:
-            if key['kid'] == unverified_header['kid']:
-                rsa_key = {
-                    'kty': key['kty'],
-                    'kid': key['kid'],
-                    'use': key['use'],
-                    'n': key['n'],
-                    'e': key['e']
-                }
-                break
-
-        if not rsa_key:
+        rsa_key = jwks_store.get_key(unverified_header.get('kid'))
+        if rsa_key is None:
             return None
 
         # Verify and decode the token
@@ -80,6 +75,7 @@ def verify_token(token):
             audience=AUTH0_AUDIENCE,
             issuer=f'https://{AUTH0_DOMAIN}/'
         )
+        token_cache.put(token, payload)
         return payload
 
     except JWTError as e:
@@ -103,6 +99,7 @@ def requires_auth(f):
 
         # Add user info to request context
         request.auth0_user = payload
+        request.current_user = resolve_current_user(payload)
         return f(*args, **kwargs)
 
     return decorated_function
@@ -120,7 +117,15 @@ def optional_auth(f):
                 request.auth0_user = None
         else:
             request.auth0_user = None
+        request.current_user = resolve_current_user(request.auth0_user)
 
         return f(*args, **kwargs)
 
     return decorated_function
+
+def authenticate_socket(auth):
+    """Local user for a Socket.IO handshake whose auth data carries {'token': <access token>}, or None"""
+    token = auth.get('token') if isinstance(auth, dict) else None
+    if not token:
+        return None
+    return resolve_current_user(verify_token(token))
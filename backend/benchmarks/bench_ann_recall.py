@@ -0,0 +1,108 @@
+"""
+Benchmark IVFIndex recall and latency against brute-force cosine search.
+
+Generates clustered synthetic embeddings (topics plus per-thought noise,
+owned by random users), builds the IVF index and, for several nprobe
+values, compares it with an exact matrix product on two workloads:
+
+  thought  - top-k neighbours of a single thought embedding
+  user     - top-k thoughts closest to any of a user's thoughts
+             (the similar-thoughts route)
+
+Reports recall@k, mean query latency and speedup over brute force, plus
+build, save and load times.
+
+Usage (from backend/):
+    python benchmarks/bench_ann_recall.py [--thoughts 100000] [--dim 256] [--k 20] [--nprobe 1 4 8 16 32]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex  # noqa: E402
+from embedding_index import normalize_rows  # noqa: E402
+
+
+def make_dataset(n, dim, topics, users, seed):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    topic_of = rng.integers(0, topics, n)
+    matrix = normalize_rows(centres[topic_of] + 0.9 * rng.standard_normal((n, dim)).astype(np.float32))
+    thought_ids = np.arange(1, n + 1, dtype=np.int64)
+    user_ids = rng.integers(1, users + 1, n).astype(np.int64)
+    return matrix, thought_ids, user_ids
+
+
+def brute_force(matrix, thought_ids, user_ids, queries, k, exclude_user_id):
+    scores = (matrix @ queries.T).max(axis=1)
+    scores[user_ids == exclude_user_id] = -np.inf
+    top = np.argpartition(-scores, k - 1)[:k]
+    return set(thought_ids[top].tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--thoughts', type=int, default=100_000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    matrix, thought_ids, user_ids = make_dataset(args.thoughts, args.dim, args.topics, args.users, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+
+    index = IVFIndex(nlist=args.nlist)
+    started = time.perf_counter()
+    index.build(thought_ids, user_ids, matrix)
+    build_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ann_index.npz')
+        started = time.perf_counter()
+        index.save(path)
+        save_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        IVFIndex().load(path)
+        load_seconds = time.perf_counter() - started
+
+    print(f"{args.thoughts} thoughts, dim {args.dim}, nlist {index.get_metrics()['nlist']}: "
+          f"build {build_seconds:.2f}s, save {save_seconds:.2f}s, load {load_seconds:.2f}s")
+
+    workloads = {}
+    rows = rng.choice(args.thoughts, args.queries, replace=False)
+    workloads['thought'] = [(matrix[[row]], int(user_ids[row])) for row in rows]
+    workloads['user'] = [
+        (matrix[user_ids == user_id], int(user_id))
+        for user_id in rng.choice(np.unique(user_ids), args.queries, replace=False)
+    ]
+
+    print(f"{'workload':<9} {'nprobe':>6} {'recall@k':>9} {'ann ms':>8} {'exact ms':>9} {'speedup':>8}")
+    for name, queries in workloads.items():
+        started = time.perf_counter()
+        truth = [brute_force(matrix, thought_ids, user_ids, q, args.k, uid) for q, uid in queries]
+        exact_ms = 1000 * (time.perf_counter() - started) / len(queries)
+
+        for nprobe in args.nprobe:
+            hits = 0
+            started = time.perf_counter()
+            results = [index.similar_to_queries(q, limit=args.k, exclude_user_id=uid, nprobe=nprobe) for q, uid in queries]
+            ann_ms = 1000 * (time.perf_counter() - started) / len(queries)
+            for expected, found in zip(truth, results):
+                hits += len(expected & {thought_id for thought_id, _ in found})
+            recall = hits / (len(queries) * args.k)
+            print(f"{name:<9} {nprobe:>6} {recall:>9.3f} {ann_ms:>8.3f} {exact_ms:>9.3f} {exact_ms / ann_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark embedding micro-batching against a stub embeddings server.
+
+Starts a FakeEmbeddingServer (fixed per-request latency, Azure OpenAI URL
+layout) and drives it with the real openai client from 1, 10 and 100
+concurrent "posters", each embedding unique texts in a loop. Compares one
+request per text (EmbeddingService alone) with EmbeddingBatcher, reporting
+embeddings/sec, HTTP requests made, p50/p99 call latency and failed calls.
+The stub only serves --server-concurrency requests at once, standing in for
+the per-deployment rate limit.
+
+Usage (from backend/):
+    python benchmarks/bench_embedding_batching.py [--seconds 5] [--posters 1 10 100] [--latency-ms 50]
+"""
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AzureOpenAI  # noqa: E402
+from embedding_batcher import EmbeddingBatcher  # noqa: E402
+from embedding_providers import AzureOpenAIProvider  # noqa: E402
+from embedding_service import EmbeddingService  # noqa: E402
+from fake_embeddings import FakeEmbeddingServer  # noqa: E402
+
+DEPLOYMENT = 'bench-embeddings'
+
+
+def make_client(server):
+    return AzureOpenAI(
+        api_version='2024-12-01-preview',
+        azure_endpoint=server.url,
+        api_key='bench',
+        max_retries=0,
+    )
+
+
+def run(service, posters, seconds):
+    latencies = []
+    counter = itertools.count()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    errors = [0]
+
+    def poster():
+        local = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                service.get_embedding(f'benchmark thought {next(counter)}')
+            except Exception:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=poster) for _ in range(posters)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    return len(latencies) / elapsed, p50 * 1000, p99 * 1000, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--posters', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--server-concurrency', type=int, default=8,
+                        help='requests the stub serves at once, standing in for the API rate limit')
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--window-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    server = FakeEmbeddingServer(latency_ms=args.latency_ms, per_item_ms=0.2, dim=256,
+                                 max_concurrency=args.server_concurrency).start()
+    print(f"{'mode':<10} {'posters':>7} {'emb/s':>9} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    try:
+        for posters in args.posters:
+            for mode in ('single', 'batched'):
+                provider = AzureOpenAIProvider(make_client(server), DEPLOYMENT)
+                batcher = None
+                if mode == 'batched':
+                    batcher = EmbeddingBatcher(provider, max_batch_size=args.max_batch, window_ms=args.window_ms)
+                service = EmbeddingService(provider=provider, batcher=batcher)
+                requests_before = server.requests
+                rate, p50, p99, errors = run(service, posters, args.seconds)
+                if batcher:
+                    batcher.stop()
+                requests = server.requests - requests_before
+                print(f"{mode:<10} {posters:>7} {rate:>9.1f} {requests:>9} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
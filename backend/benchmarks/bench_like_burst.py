@@ -0,0 +1,116 @@
+"""
+Benchmark Socket.IO delivery of a like burst on one popular thought.
+
+Registers --connections simulated sockets in one socketio.Server with a
+PacedDelivery manager, all subscribed to the thought's room. --likes like
+events are produced evenly over --seconds, and outgoing Engine.IO packets
+are encoded but counted instead of sent. Two modes are compared:
+
+  direct     every like is emitted immediately to the room (no pacing)
+  scheduled  likes go through EmitScheduler (coalesced per flush interval)
+             and PacedDelivery (per-socket rate and burst)
+
+Reports packets sent, time spent emitting (a proxy for event loop time),
+and whether every socket ended with the final like count.
+
+Usage (from backend/):
+    python benchmarks/bench_like_burst.py [--connections 1000] [--likes 2000] [--seconds 2]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio  # noqa: E402
+from emit_scheduler import EmitScheduler, PacedDelivery  # noqa: E402
+from realtime import COALESCED_EVENTS, thought_room  # noqa: E402
+
+
+class CountingServer(socketio.Server):
+    """socketio.Server that encodes Engine.IO packets and records the last one per socket."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lock = threading.Lock()
+        self.packets = 0
+        self.last = {}
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        encoded = eio_pkt.encode()
+        with self.lock:
+            self.packets += 1
+            self.last[eio_sid] = encoded
+
+
+def start_server(connections: int, paced: bool, args):
+    manager = PacedDelivery()
+    if paced:
+        manager.configure_pacing(events=COALESCED_EVENTS, rate=args.rate, burst=args.burst)
+    server = CountingServer(client_manager=manager, async_mode='threading')
+    server.manager_initialized = True
+    manager.initialize()
+    for i in range(connections):
+        sid = manager.connect(f'eio-{i}', '/')
+        manager.enter_room(sid, '/', thought_room(1))
+    return server, manager
+
+
+def run(mode: str, args):
+    paced = mode == 'scheduled'
+    server, manager = start_server(args.connections, paced, args)
+    scheduler = EmitScheduler(server, flush_interval=args.flush_ms / 1000, delivery=manager) if paced else None
+    if scheduler:
+        scheduler.start()
+
+    interval = args.seconds / args.likes
+    emit_seconds = 0.0
+    started = time.perf_counter()
+    for count in range(1, args.likes + 1):
+        payload = {'v': 1, 'thought_id': 1, 'actor_id': count, 'like_count': count, 'comment_count': 0}
+        t0 = time.perf_counter()
+        if scheduler:
+            scheduler.emit('thought_liked', payload, room=thought_room(1), entity=1)
+        else:
+            server.emit('thought_liked', payload, to=thought_room(1))
+        emit_seconds += time.perf_counter() - t0
+        delay = started + count * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    if scheduler:
+        # Let deferred events drain, then measure the scheduler's own time
+        deadline = time.perf_counter() + 5
+        while time.perf_counter() < deadline and (scheduler.get_metrics()['pending']
+                                                  or manager.get_pacing_metrics()['deferred_pending']):
+            time.sleep(args.flush_ms / 1000)
+        scheduler.stop()
+        emit_seconds += scheduler.get_metrics()['flush_seconds']
+
+    final = f'"like_count":{args.likes},'
+    current = sum(1 for packet in server.last.values() if final in packet)
+    print(f"{mode:9}  {server.packets:>10,} packets  emit {emit_seconds * 1000:9.1f} ms  "
+          f"{current}/{args.connections} sockets current")
+    if scheduler:
+        print(f"           {scheduler.get_metrics()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--likes', type=int, default=2000)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--flush-ms', type=float, default=100)
+    parser.add_argument('--rate', type=float, default=20)
+    parser.add_argument('--burst', type=float, default=40)
+    args = parser.parse_args()
+
+    print(f"{args.connections} sockets, {args.likes} likes over {args.seconds}s")
+    for mode in ('direct', 'scheduled'):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
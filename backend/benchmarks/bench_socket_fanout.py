@@ -0,0 +1,154 @@
+"""
+Benchmark Socket.IO event delivery latency across workers sharing a message queue.
+
+Starts --workers socketio.Server instances in one process, each with a
+LocalPubSubManager on the same bus, so they behave like app processes
+sharing Redis. Simulated connections are registered directly with the
+worker managers (round-robin) and every connection joins the feed room and
+its own user room. Outgoing Engine.IO packets are encoded but recorded
+instead of written to a transport.
+
+Events are emitted from worker 0, as a REST request would, and two
+workloads are measured for each connection count:
+
+  room  - one event to the feed room, delivered to every connection
+  user  - one event to a random user room (a single connection, usually
+          on another worker)
+
+Reports p50/p99 latency until the last socket has the event and the
+delivery rate.
+
+Usage (from backend/):
+    python benchmarks/bench_socket_fanout.py [--connections 1000 10000] [--workers 4] [--events 20]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio  # noqa: E402
+from realtime import FEED_ROOM, user_room  # noqa: E402
+from socket_queue import LocalMessageBus, LocalPubSubManager  # noqa: E402
+
+
+class DeliveryCounter:
+    """Counts packets delivered for the current event and signals when all arrived."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._expected = 0
+        self._delivered = 0
+        self._done = threading.Event()
+        self.finished_at = None
+
+    def expect(self, count: int):
+        with self._lock:
+            self._expected = count
+            self._delivered = 0
+            self._done.clear()
+
+    def delivered(self):
+        with self._lock:
+            self._delivered += 1
+            if self._delivered == self._expected:
+                self.finished_at = time.perf_counter()
+                self._done.set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._done.wait(timeout)
+
+
+class RecordingServer(socketio.Server):
+    """socketio.Server that encodes Engine.IO packets but records them instead of sending."""
+
+    def __init__(self, counter: DeliveryCounter, **kwargs):
+        super().__init__(**kwargs)
+        self.counter = counter
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        eio_pkt.encode()
+        self.counter.delivered()
+
+
+def start_workers(count: int, counter: DeliveryCounter):
+    bus = LocalMessageBus()
+    workers = []
+    for _ in range(count):
+        manager = LocalPubSubManager(channel='bench', bus=bus)
+        server = RecordingServer(counter, client_manager=manager, async_mode='threading')
+        server.manager_initialized = True
+        manager.initialize()
+        workers.append(server)
+    return workers
+
+
+def connect(workers, connections: int):
+    """Register connections round-robin; connection i is user i."""
+    for i in range(connections):
+        server = workers[i % len(workers)]
+        sid = server.manager.connect(f'eio-{i}', '/')
+        server.manager.enter_room(sid, '/', FEED_ROOM)
+        server.manager.enter_room(sid, '/', user_room(i))
+
+
+def disconnect(workers):
+    for server in workers:
+        server.manager.close()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(emitter, counter, room_for_event, expected, events):
+    latencies = []
+    payload = {'thought': {'id': 1, 'content': 'x' * 200, 'like_count': 3, 'comment_count': 1}}
+    for i in range(events):
+        counter.expect(expected)
+        started = time.perf_counter()
+        emitter.emit('thought_created', payload, to=room_for_event(i))
+        if not counter.wait(60):
+            raise RuntimeError(f"Event {i} was not delivered to all {expected} sockets")
+        latencies.append(counter.finished_at - started)
+    return latencies
+
+
+def report(name, connections, expected, latencies):
+    total = sum(latencies)
+    print(f"{name:5} {connections:>7} conns  p50 {percentile(latencies, 0.5) * 1000:8.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:8.2f} ms  "
+          f"{expected * len(latencies) / total:12,.0f} deliveries/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{args.workers} workers, {args.events} events per workload")
+    for connections in args.connections:
+        counter = DeliveryCounter()
+        workers = start_workers(args.workers, counter)
+        try:
+            connect(workers, connections)
+            emitter = workers[0]
+            latencies = measure(emitter, counter, lambda i: FEED_ROOM, connections, args.events)
+            report('room', connections, connections, latencies)
+            targets = [rng.randrange(connections) for _ in range(args.events)]
+            latencies = measure(emitter, counter, lambda i: user_room(targets[i]), 1, args.events)
+            report('user', connections, 1, latencies)
+        finally:
+            disconnect(workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark SQLite connection management.
+
+Replays the database calls made by a mix of API routes against two databases:
+the old behaviour (a fresh sqlite3.connect per call, rollback journal, default
+pragmas) and the managed connections in Database (per-thread reuse, WAL,
+busy timeout, larger statement cache, mmap). Reports requests/sec for each.
+
+Usage (from backend/):
+    python benchmarks/bench_sqlite_connections.py [--seconds 5] [--threads 1 8]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+
+class PerCallConnectionDatabase(Database):
+    """Baseline: a brand-new connection with default settings for every call"""
+
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release_connection(self, conn):
+        conn.close()
+
+
+def seed(db, users=50, thoughts=2000, dim=64):
+    rng = random.Random(0)
+    user_ids = [db.create_user(f'bench_user_{i}') for i in range(users)]
+    for i in range(thoughts):
+        embedding = [rng.random() for _ in range(dim)]
+        db.create_thought(rng.choice(user_ids), f'benchmark thought {i}', embedding)
+    for follower in user_ids:
+        for following in rng.sample(user_ids, 5):
+            db.follow_user(follower, following)
+    conversations = [db.create_or_get_conversation(user_ids[i], user_ids[i + 1]) for i in range(0, users - 1, 2)]
+    return user_ids, thoughts, conversations
+
+
+def make_requests(db, user_ids, thought_count, conversations):
+    """Each entry replays the database calls one API route makes"""
+
+    def get_profile(rng):
+        user_id = rng.choice(user_ids)
+        db.get_user(user_id)
+        db.count_user_thoughts(user_id)
+        db.get_thoughtmates(user_id)
+        db.get_follow_counts(user_id)
+
+    def get_feed(rng):
+        db.get_all_thoughts(rng.choice(user_ids), limit=50)
+
+    def get_following_feed(rng):
+        db.get_following_thoughts(rng.choice(user_ids), limit=50)
+
+    def toggle_like(rng):
+        thought_id = rng.randint(1, thought_count)
+        user_id = rng.choice(user_ids)
+        db.like_thought(thought_id, user_id)
+        db.unlike_thought(thought_id, user_id)
+
+    def send_message(rng):
+        conversation_id = rng.choice(conversations)
+        db.send_message(conversation_id, user_ids[0], 'benchmark message')
+        db.get_unread_message_count(user_ids[0])
+
+    return [get_profile, get_feed, get_feed, get_following_feed, toggle_like, send_message]
+
+
+def run(db, requests, seconds, threads):
+    counts = [0] * threads
+    errors = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            try:
+                rng.choice(requests)(rng)
+                counts[index] += 1
+            except sqlite3.OperationalError:
+                errors[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return sum(counts) / elapsed, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        databases = [
+            ('per-call connect', PerCallConnectionDatabase(os.path.join(tmp, 'baseline.db'))),
+            ('managed (WAL)', Database(os.path.join(tmp, 'managed.db'))),
+        ]
+        print(f"{'mode':<18} {'threads':>7} {'req/s':>10} {'errors':>7}")
+        for name, db in databases:
+            requests = make_requests(db, *seed(db))
+            for threads in args.threads:
+                rate, errors = run(db, requests, args.seconds, threads)
+                print(f"{name:<18} {threads:>7} {rate:>10.1f} {errors:>7}")
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
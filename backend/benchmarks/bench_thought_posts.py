@@ -0,0 +1,202 @@
+"""
+Benchmark embedding micro-batching through the real server.
+
+Starts a FakeEmbeddingServer, then runs `python app.py` (eventlet, exactly as
+deployed) in a scratch directory with the Azure provider pointed at the stub.
+--posters concurrent clients each create thoughts with unique content over
+HTTP for --seconds. Reports thoughts/sec, p50/p99 POST latency, embedding
+HTTP requests made, and the batcher's average batch size from /api/metrics.
+
+Every post enqueues a match recompute. A probe requests /api/health every
+--probe-ms while the posters run and reports the slowest response (max
+stall): anything that blocks the event loop, such as match scoring on a
+green thread, shows up there. --existing-thoughts seeds the database with
+random embeddings from --existing-users users so recomputes score against
+a realistic index.
+
+Usage (from backend/):
+    python benchmarks/bench_thought_posts.py [--seconds 5] [--posters 1 10 50] [--latency-ms 50]
+        [--existing-thoughts 60000] [--existing-users 2000] [--dim 1536]
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from database import Database  # noqa: E402
+from embedding_codec import encode_embedding  # noqa: E402
+from embedding_index import normalize_rows  # noqa: E402
+from fake_embeddings import FakeEmbeddingServer  # noqa: E402
+
+DEPLOYMENT = 'bench-embeddings'
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def call(url, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def seed(workdir, args):
+    """Insert --existing-thoughts random embeddings spread over --existing-users users."""
+    if not args.existing_thoughts:
+        return
+    db = Database(os.path.join(workdir, 'htly.db'))
+    user_ids = [db.create_user(f'seed{i}') for i in range(args.existing_users)]
+    rng = np.random.default_rng(0)
+    conn = db.get_connection()
+    for start in range(0, args.existing_thoughts, 5000):
+        count = min(5000, args.existing_thoughts - start)
+        matrix = normalize_rows(rng.standard_normal((count, args.dim)).astype(np.float32))
+        owners = rng.choice(user_ids, count)
+        conn.executemany(
+            'INSERT INTO thoughts (user_id, content, embedding, embedding_model) VALUES (?, ?, ?, ?)',
+            [(int(owner), f'seed thought {start + i}', encode_embedding(vector), DEPLOYMENT)
+             for i, (owner, vector) in enumerate(zip(owners, matrix))]
+        )
+        conn.commit()
+    db.release_connection(conn)
+
+
+def start_app(embeddings, workdir, args):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        FLASK_ENV='production',
+        EMBEDDING_PROVIDER='azure',
+        AZURE_OPENAI_ENDPOINT=embeddings.url,
+        AZURE_OPENAI_API_KEY='bench',
+        AZURE_OPENAI_API_VERSION='2024-12-01-preview',
+        AZURE_OPENAI_DEPLOYMENT=DEPLOYMENT,
+        EMBEDDING_MAX_BATCH=str(args.max_batch),
+        EMBEDDING_BATCH_WINDOW_MS=str(args.window_ms),
+    )
+    env.pop('DATABASE_URL', None)
+    process = subprocess.Popen([sys.executable, os.path.join(BACKEND, 'app.py')], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        try:
+            call(f'{base}/api/metrics')
+            return process, base
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("app.py did not start")
+
+
+def probe(base, interval, deadline, stalls):
+    """Time a /api/health request every interval until deadline; keeps the slowest."""
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            call(f'{base}/api/health')
+        except Exception:
+            pass
+        stalls.append(time.perf_counter() - started)
+        time.sleep(interval)
+
+
+def run(base, user_id, posters, seconds, probe_interval):
+    latencies = []
+    stalls = []
+    counter = itertools.count()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    errors = [0]
+
+    def poster():
+        local = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                call(f'{base}/api/thoughts', {'user_id': user_id, 'content': f'benchmark thought {next(counter)}'})
+            except Exception:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=poster) for _ in range(posters)]
+    threads.append(threading.Thread(target=probe, args=(base, probe_interval, deadline, stalls)))
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    return len(latencies) / elapsed, p50 * 1000, p99 * 1000, errors[0], max(stalls, default=0.0) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--posters', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--server-concurrency', type=int, default=8,
+                        help='requests the stub serves at once, standing in for the API rate limit')
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--window-ms', type=float, default=10.0)
+    parser.add_argument('--probe-ms', type=float, default=20.0, help='interval between event loop probes')
+    parser.add_argument('--existing-thoughts', type=int, default=0)
+    parser.add_argument('--existing-users', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=256)
+    args = parser.parse_args()
+
+    embeddings = FakeEmbeddingServer(latency_ms=args.latency_ms, per_item_ms=0.2, dim=args.dim,
+                                     max_concurrency=args.server_concurrency).start()
+    print(f"{'posters':>7} {'posts/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'requests':>9} "
+          f"{'avg batch':>10} {'max stall ms':>13} {'recomputed':>11}")
+    try:
+        for posters in args.posters:
+            workdir = tempfile.mkdtemp(prefix='bench-thoughts-')
+            seed(workdir, args)
+            process, base = start_app(embeddings, workdir, args)
+            try:
+                user_id = call(f'{base}/api/users', {'username': 'bench'})['id']
+                requests_before = embeddings.requests
+                rate, p50, p99, errors, stall = run(base, user_id, posters, args.seconds, args.probe_ms / 1000)
+                metrics = call(f'{base}/api/metrics')
+                batcher, matches = metrics['embedding_batcher'], metrics['matches']
+            finally:
+                process.terminate()
+                process.wait()
+                shutil.rmtree(workdir, ignore_errors=True)
+            requests = embeddings.requests - requests_before
+            print(f"{posters:>7} {rate:>9.1f} {p50:>8.1f} {p99:>8.1f} {errors:>7} {requests:>9} "
+                  f"{batcher['avg_batch_size']:>10} {stall:>13.1f} {matches['processed']:>11}")
+    finally:
+        embeddings.stop()
+
+
+if __name__ == '__main__':
+    main()
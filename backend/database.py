@@ -1,16 +1,197 @@
+import os
 import sqlite3
+import threading
 import json
+import base64
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Dict, List, Set, Tuple, Optional
+from embedding_codec import encode_embedding, decode_embedding, embedding_size
+
+# Recount the denormalized like/comment counters from the source tables.
+# Every write to the counters also bumps counts_version, so realtime clients can
+# tell which of two count snapshots for a thought is newer
+REPAIR_THOUGHT_COUNTERS_SQL = '''
+    UPDATE thoughts
+    SET like_count = (SELECT COUNT(*) FROM likes WHERE likes.thought_id = thoughts.id),
+        comment_count = (SELECT COUNT(*) FROM comments WHERE comments.thought_id = thoughts.id),
+        counts_version = counts_version + 1
+    WHERE like_count != (SELECT COUNT(*) FROM likes WHERE likes.thought_id = thoughts.id)
+       OR comment_count != (SELECT COUNT(*) FROM comments WHERE comments.thought_id = thoughts.id)
+'''
+
+# Managed secondary indexes for the SQLite backend: (name, table, columns).
+# Every index named idx_* is owned by this list; init_db creates missing ones
+# and drops idx_* indexes that are no longer listed. Lookups already served by
+# a UNIQUE constraint (likes(thought_id, user_id), saved_thoughts(user_id,
+# thought_id), follows(follower_id, following_id), conversations(user1_id,
+# user2_id), matches(user_id, matched_user_id)) use SQLite's autoindex.
+SQLITE_INDEXES = [
+    ('idx_users_auth0_id', 'users', 'auth0_id'),
+    ('idx_users_created_at', 'users', 'created_at'),
+    ('idx_thoughts_created_id', 'thoughts', 'created_at, id'),
+    ('idx_thoughts_user_created_id', 'thoughts', 'user_id, created_at, id'),
+    ('idx_likes_user', 'likes', 'user_id'),
+    ('idx_comments_thought_created', 'comments', 'thought_id, created_at'),
+    ('idx_follows_following', 'follows', 'following_id, created_at'),
+    ('idx_follows_follower_created', 'follows', 'follower_id, created_at'),
+    ('idx_saved_user_created', 'saved_thoughts', 'user_id, created_at, thought_id'),
+    ('idx_saved_thought', 'saved_thoughts', 'thought_id'),
+    ('idx_conversations_user2', 'conversations', 'user2_id'),
+    ('idx_messages_conversation_created', 'messages', 'conversation_id, created_at'),
+    ('idx_messages_conversation_id', 'messages', 'conversation_id, id'),
+    ('idx_messages_conversation_unread', 'messages', 'conversation_id, is_read, id'),
+    ('idx_matches_user_score', 'matches', 'user_id, similarity_score DESC'),
+    ('idx_matches_matched_user', 'matches', 'matched_user_id'),
+]
+
+# Column projections for thought rows. Feed, profile, saved and trending
+# endpoints only need the lightweight "card" columns; the embedding is
+# selected explicitly on the paths that score.
+THOUGHT_CARD_COLUMNS = 't.id, t.user_id, t.content, t.created_at, t.like_count, t.comment_count, t.counts_version'
+THOUGHT_FULL_COLUMNS = THOUGHT_CARD_COLUMNS + ', t.embedding'
+
+# Message rows with the sender's display fields (messages m JOIN users u)
+MESSAGE_COLUMNS = 'm.id, m.conversation_id, m.sender_id, m.content, m.is_read, m.created_at, u.username, u.avatar_url'
+
+
+def encode_cursor(created_at, row_id: int) -> str:
+    """Build an opaque keyset pagination cursor from the last row of a page."""
+    raw = f"{created_at}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a pagination cursor into (created_at, id). Raises ValueError if malformed."""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return created_at, int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def keyset_clause(cursor: Optional[str], time_column: str, id_column: str, limit: Optional[int],
+                  placeholder: str = '?') -> Tuple[List[str], str, list]:
+    """
+    Build newest-first keyset pagination on (time_column, id_column).
+    Returns (where conditions, ORDER BY/LIMIT suffix, parameters for both).
+    placeholder is the driver's parameter marker ('%s' for psycopg2).
+    """
+    conditions, params = [], []
+    if cursor:
+        conditions.append(f'({time_column}, {id_column}) < ({placeholder}, {placeholder})')
+        params.extend(decode_cursor(cursor))
+    suffix = f'ORDER BY {time_column} DESC, {id_column} DESC'
+    if limit:
+        suffix += f' LIMIT {placeholder}'
+        params.append(limit)
+    return conditions, suffix, params
+
+
+def message_window_clause(since_id: Optional[int], before_id: Optional[int], limit: Optional[int],
+                          placeholder: str = '?') -> Tuple[List[str], str, list, bool]:
+    """
+    Build an id window over messages m. since_id reads forward (oldest first),
+    otherwise the newest rows before before_id are read backwards. Returns
+    (where conditions, ORDER BY/LIMIT suffix, parameters for both, newest_first).
+    """
+    conditions, params = [], []
+    if since_id is not None:
+        conditions.append(f'm.id > {placeholder}')
+        params.append(since_id)
+    if before_id is not None:
+        conditions.append(f'm.id < {placeholder}')
+        params.append(before_id)
+    newest_first = since_id is None
+    suffix = f"ORDER BY m.id {'DESC' if newest_first else 'ASC'}"
+    if limit:
+        suffix += f' LIMIT {placeholder}'
+        params.append(limit)
+    return conditions, suffix, params, newest_first
+
+
+def replaced_match_pairs(user_matches: dict, scored_users: Optional[dict]) -> Tuple[List[int], List[tuple]]:
+    """
+    Rows a match recompute replaces: (users whose rows all go, (user_id, matched_user_id)
+    pairs to delete in both directions for users scored against candidates only).
+    """
+    scored_users = scored_users or {}
+    user_ids, pairs = [], set()
+    for user_id in user_matches:
+        scored = scored_users.get(user_id)
+        if scored is None:
+            user_ids.append(user_id)
+            continue
+        for other_id in scored:
+            pairs.add((user_id, other_id))
+            pairs.add((other_id, user_id))
+    return user_ids, sorted(pairs)
+
+
+def where_sql(conditions: List[str]) -> str:
+    return 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+
+def create_database():
+    """
+    Pick the database backend from the environment: PostgreSQL when
+    DATABASE_URL is set (shared by every app instance), otherwise the local
+    SQLite file.
+    """
+    if os.getenv('DATABASE_URL'):
+        # Imported lazily so SQLite-only installs don't need psycopg2
+        from database_postgres import DatabasePostgres
+        return DatabasePostgres()
+    return Database()
 
 class Database:
     def __init__(self, db_path='htly.db'):
         self.db_path = db_path
+        # Connection tuning, overridable from the environment
+        self.busy_timeout_ms = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+        self.cache_size_kib = int(os.getenv('SQLITE_CACHE_SIZE_KIB', 16384))
+        self.mmap_size = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+        self.statement_cache_size = int(os.getenv('SQLITE_STATEMENT_CACHE_SIZE', 256))
+        # One connection per thread (per greenlet when eventlet monkey-patches threading)
+        self._local = threading.local()
         self.init_db()
 
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+        """Return this thread's connection, opening and tuning it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+        elif conn.in_transaction:
+            # A previous call raised mid-transaction; discard its partial writes
+            conn.rollback()
+        return conn
+
+    def release_connection(self, conn):
+        """Finish a unit of work. The connection stays open for reuse by this thread."""
+        if conn.in_transaction:
+            conn.rollback()
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _open_connection(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.statement_cache_size
+        )
         conn.row_factory = sqlite3.Row
+        # WAL lets readers run alongside a writer; NORMAL sync is durable enough under WAL
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {self.busy_timeout_ms}')
+        conn.execute(f'PRAGMA cache_size = -{self.cache_size_kib}')
+        conn.execute(f'PRAGMA mmap_size = {self.mmap_size}')
+        conn.execute('PRAGMA temp_store = MEMORY')
         return conn
 
     def init_db(self):
@@ -34,18 +215,25 @@ class Database:
         # Migrate existing users table if needed
         self._migrate_users_table(cursor)
 
-        # Thoughts table with embedding stored as JSON
+        # Thoughts table with embedding stored as binary float32 (see embedding_codec)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS thoughts (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
                 content TEXT NOT NULL,
-                embedding TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                embedding_model TEXT,
+                like_count INTEGER NOT NULL DEFAULT 0,
+                comment_count INTEGER NOT NULL DEFAULT 0,
+                counts_version INTEGER NOT NULL DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
 
+        # Convert legacy JSON embeddings to the binary format
+        self._migrate_thought_embeddings(cursor)
+
         # Matches table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS matches (
@@ -140,8 +328,58 @@ class Database:
             )
         ''')
 
+        # Progress of resumable bulk re-embedding jobs (see reembed)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reembed_checkpoints (
+                job TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                last_thought_id INTEGER NOT NULL DEFAULT 0,
+                processed INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Persistent tier of the embedding cache (see embedding_cache), keyed by content hash
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                content_hash TEXT PRIMARY KEY,
+                model TEXT,
+                embedding BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Per-user profile vectors for thoughtmate candidate generation (see user_profiles)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_profiles (
+                user_id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL,
+                thought_count INTEGER NOT NULL,
+                sums BLOB NOT NULL,
+                counts BLOB NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Counters are backfilled from likes/comments, so run after those tables exist
+        self._migrate_thoughts_table(cursor)
+
+        self._sync_indexes(cursor)
+
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
+
+    def _sync_indexes(self, cursor):
+        """Create the managed index set and drop managed indexes that were removed from it"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx\\_%' ESCAPE '\\'")
+        existing = {row[0] for row in cursor.fetchall()}
+        wanted = {name for name, _, _ in SQLITE_INDEXES}
+
+        for name in existing - wanted:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        for name, table, columns in SQLITE_INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})')
 
     def _migrate_users_table(self, cursor):
         """Add Auth0 columns to existing users table if they don't exist"""
@@ -165,6 +403,47 @@ class Database:
         if 'avatar_data' not in columns:
             cursor.execute('ALTER TABLE users ADD COLUMN avatar_data TEXT')
 
+    def _migrate_thoughts_table(self, cursor):
+        """Add denormalized like/comment counters and embedding_model to an existing thoughts table"""
+        cursor.execute("PRAGMA table_info(thoughts)")
+        columns = [row[1] for row in cursor.fetchall()]
+
+        if 'like_count' not in columns:
+            cursor.execute('ALTER TABLE thoughts ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0')
+        if 'comment_count' not in columns:
+            cursor.execute('ALTER TABLE thoughts ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0')
+        if 'counts_version' not in columns:
+            cursor.execute('ALTER TABLE thoughts ADD COLUMN counts_version INTEGER NOT NULL DEFAULT 0')
+
+        # Model that produced each embedding; NULL for rows that predate tracking
+        if 'embedding_model' not in columns:
+            cursor.execute('ALTER TABLE thoughts ADD COLUMN embedding_model TEXT')
+
+        # Backfill counters for tables that predate them
+        if 'like_count' not in columns or 'comment_count' not in columns:
+            cursor.execute(REPAIR_THOUGHT_COUNTERS_SQL)
+
+    def _migrate_thought_embeddings(self, cursor, chunk_size: int = 500):
+        """Rewrite JSON text embeddings as binary float32 blobs, in place and in chunks"""
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT id, embedding FROM thoughts WHERE id > ? AND typeof(embedding) = 'text' ORDER BY id LIMIT ?",
+                (last_id, chunk_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                try:
+                    updates.append((encode_embedding(json.loads(row['embedding'])), row['id']))
+                except ValueError as e:
+                    # Left as text; `manage.py reembed` replaces it
+                    print(f"Thought {row['id']} has no usable embedding: {e}")
+            cursor.executemany('UPDATE thoughts SET embedding = ? WHERE id = ?', updates)
+            last_id = rows[-1]['id']
+
     # User operations
     def create_user(self, username: str, avatar_url: str = None, bio: str = '') -> int:
         conn = self.get_connection()
@@ -175,7 +454,7 @@ class Database:
         )
         user_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return user_id
 
     def update_user_bio(self, user_id: int, bio: str):
@@ -183,14 +462,14 @@ class Database:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET bio = ? WHERE id = ?', (bio, user_id))
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
     def get_user(self, user_id: int) -> Optional[dict]:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
         user = cursor.fetchone()
-        conn.close()
+        self.release_connection(conn)
         if user:
             user_dict = dict(user)
             # Convert avatar_data to data URL if available
@@ -205,7 +484,7 @@ class Database:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
         user = cursor.fetchone()
-        conn.close()
+        self.release_connection(conn)
         if user:
             user_dict = dict(user)
             # Convert avatar_data to data URL if available
@@ -220,7 +499,7 @@ class Database:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users ORDER BY created_at DESC')
         users = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         result = []
         for user in users:
             user_dict = dict(user)
@@ -245,7 +524,7 @@ class Database:
         )
         user_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return user_id
 
     def get_user_by_auth0_id(self, auth0_id: str) -> Optional[dict]:
@@ -254,7 +533,7 @@ class Database:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users WHERE auth0_id = ?', (auth0_id,))
         user = cursor.fetchone()
-        conn.close()
+        self.release_connection(conn)
         if user:
             user_dict = dict(user)
             # Convert avatar_data to data URL if available
@@ -273,7 +552,7 @@ class Database:
             (username, avatar_url, bio, user_id)
         )
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
     def update_user_avatar_data(self, user_id: int, avatar_data: str):
         """Update user avatar with base64 encoded image data"""
@@ -284,114 +563,188 @@ class Database:
             (avatar_data, user_id)
         )
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
     # Thought operations
-    def create_thought(self, user_id: int, content: str, embedding: List[float]) -> int:
+    def create_thought(self, user_id: int, content: str, embedding: List[float], embedding_model: str = None) -> int:
         conn = self.get_connection()
         cursor = conn.cursor()
-        embedding_json = json.dumps(embedding)
         cursor.execute(
-            'INSERT INTO thoughts (user_id, content, embedding) VALUES (?, ?, ?)',
-            (user_id, content, embedding_json)
+            'INSERT INTO thoughts (user_id, content, embedding, embedding_model) VALUES (?, ?, ?, ?)',
+            (user_id, content, encode_embedding(embedding), embedding_model)
         )
         thought_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return thought_id
 
-    def get_thought(self, thought_id: int) -> Optional[dict]:
+    def get_thought(self, thought_id: int, include_embedding: bool = False) -> Optional[dict]:
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT t.*, u.username, u.avatar_url
+        columns = THOUGHT_FULL_COLUMNS if include_embedding else THOUGHT_CARD_COLUMNS
+        cursor.execute(f'''
+            SELECT {columns}, u.username, u.avatar_url
             FROM thoughts t
             JOIN users u ON t.user_id = u.id
             WHERE t.id = ?
         ''', (thought_id,))
         thought = cursor.fetchone()
-        conn.close()
+        self.release_connection(conn)
         if thought:
             thought_dict = dict(thought)
-            thought_dict['embedding'] = json.loads(thought_dict['embedding'])
+            if include_embedding:
+                thought_dict['embedding'] = decode_embedding(thought_dict['embedding'])
             return thought_dict
         return None
 
-    def get_all_thoughts(self, user_id: int = None) -> List[dict]:
+    def get_all_thoughts(self, user_id: int = None, cursor: str = None, limit: int = None) -> List[dict]:
         conn = self.get_connection()
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
+        params = []
 
-        query = '''
-            SELECT t.*, u.username, u.avatar_url,
-                   (SELECT COUNT(*) FROM likes WHERE thought_id = t.id) as like_count,
-                   (SELECT COUNT(*) FROM comments WHERE thought_id = t.id) as comment_count
+        query = f'''
+            SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url
         '''
 
         if user_id:
-            query += f''',
-                   (SELECT COUNT(*) FROM likes WHERE thought_id = t.id AND user_id = {user_id}) as is_liked,
-                   (SELECT COUNT(*) FROM saved_thoughts WHERE thought_id = t.id AND user_id = {user_id}) as is_saved
+            query += ''',
+                   (SELECT COUNT(*) FROM likes WHERE thought_id = t.id AND user_id = ?) as is_liked,
+                   (SELECT COUNT(*) FROM saved_thoughts WHERE thought_id = t.id AND user_id = ?) as is_saved
             '''
+            params.extend([user_id, user_id])
 
-        query += '''
+        conditions, page_sql, page_params = keyset_clause(cursor, 't.created_at', 't.id', limit)
+        query += f'''
             FROM thoughts t
             JOIN users u ON t.user_id = u.id
-            ORDER BY t.created_at DESC
+            {where_sql(conditions)}
+            {page_sql}
         '''
 
-        cursor.execute(query)
-        thoughts = cursor.fetchall()
-        conn.close()
+        db_cursor.execute(query, params + page_params)
+        thoughts = db_cursor.fetchall()
+        self.release_connection(conn)
         result = []
         for thought in thoughts:
             thought_dict = dict(thought)
-            thought_dict['embedding'] = json.loads(thought_dict['embedding'])
             if user_id:
                 thought_dict['is_liked'] = bool(thought_dict.get('is_liked', 0))
                 thought_dict['is_saved'] = bool(thought_dict.get('is_saved', 0))
             result.append(thought_dict)
         return result
 
-    def get_user_thoughts(self, user_id: int) -> List[dict]:
+    def get_all_thought_embeddings(self, model: str = None) -> List[dict]:
+        """
+        Return id, user_id and embedding for every thought (used to build the embedding index).
+        With model set, only rows embedded by that model are returned; untracked
+        (NULL) rows are skipped until backfill_embedding_model attributes them.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT t.*,
-                   (SELECT COUNT(*) FROM likes WHERE thought_id = t.id) as like_count,
-                   (SELECT COUNT(*) FROM comments WHERE thought_id = t.id) as comment_count
+        if model:
+            cursor.execute(
+                'SELECT id, user_id, embedding FROM thoughts WHERE embedding_model = ? ORDER BY id',
+                (model,)
+            )
+        else:
+            cursor.execute('SELECT id, user_id, embedding FROM thoughts ORDER BY id')
+        rows = cursor.fetchall()
+        self.release_connection(conn)
+        return [
+            {'id': row['id'], 'user_id': row['user_id'], 'embedding': decode_embedding(row['embedding'])}
+            for row in rows
+        ]
+
+    def backfill_embedding_model(self, model: str, dim: int = None) -> int:
+        """
+        Attribute thoughts with no embedding_model (stored before it was tracked)
+        to model. With dim, only binary embeddings of that dimension are claimed;
+        the rest stay untracked for `manage.py reembed`. Returns rows updated.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if dim is None:
+            cursor.execute(
+                "UPDATE thoughts SET embedding_model = ? WHERE embedding_model IS NULL AND typeof(embedding) = 'blob'",
+                (model,)
+            )
+        else:
+            cursor.execute(
+                'UPDATE thoughts SET embedding_model = ? '
+                "WHERE embedding_model IS NULL AND typeof(embedding) = 'blob' AND length(embedding) = ?",
+                (model, embedding_size(dim))
+            )
+        updated = cursor.rowcount
+        conn.commit()
+        self.release_connection(conn)
+        return updated
+
+    def get_thoughts_by_ids(self, thought_ids: List[int]) -> List[dict]:
+        """Fetch thoughts with author and counts for the given ids, in the order given."""
+        if not thought_ids:
+            return []
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(thought_ids))
+        cursor.execute(f'''
+            SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url
             FROM thoughts t
-            WHERE t.user_id = ?
-            ORDER BY t.created_at DESC
-        ''', (user_id,))
-        thoughts = cursor.fetchall()
-        conn.close()
+            JOIN users u ON t.user_id = u.id
+            WHERE t.id IN ({placeholders})
+        ''', list(thought_ids))
+        thoughts = {row['id']: dict(row) for row in cursor.fetchall()}
+        self.release_connection(conn)
+        return [thoughts[tid] for tid in thought_ids if tid in thoughts]
+
+    def get_user_thoughts(self, user_id: int, include_embedding: bool = False,
+                          cursor: str = None, limit: int = None) -> List[dict]:
+        conn = self.get_connection()
+        db_cursor = conn.cursor()
+        columns = THOUGHT_FULL_COLUMNS if include_embedding else THOUGHT_CARD_COLUMNS
+        conditions, page_sql, page_params = keyset_clause(cursor, 't.created_at', 't.id', limit)
+        db_cursor.execute(f'''
+            SELECT {columns}
+            FROM thoughts t
+            {where_sql(['t.user_id = ?'] + conditions)}
+            {page_sql}
+        ''', [user_id] + page_params)
+        thoughts = db_cursor.fetchall()
+        self.release_connection(conn)
         result = []
         for thought in thoughts:
             thought_dict = dict(thought)
-            thought_dict['embedding'] = json.loads(thought_dict['embedding'])
+            if include_embedding:
+                thought_dict['embedding'] = decode_embedding(thought_dict['embedding'])
             result.append(thought_dict)
         return result
 
-    def get_following_thoughts(self, user_id: int) -> List[dict]:
+    def count_user_thoughts(self, user_id: int) -> int:
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT t.*, u.username, u.avatar_url,
-                   (SELECT COUNT(*) FROM likes WHERE thought_id = t.id) as like_count,
-                   (SELECT COUNT(*) FROM comments WHERE thought_id = t.id) as comment_count,
+        cursor.execute('SELECT COUNT(*) as count FROM thoughts WHERE user_id = ?', (user_id,))
+        result = cursor.fetchone()
+        self.release_connection(conn)
+        return result['count']
+
+    def get_following_thoughts(self, user_id: int, cursor: str = None, limit: int = None) -> List[dict]:
+        conn = self.get_connection()
+        db_cursor = conn.cursor()
+        conditions, page_sql, page_params = keyset_clause(cursor, 't.created_at', 't.id', limit)
+        conditions = ['t.user_id IN (SELECT following_id FROM follows WHERE follower_id = ?)'] + conditions
+        db_cursor.execute(f'''
+            SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url,
                    (SELECT COUNT(*) FROM likes WHERE thought_id = t.id AND user_id = ?) as is_liked,
                    (SELECT COUNT(*) FROM saved_thoughts WHERE thought_id = t.id AND user_id = ?) as is_saved
             FROM thoughts t
             JOIN users u ON t.user_id = u.id
-            WHERE t.user_id IN (SELECT following_id FROM follows WHERE follower_id = ?)
-            ORDER BY t.created_at DESC
-        ''', (user_id, user_id, user_id))
-        thoughts = cursor.fetchall()
-        conn.close()
+            {where_sql(conditions)}
+            {page_sql}
+        ''', [user_id, user_id, user_id] + page_params)
+        thoughts = db_cursor.fetchall()
+        self.release_connection(conn)
         result = []
         for thought in thoughts:
             thought_dict = dict(thought)
-            thought_dict['embedding'] = json.loads(thought_dict['embedding'])
             thought_dict['is_liked'] = bool(thought_dict['is_liked'])
             thought_dict['is_saved'] = bool(thought_dict['is_saved'])
             result.append(thought_dict)
@@ -401,12 +754,9 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
 
-        query = '''
-            SELECT t.*, u.username, u.avatar_url,
-                   (SELECT COUNT(*) FROM likes WHERE thought_id = t.id) as like_count,
-                   (SELECT COUNT(*) FROM comments WHERE thought_id = t.id) as comment_count,
-                   ((SELECT COUNT(*) FROM likes WHERE thought_id = t.id) +
-                    (SELECT COUNT(*) FROM comments WHERE thought_id = t.id) * 2) as engagement_score
+        query = f'''
+            SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url,
+                   (t.like_count + t.comment_count * 2) as engagement_score
         '''
 
         if user_id:
@@ -425,11 +775,10 @@ class Database:
 
         cursor.execute(query)
         thoughts = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         result = []
         for thought in thoughts:
             thought_dict = dict(thought)
-            thought_dict['embedding'] = json.loads(thought_dict['embedding'])
             if user_id:
                 thought_dict['is_liked'] = bool(thought_dict.get('is_liked', 0))
                 thought_dict['is_saved'] = bool(thought_dict.get('is_saved', 0))
@@ -437,7 +786,12 @@ class Database:
         return result
 
     # Like operations
-    def like_thought(self, thought_id: int, user_id: int):
+    def like_thought(self, thought_id: int, user_id: int) -> Optional[dict]:
+        """
+        Like a thought. Returns the thought's counters after the write as
+        {changed, like_count, comment_count, counts_version}, or None if the
+        thought does not exist.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
@@ -445,20 +799,53 @@ class Database:
                 'INSERT INTO likes (thought_id, user_id) VALUES (?, ?)',
                 (thought_id, user_id)
             )
-            conn.commit()
+            cursor.execute(
+                'UPDATE thoughts SET like_count = like_count + 1, counts_version = counts_version + 1 WHERE id = ?',
+                (thought_id,)
+            )
+            changed = True
         except sqlite3.IntegrityError:
-            pass  # Already liked
-        conn.close()
+            changed = False  # Already liked
+        counts = self._thought_counts(cursor, thought_id, changed)
+        if counts is None:
+            # No such thought; don't keep an orphan like
+            self.release_connection(conn)
+            return None
+        conn.commit()
+        self.release_connection(conn)
+        return counts
 
-    def unlike_thought(self, thought_id: int, user_id: int):
+    def unlike_thought(self, thought_id: int, user_id: int) -> Optional[dict]:
+        """Unlike a thought. Returns the thought's counters after the write, like like_thought."""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute(
             'DELETE FROM likes WHERE thought_id = ? AND user_id = ?',
             (thought_id, user_id)
         )
+        changed = cursor.rowcount > 0
+        if changed:
+            cursor.execute(
+                'UPDATE thoughts SET like_count = like_count - 1, counts_version = counts_version + 1 WHERE id = ?',
+                (thought_id,)
+            )
+        counts = self._thought_counts(cursor, thought_id, changed)
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
+        return counts
+
+    def _thought_counts(self, cursor, thought_id: int, changed: bool) -> Optional[dict]:
+        # Read inside the write transaction, so the counts and version are the ones just written
+        cursor.execute('SELECT like_count, comment_count, counts_version FROM thoughts WHERE id = ?', (thought_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            'changed': changed,
+            'like_count': row['like_count'],
+            'comment_count': row['comment_count'],
+            'counts_version': row['counts_version'],
+        }
 
     def get_thought_likes(self, thought_id: int) -> List[dict]:
         conn = self.get_connection()
@@ -471,22 +858,50 @@ class Database:
             ORDER BY l.created_at DESC
         ''', (thought_id,))
         likes = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         return [dict(like) for like in likes]
 
     # Comment operations
-    def create_comment(self, thought_id: int, user_id: int, content: str) -> int:
+    def create_comment(self, thought_id: int, user_id: int, content: str) -> Optional[int]:
+        """Add a comment; returns its id, or None if the thought does not exist."""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE thoughts SET comment_count = comment_count + 1, counts_version = counts_version + 1 WHERE id = ?',
+            (thought_id,)
+        )
+        if cursor.rowcount == 0:
+            self.release_connection(conn)
+            return None
         cursor.execute(
             'INSERT INTO comments (thought_id, user_id, content) VALUES (?, ?, ?)',
             (thought_id, user_id, content)
         )
         comment_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return comment_id
 
+    def get_comment(self, comment_id: int) -> Optional[dict]:
+        """
+        A comment with its author's username and avatar and the thought's
+        counters (thought_like_count, thought_comment_count, thought_counts_version).
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT c.*, u.username, u.avatar_url,
+                   t.like_count AS thought_like_count, t.comment_count AS thought_comment_count,
+                   t.counts_version AS thought_counts_version
+            FROM comments c
+            JOIN users u ON c.user_id = u.id
+            JOIN thoughts t ON c.thought_id = t.id
+            WHERE c.id = ?
+        ''', (comment_id,))
+        comment = cursor.fetchone()
+        self.release_connection(conn)
+        return dict(comment) if comment else None
+
     def get_thought_comments(self, thought_id: int) -> List[dict]:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -498,24 +913,32 @@ class Database:
             ORDER BY c.created_at ASC
         ''', (thought_id,))
         comments = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         return [dict(comment) for comment in comments]
 
     def delete_comment(self, comment_id: int, user_id: int) -> bool:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute(
-            'DELETE FROM comments WHERE id = ? AND user_id = ?',
+            'SELECT thought_id FROM comments WHERE id = ? AND user_id = ?',
             (comment_id, user_id)
         )
-        deleted = cursor.rowcount > 0
+        comment = cursor.fetchone()
+        if not comment:
+            self.release_connection(conn)
+            return False
+        cursor.execute('DELETE FROM comments WHERE id = ?', (comment_id,))
+        cursor.execute(
+            'UPDATE thoughts SET comment_count = comment_count - 1, counts_version = counts_version + 1 WHERE id = ?',
+            (comment['thought_id'],)
+        )
         conn.commit()
-        conn.close()
-        return deleted
+        self.release_connection(conn)
+        return True
 
     # Thought deletion
     def delete_thought(self, thought_id: int, user_id: int) -> bool:
-        """Delete a thought if it belongs to the user. Cascades will handle likes/comments."""
+        """Delete a thought if it belongs to the user, together with its likes and comments."""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute(
@@ -523,20 +946,35 @@ class Database:
             (thought_id, user_id)
         )
         deleted = cursor.rowcount > 0
+        if deleted:
+            cursor.execute('DELETE FROM likes WHERE thought_id = ?', (thought_id,))
+            cursor.execute('DELETE FROM comments WHERE thought_id = ?', (thought_id,))
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return deleted
 
     def delete_all_user_thoughts(self, user_id: int) -> int:
-        """Delete all thoughts for a user. Returns count of deleted thoughts."""
+        """Delete all thoughts for a user, with their likes and comments. Returns count of deleted thoughts."""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute('DELETE FROM likes WHERE thought_id IN (SELECT id FROM thoughts WHERE user_id = ?)', (user_id,))
+        cursor.execute('DELETE FROM comments WHERE thought_id IN (SELECT id FROM thoughts WHERE user_id = ?)', (user_id,))
         cursor.execute('DELETE FROM thoughts WHERE user_id = ?', (user_id,))
         count = cursor.rowcount
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return count
 
+    def repair_thought_counters(self) -> int:
+        """Recompute like_count/comment_count from likes and comments. Returns rows fixed."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(REPAIR_THOUGHT_COUNTERS_SQL)
+        fixed = cursor.rowcount
+        conn.commit()
+        self.release_connection(conn)
+        return fixed
+
     # Follow operations
     def follow_user(self, follower_id: int, following_id: int):
         if follower_id == following_id:
@@ -549,10 +987,10 @@ class Database:
                 (follower_id, following_id)
             )
             conn.commit()
-            conn.close()
+            self.release_connection(conn)
             return True
         except sqlite3.IntegrityError:
-            conn.close()
+            self.release_connection(conn)
             return False
 
     def unfollow_user(self, follower_id: int, following_id: int):
@@ -563,7 +1001,7 @@ class Database:
             (follower_id, following_id)
         )
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
     def is_following(self, follower_id: int, following_id: int) -> bool:
         conn = self.get_connection()
@@ -573,7 +1011,7 @@ class Database:
             (follower_id, following_id)
         )
         result = cursor.fetchone()
-        conn.close()
+        self.release_connection(conn)
         return result['count'] > 0
 
     def get_following(self, user_id: int) -> List[dict]:
@@ -587,7 +1025,7 @@ class Database:
             ORDER BY f.created_at DESC
         ''', (user_id,))
         following = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         return [dict(f) for f in following]
 
     def get_followers(self, user_id: int) -> List[dict]:
@@ -601,7 +1039,7 @@ class Database:
             ORDER BY f.created_at DESC
         ''', (user_id,))
         followers = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         return [dict(f) for f in followers]
 
     def get_follow_counts(self, user_id: int) -> dict:
@@ -613,13 +1051,18 @@ class Database:
                 (SELECT COUNT(*) FROM follows WHERE following_id = ?) as followers_count
         ''', (user_id, user_id))
         result = cursor.fetchone()
-        conn.close()
+        self.release_connection(conn)
         return dict(result)
 
     # Saved thoughts operations
-    def save_thought(self, user_id: int, thought_id: int):
+    def save_thought(self, user_id: int, thought_id: int) -> bool:
+        """Save a thought for the user; returns False if the thought does not exist."""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM thoughts WHERE id = ?', (thought_id,))
+        if cursor.fetchone() is None:
+            self.release_connection(conn)
+            return False
         try:
             cursor.execute(
                 'INSERT INTO saved_thoughts (user_id, thought_id) VALUES (?, ?)',
@@ -628,7 +1071,8 @@ class Database:
             conn.commit()
         except sqlite3.IntegrityError:
             pass  # Already saved
-        conn.close()
+        self.release_connection(conn)
+        return True
 
     def unsave_thought(self, user_id: int, thought_id: int):
         conn = self.get_connection()
@@ -638,30 +1082,29 @@ class Database:
             (user_id, thought_id)
         )
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
 
-    def get_saved_thoughts(self, user_id: int) -> List[dict]:
+    def get_saved_thoughts(self, user_id: int, cursor: str = None, limit: int = None) -> List[dict]:
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT t.*, u.username, u.avatar_url,
-                   (SELECT COUNT(*) FROM likes WHERE thought_id = t.id) as like_count,
-                   (SELECT COUNT(*) FROM comments WHERE thought_id = t.id) as comment_count,
+        db_cursor = conn.cursor()
+        # (user_id, thought_id) is unique, so thought_id breaks ties between saves
+        conditions, page_sql, page_params = keyset_clause(cursor, 'st.created_at', 'st.thought_id', limit)
+        db_cursor.execute(f'''
+            SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url,
                    (SELECT COUNT(*) FROM likes WHERE thought_id = t.id AND user_id = ?) as is_liked,
                    1 as is_saved,
                    st.created_at as saved_at
             FROM saved_thoughts st
             JOIN thoughts t ON st.thought_id = t.id
             JOIN users u ON t.user_id = u.id
-            WHERE st.user_id = ?
-            ORDER BY st.created_at DESC
-        ''', (user_id, user_id))
-        thoughts = cursor.fetchall()
-        conn.close()
+            {where_sql(['st.user_id = ?'] + conditions)}
+            {page_sql}
+        ''', [user_id, user_id] + page_params)
+        thoughts = db_cursor.fetchall()
+        self.release_connection(conn)
         result = []
         for thought in thoughts:
             thought_dict = dict(thought)
-            thought_dict['embedding'] = json.loads(thought_dict['embedding'])
             thought_dict['is_liked'] = bool(thought_dict['is_liked'])
             thought_dict['is_saved'] = True
             result.append(thought_dict)
@@ -678,7 +1121,95 @@ class Database:
             DO UPDATE SET similarity_score = ?, created_at = CURRENT_TIMESTAMP
         ''', (user_id, matched_user_id, similarity_score, similarity_score))
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
+
+    def replace_user_matches(self, user_matches: dict, scored_users: Optional[dict] = None):
+        """
+        Replace the stored matches of each user with freshly computed scores.
+        user_matches maps user_id -> {matched_user_id: similarity_score}. Rows are
+        written in both directions and everything happens in one transaction.
+
+        scored_users maps user_id -> the other user ids it was scored against, when
+        that was only a candidate set. Only rows between the user and those ids are
+        replaced; a user without an entry has every row replaced.
+        """
+        if not user_matches:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        user_ids, pairs = replaced_match_pairs(user_matches, scored_users)
+        if user_ids:
+            placeholders = ','.join('?' * len(user_ids))
+            cursor.execute(
+                f'DELETE FROM matches WHERE user_id IN ({placeholders}) OR matched_user_id IN ({placeholders})',
+                user_ids + user_ids
+            )
+        cursor.executemany('DELETE FROM matches WHERE user_id = ? AND matched_user_id = ?', pairs)
+        rows = []
+        for user_id, matches in user_matches.items():
+            for matched_user_id, score in matches.items():
+                rows.append((user_id, matched_user_id, score))
+                rows.append((matched_user_id, user_id, score))
+        cursor.executemany('''
+            INSERT INTO matches (user_id, matched_user_id, similarity_score)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id, matched_user_id)
+            DO UPDATE SET similarity_score = excluded.similarity_score, created_at = CURRENT_TIMESTAMP
+        ''', rows)
+        conn.commit()
+        self.release_connection(conn)
+
+    def get_match_partner_ids(self, user_ids: List[int]) -> Dict[int, Set[int]]:
+        """Users each of user_ids has a stored match with, in either direction."""
+        partners = {user_id: set() for user_id in user_ids}
+        if not user_ids:
+            return partners
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(user_ids))
+        cursor.execute(f'''
+            SELECT user_id, matched_user_id FROM matches WHERE user_id IN ({placeholders})
+            UNION
+            SELECT matched_user_id, user_id FROM matches WHERE matched_user_id IN ({placeholders})
+        ''', list(user_ids) + list(user_ids))
+        for row in cursor.fetchall():
+            partners[row['user_id']].add(row['matched_user_id'])
+        self.release_connection(conn)
+        return partners
+
+    def replace_all_matches(self, rows: List[tuple]):
+        """
+        Replace the whole matches table with (user_id, matched_user_id, similarity_score)
+        rows in one transaction. Rows are written as given (one direction each).
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM matches')
+        cursor.executemany(
+            'INSERT INTO matches (user_id, matched_user_id, similarity_score) VALUES (?, ?, ?)',
+            rows
+        )
+        conn.commit()
+        self.release_connection(conn)
+
+    def is_conversation_member(self, conversation_id: int, user_id: int) -> bool:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT 1 FROM conversations WHERE id = ? AND (user1_id = ? OR user2_id = ?)',
+            (conversation_id, user_id, user_id)
+        )
+        result = cursor.fetchone()
+        self.release_connection(conn)
+        return result is not None
+
+    def get_conversation_member_ids(self, conversation_id: int) -> List[int]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT user1_id, user2_id FROM conversations WHERE id = ?', (conversation_id,))
+        row = cursor.fetchone()
+        self.release_connection(conn)
+        return [row['user1_id'], row['user2_id']] if row else []
 
     def get_thoughtmates(self, user_id: int, limit: int = 10) -> List[dict]:
         conn = self.get_connection()
@@ -693,7 +1224,7 @@ class Database:
             LIMIT ?
         ''', (user_id, user_id, limit))
         thoughtmates = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         result = [dict(tm) for tm in thoughtmates]
         for tm in result:
             tm['is_following'] = bool(tm['is_following'])
@@ -716,7 +1247,7 @@ class Database:
         result = cursor.fetchone()
 
         if result:
-            conn.close()
+            self.release_connection(conn)
             return result['id']
 
         # Create new conversation
@@ -726,7 +1257,7 @@ class Database:
         )
         conversation_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return conversation_id
 
     def get_user_conversations(self, user_id: int) -> List[dict]:
@@ -755,17 +1286,32 @@ class Database:
             ORDER BY c.last_message_at DESC
         ''', (user_id, user_id, user_id, user_id, user_id, user_id))
         conversations = cursor.fetchall()
-        conn.close()
+        self.release_connection(conn)
         return [dict(conv) for conv in conversations]
 
-    def send_message(self, conversation_id: int, sender_id: int, content: str) -> int:
+    def send_message(self, conversation_id: int, sender_id: int, content: str) -> Optional[dict]:
+        """
+        Insert a message; returns the new row with the sender's username and avatar_url,
+        or None (nothing inserted) if sender_id is not a user.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute(
             'INSERT INTO messages (conversation_id, sender_id, content) VALUES (?, ?, ?)',
             (conversation_id, sender_id, content)
         )
-        message_id = cursor.lastrowid
+        cursor.execute(f'''
+            SELECT {MESSAGE_COLUMNS}
+            FROM messages m
+            JOIN users u ON m.sender_id = u.id
+            WHERE m.id = ?
+        ''', (cursor.lastrowid,))
+        row = cursor.fetchone()
+        if row is None:
+            conn.rollback()
+            self.release_connection(conn)
+            return None
+        message = dict(row)
 
         # Update conversation last_message_at
         cursor.execute(
@@ -774,31 +1320,49 @@ class Database:
         )
 
         conn.commit()
-        conn.close()
-        return message_id
+        self.release_connection(conn)
+        return message
+
+    def get_conversation_messages(self, conversation_id: int, user_id: int, since_id: int = None,
+                                  before_id: int = None, limit: int = None) -> List[dict]:
+        """
+        Messages of a conversation in id (send) order, oldest first.
+
+        since_id: only messages after it, the oldest `limit` of them (catching up).
+        before_id: only messages before it, the newest `limit` of them (older history).
+        Neither: the newest `limit` messages, or all of them without a limit.
 
-    def get_conversation_messages(self, conversation_id: int, user_id: int) -> List[dict]:
+        Unless before_id is given, messages from the other member up to the newest
+        one returned (or since_id, which the caller has already seen) are marked read.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT m.*, u.username, u.avatar_url
+        conditions, window_sql, window_params, newest_first = message_window_clause(
+            since_id, before_id, limit, placeholder='?'
+        )
+        cursor.execute(f'''
+            SELECT {MESSAGE_COLUMNS}
             FROM messages m
             JOIN users u ON m.sender_id = u.id
-            WHERE m.conversation_id = ?
-            ORDER BY m.created_at ASC
-        ''', (conversation_id,))
-        messages = cursor.fetchall()
-
-        # Mark messages as read
-        cursor.execute('''
-            UPDATE messages
-            SET is_read = 1
-            WHERE conversation_id = ? AND sender_id != ? AND is_read = 0
-        ''', (conversation_id, user_id))
+            {where_sql(['m.conversation_id = ?'] + conditions)}
+            {window_sql}
+        ''', [conversation_id] + window_params)
+        messages = [dict(msg) for msg in cursor.fetchall()]
+        if newest_first:
+            messages.reverse()
+
+        # Mark read receipts; only unread rows from the other member are touched
+        read_up_to = messages[-1]['id'] if messages else since_id
+        if before_id is None and read_up_to is not None:
+            cursor.execute('''
+                UPDATE messages
+                SET is_read = 1
+                WHERE conversation_id = ? AND is_read = 0 AND sender_id != ? AND id <= ?
+            ''', (conversation_id, user_id, read_up_to))
 
         conn.commit()
-        conn.close()
-        return [dict(msg) for msg in messages]
+        self.release_connection(conn)
+        return messages
 
     def get_unread_message_count(self, user_id: int) -> int:
         conn = self.get_connection()
@@ -812,7 +1376,7 @@ class Database:
               AND m.is_read = 0
         ''', (user_id, user_id, user_id))
         result = cursor.fetchone()
-        conn.close()
+        self.release_connection(conn)
         return result['count']
 
     def clear_conversation(self, conversation_id: int) -> int:
@@ -822,7 +1386,7 @@ class Database:
         cursor.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
         count = cursor.rowcount
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return count
 
     def delete_conversation(self, conversation_id: int) -> bool:
@@ -832,5 +1396,116 @@ class Database:
         cursor.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
         deleted = cursor.rowcount > 0
         conn.commit()
-        conn.close()
+        self.release_connection(conn)
         return deleted
+
+    # Re-embedding operations
+    def get_thoughts_for_reembedding(self, model: str, after_id: int = 0, limit: int = 500) -> List[dict]:
+        """Next chunk (by id) of thoughts whose embedding was not produced by model."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, content FROM thoughts
+            WHERE id > ? AND (embedding_model IS NULL OR embedding_model != ?)
+            ORDER BY id
+            LIMIT ?
+        ''', (after_id, model, limit))
+        rows = cursor.fetchall()
+        self.release_connection(conn)
+        return [dict(row) for row in rows]
+
+    def update_thought_embeddings(self, embeddings: List[tuple], model: str, job: str,
+                                  last_thought_id: int, processed: int):
+        """
+        Store (thought_id, embedding) pairs produced by model and advance the
+        job's checkpoint, all in one transaction.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE thoughts SET embedding = ?, embedding_model = ? WHERE id = ?',
+            [(encode_embedding(embedding), model, thought_id) for thought_id, embedding in embeddings]
+        )
+        cursor.execute('''
+            INSERT INTO reembed_checkpoints (job, model, last_thought_id, processed, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(job) DO UPDATE SET
+                model = excluded.model,
+                last_thought_id = excluded.last_thought_id,
+                processed = excluded.processed,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (job, model, last_thought_id, processed))
+        conn.commit()
+        self.release_connection(conn)
+
+    def get_reembed_checkpoint(self, job: str) -> Optional[dict]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM reembed_checkpoints WHERE job = ?', (job,))
+        row = cursor.fetchone()
+        self.release_connection(conn)
+        return dict(row) if row else None
+
+    def delete_reembed_checkpoint(self, job: str):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM reembed_checkpoints WHERE job = ?', (job,))
+        conn.commit()
+        self.release_connection(conn)
+
+    # Embedding cache operations
+    def get_cached_embedding(self, content_hash: str):
+        """Return the cached embedding for a content hash, or None."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT embedding FROM embedding_cache WHERE content_hash = ?', (content_hash,))
+        row = cursor.fetchone()
+        self.release_connection(conn)
+        return decode_embedding(row['embedding']) if row else None
+
+    def put_cached_embedding(self, content_hash: str, model: str, embedding):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR IGNORE INTO embedding_cache (content_hash, model, embedding) VALUES (?, ?, ?)',
+            (content_hash, model, encode_embedding(embedding))
+        )
+        conn.commit()
+        self.release_connection(conn)
+
+    # User profile operations
+    def get_all_user_profiles(self, model: str) -> List[dict]:
+        """Every stored user profile built from embeddings of the given model."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT user_id, thought_count, sums, counts FROM user_profiles WHERE model = ?',
+            (model,)
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+        self.release_connection(conn)
+        return rows
+
+    def save_user_profiles(self, profiles: List[tuple], model: str):
+        """Upsert (user_id, thought_count, sums, counts) profile rows in one transaction."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO user_profiles (user_id, model, thought_count, sums, counts, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                model = excluded.model,
+                thought_count = excluded.thought_count,
+                sums = excluded.sums,
+                counts = excluded.counts,
+                updated_at = CURRENT_TIMESTAMP
+        ''', [(user_id, model, thought_count, sums, counts) for user_id, thought_count, sums, counts in profiles])
+        conn.commit()
+        self.release_connection(conn)
+
+    def delete_user_profile(self, user_id: int):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM user_profiles WHERE user_id = ?', (user_id,))
+        conn.commit()
+        self.release_connection(conn)
@@ -1,20 +1,51 @@
 import os
-import json
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
-from datetime import datetime
+import psycopg2.errors
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from typing import Dict, List, Optional, Set
+from embedding_codec import encode_embedding, decode_embedding, embedding_size
+from database import (
+    REPAIR_THOUGHT_COUNTERS_SQL,
+    THOUGHT_CARD_COLUMNS,
+    THOUGHT_FULL_COLUMNS,
+    MESSAGE_COLUMNS,
+    keyset_clause,
+    message_window_clause,
+    replaced_match_pairs,
+    where_sql,
+)
+
+# Rows fetched per round trip when streaming large result sets through a
+# server-side cursor
+SERVER_CURSOR_ITERSIZE = 2000
+
+
+def _user_dict(user) -> dict:
+    user_dict = dict(user)
+    # Convert avatar_data to data URL if available
+    avatar_url = user_dict.get('avatar_url') or ''
+    if user_dict.get('avatar_data') and not avatar_url.startswith('data:'):
+        user_dict['avatar_url'] = f"data:image/jpeg;base64,{user_dict['avatar_data']}"
+    return user_dict
+
 
 class DatabasePostgres:
-    """PostgreSQL database adapter for production"""
+    """PostgreSQL database adapter for production. Mirrors the Database interface."""
 
     def __init__(self):
         database_url = os.getenv('DATABASE_URL')
         if not database_url:
             raise ValueError("DATABASE_URL environment variable not set")
 
-        # Create connection pool
-        self.pool = SimpleConnectionPool(1, 10, database_url)
+        # Thread-safe pool; every cursor returns rows as dicts
+        self.pool = ThreadedConnectionPool(
+            int(os.getenv('POSTGRES_POOL_MIN', 1)),
+            int(os.getenv('POSTGRES_POOL_MAX', 20)),
+            database_url,
+            cursor_factory=RealDictCursor
+        )
         self.init_db()
 
     def get_connection(self):
@@ -22,144 +53,1210 @@ class DatabasePostgres:
         return self.pool.getconn()
 
     def release_connection(self, conn):
-        """Return connection to pool"""
-        self.pool.putconn(conn)
+        """Return connection to pool, discarding any uncommitted work"""
+        try:
+            if not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+        except psycopg2.Error:
+            pass  # broken connection; closed below instead of being reused
+        self.pool.putconn(conn, close=bool(conn.closed))
+
+    @contextmanager
+    def connection(self):
+        """
+        Pooled connection for one unit of work. It goes back to the pool when
+        the block exits, rolled back if the block raised before committing.
+        """
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            self.release_connection(conn)
+
+    def close(self):
+        """Close every pooled connection"""
+        self.pool.closeall()
 
     def init_db(self):
         """Initialize database schema"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(255) UNIQUE NOT NULL,
-                avatar_url TEXT,
-                bio TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                auth0_id VARCHAR(255) UNIQUE,
-                email VARCHAR(255)
+            # Users table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id SERIAL PRIMARY KEY,
+                    username VARCHAR(255) UNIQUE NOT NULL,
+                    avatar_url TEXT,
+                    bio TEXT DEFAULT '',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    auth0_id VARCHAR(255) UNIQUE,
+                    email VARCHAR(255),
+                    profile_completed INTEGER DEFAULT 0,
+                    avatar_data TEXT
+                )
+            ''')
+            cursor.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS profile_completed INTEGER DEFAULT 0')
+            cursor.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_data TEXT')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)')
+
+            # Thoughts table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS thoughts (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    content TEXT NOT NULL,
+                    embedding BYTEA,
+                    embedding_model TEXT,
+                    like_count INTEGER NOT NULL DEFAULT 0,
+                    comment_count INTEGER NOT NULL DEFAULT 0,
+                    counts_version INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self._migrate_thought_embeddings(cursor)
+            # Model that produced each embedding; NULL for rows that predate tracking
+            cursor.execute('ALTER TABLE thoughts ADD COLUMN IF NOT EXISTS embedding_model TEXT')
+            # Bumped by every write to like_count/comment_count (see REPAIR_THOUGHT_COUNTERS_SQL)
+            cursor.execute('ALTER TABLE thoughts ADD COLUMN IF NOT EXISTS counts_version INTEGER NOT NULL DEFAULT 0')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_user_id ON thoughts(user_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_created_at ON thoughts(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_created_id ON thoughts(created_at, id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_user_created_id ON thoughts(user_id, created_at, id)')
+
+            # Matches table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS matches (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    matched_user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    similarity_score REAL NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, matched_user_id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_user_id ON matches(user_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_similarity ON matches(similarity_score)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_user_score ON matches(user_id, similarity_score DESC)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_matched_user ON matches(matched_user_id)')
+
+            # Likes table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS likes (
+                    id SERIAL PRIMARY KEY,
+                    thought_id INTEGER REFERENCES thoughts(id) ON DELETE CASCADE,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(thought_id, user_id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_likes_thought_id ON likes(thought_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_likes_user_id ON likes(user_id)')
+
+            # Comments table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS comments (
+                    id SERIAL PRIMARY KEY,
+                    thought_id INTEGER REFERENCES thoughts(id) ON DELETE CASCADE,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    content TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_thought_id ON comments(thought_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_thought_created ON comments(thought_id, created_at)')
+
+            # Follows table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS follows (
+                    id SERIAL PRIMARY KEY,
+                    follower_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    following_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(follower_id, following_id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_follows_follower ON follows(follower_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_follows_following ON follows(following_id)')
+
+            # Saved thoughts table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS saved_thoughts (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    thought_id INTEGER REFERENCES thoughts(id) ON DELETE CASCADE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user_id, thought_id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_saved_user_id ON saved_thoughts(user_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_saved_user_created ON saved_thoughts(user_id, created_at, thought_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_saved_thought ON saved_thoughts(thought_id)')
+
+            # Conversations table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id SERIAL PRIMARY KEY,
+                    user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    last_message_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(user1_id, user2_id)
+                )
+            ''')
+            cursor.execute(
+                'ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
             )
-        ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_user2 ON conversations(user2_id)')
 
-        # Thoughts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS thoughts (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                content TEXT NOT NULL,
-                embedding JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            # Messages table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id SERIAL PRIMARY KEY,
+                    conversation_id INTEGER REFERENCES conversations(id) ON DELETE CASCADE,
+                    sender_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    content TEXT NOT NULL,
+                    is_read BOOLEAN DEFAULT FALSE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id)')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages(conversation_id, created_at)'
             )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_user_id ON thoughts(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_created_at ON thoughts(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id, id)')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages(conversation_id, sender_id) WHERE NOT is_read'
+            )
+
+            # Progress of resumable bulk re-embedding jobs (see reembed)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reembed_checkpoints (
+                    job TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    last_thought_id INTEGER NOT NULL DEFAULT 0,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Persistent tier of the embedding cache (see embedding_cache), keyed by content hash
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    content_hash TEXT PRIMARY KEY,
+                    model TEXT,
+                    embedding BYTEA NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Per-user profile vectors for thoughtmate candidate generation (see user_profiles)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_profiles (
+                    user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+                    model TEXT NOT NULL,
+                    thought_count INTEGER NOT NULL,
+                    sums BYTEA NOT NULL,
+                    counts BYTEA NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Counters are backfilled from likes/comments, so run after those tables exist
+            self._migrate_thought_counters(cursor)
+
+            conn.commit()
 
-        # Matches table
+    def _migrate_thought_counters(self, cursor):
+        """Add denormalized like/comment counters to an existing thoughts table and backfill them"""
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS matches (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                matched_user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                similarity_score REAL NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, matched_user_id)
-            )
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'thoughts' AND column_name IN ('like_count', 'comment_count')
         ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_user_id ON matches(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_matches_similarity ON matches(similarity_score)')
+        if len(cursor.fetchall()) == 2:
+            return
+
+        cursor.execute('ALTER TABLE thoughts ADD COLUMN IF NOT EXISTS like_count INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('ALTER TABLE thoughts ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0')
+        cursor.execute(REPAIR_THOUGHT_COUNTERS_SQL)
 
-        # Likes table
+    def _migrate_thought_embeddings(self, cursor, chunk_size=500):
+        """Convert a legacy JSONB embedding column to binary float32 BYTEA in place"""
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS likes (
-                id SERIAL PRIMARY KEY,
-                thought_id INTEGER REFERENCES thoughts(id) ON DELETE CASCADE,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(thought_id, user_id)
-            )
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'thoughts' AND column_name = 'embedding'
         ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_likes_thought_id ON likes(thought_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_likes_user_id ON likes(user_id)')
+        row = cursor.fetchone()
+        if not row or row['data_type'] != 'jsonb':
+            return
 
-        # Comments table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS comments (
-                id SERIAL PRIMARY KEY,
-                thought_id INTEGER REFERENCES thoughts(id) ON DELETE CASCADE,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        cursor.execute('ALTER TABLE thoughts ADD COLUMN IF NOT EXISTS embedding_bin BYTEA')
+        last_id = 0
+        while True:
+            # Only JSON arrays are converted; NULL (or JSON null) embeddings stay NULL
+            # and are picked up by `manage.py reembed`
+            cursor.execute(
+                "SELECT id, embedding FROM thoughts WHERE id > %s AND embedding_bin IS NULL "
+                "AND embedding IS NOT NULL AND jsonb_typeof(embedding) = 'array' ORDER BY id LIMIT %s",
+                (last_id, chunk_size)
             )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_thought_id ON comments(thought_id)')
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            execute_values(
+                cursor,
+                'UPDATE thoughts SET embedding_bin = data.embedding FROM (VALUES %s) AS data (id, embedding) '
+                'WHERE thoughts.id = data.id',
+                # psycopg2 already decodes JSONB into Python lists
+                [(row['id'], psycopg2.Binary(encode_embedding(row['embedding']))) for row in rows]
+            )
+            last_id = rows[-1]['id']
 
-        # Follows table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS follows (
-                id SERIAL PRIMARY KEY,
-                follower_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                following_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(follower_id, following_id)
+        cursor.execute('ALTER TABLE thoughts DROP COLUMN embedding')
+        cursor.execute('ALTER TABLE thoughts RENAME COLUMN embedding_bin TO embedding')
+
+    # User operations
+    def create_user(self, username: str, avatar_url: str = None, bio: str = '') -> int:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO users (username, avatar_url, bio) VALUES (%s, %s, %s) RETURNING id',
+                (username, avatar_url, bio)
             )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_follows_follower ON follows(follower_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_follows_following ON follows(following_id)')
+            user_id = cursor.fetchone()['id']
+            conn.commit()
+            return user_id
 
-        # Saved thoughts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS saved_thoughts (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                thought_id INTEGER REFERENCES thoughts(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, thought_id)
+    def update_user_bio(self, user_id: int, bio: str):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE users SET bio = %s WHERE id = %s', (bio, user_id))
+            conn.commit()
+
+    def get_user(self, user_id: int) -> Optional[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE id = %s', (user_id,))
+            user = cursor.fetchone()
+            return _user_dict(user) if user else None
+
+    def get_user_by_username(self, username: str) -> Optional[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE username = %s', (username,))
+            user = cursor.fetchone()
+            return _user_dict(user) if user else None
+
+    def get_all_users(self) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users ORDER BY created_at DESC')
+            users = cursor.fetchall()
+            return [_user_dict(user) for user in users]
+
+    # Auth0 user operations
+    def create_user_with_auth0(self, auth0_id: str, email: str, username: str = None, avatar_url: str = None) -> int:
+        """Create a new user with Auth0 credentials"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # If username not provided, generate one from email
+            if not username:
+                username = email.split('@')[0]
+            cursor.execute(
+                'INSERT INTO users (auth0_id, email, username, avatar_url, profile_completed) '
+                'VALUES (%s, %s, %s, %s, %s) RETURNING id',
+                (auth0_id, email, username, avatar_url, 0)
             )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_saved_user_id ON saved_thoughts(user_id)')
+            user_id = cursor.fetchone()['id']
+            conn.commit()
+            return user_id
 
-        # Conversations table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversations (
-                id SERIAL PRIMARY KEY,
-                user1_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                user2_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user1_id, user2_id)
+    def get_user_by_auth0_id(self, auth0_id: str) -> Optional[dict]:
+        """Get user by Auth0 ID"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE auth0_id = %s', (auth0_id,))
+            user = cursor.fetchone()
+            return _user_dict(user) if user else None
+
+    def update_user_profile(self, user_id: int, username: str, avatar_url: str, bio: str):
+        """Update user profile and mark as completed"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'UPDATE users SET username = %s, avatar_url = %s, bio = %s, profile_completed = 1 WHERE id = %s',
+                (username, avatar_url, bio, user_id)
             )
-        ''')
+            conn.commit()
 
-        # Messages table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS messages (
-                id SERIAL PRIMARY KEY,
-                conversation_id INTEGER REFERENCES conversations(id) ON DELETE CASCADE,
-                sender_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                content TEXT NOT NULL,
-                is_read BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    def update_user_avatar_data(self, user_id: int, avatar_data: str):
+        """Update user avatar with base64 encoded image data"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE users SET avatar_data = %s WHERE id = %s', (avatar_data, user_id))
+            conn.commit()
+
+    # Thought operations
+    def create_thought(self, user_id: int, content: str, embedding: List[float], embedding_model: str = None) -> int:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO thoughts (user_id, content, embedding, embedding_model) VALUES (%s, %s, %s, %s) RETURNING id',
+                (user_id, content, psycopg2.Binary(encode_embedding(embedding)), embedding_model)
             )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id)')
-
-        conn.commit()
-        self.release_connection(conn)
-
-    # NOTE: All other methods from database.py should be copied here with:
-    # 1. Replace conn = sqlite3.connect() with conn = self.get_connection()
-    # 2. Replace conn.close() with self.release_connection(conn)
-    # 3. Replace cursor.fetchone() dict conversion with RealDictCursor
-    # 4. Replace ? with %s for PostgreSQL parameterized queries
-    # 5. Replace json.dumps(embedding) with just embedding (JSONB handles this)
-
-    def dict_factory(self, cursor, row):
-        """Convert cursor row to dictionary - not needed with RealDictCursor"""
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
-
-    # The rest of the methods will be similar to database.py but adapted for PostgreSQL
-    # Due to size, I'll provide the key pattern changes needed
+            thought_id = cursor.fetchone()['id']
+            conn.commit()
+            return thought_id
+
+    def get_thought(self, thought_id: int, include_embedding: bool = False) -> Optional[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            columns = THOUGHT_FULL_COLUMNS if include_embedding else THOUGHT_CARD_COLUMNS
+            cursor.execute(f'''
+                SELECT {columns}, u.username, u.avatar_url
+                FROM thoughts t
+                JOIN users u ON t.user_id = u.id
+                WHERE t.id = %s
+            ''', (thought_id,))
+            thought = cursor.fetchone()
+            if thought:
+                thought_dict = dict(thought)
+                if include_embedding:
+                    thought_dict['embedding'] = decode_embedding(thought_dict['embedding'])
+                return thought_dict
+            return None
+
+    def get_all_thoughts(self, user_id: int = None, cursor: str = None, limit: int = None) -> List[dict]:
+        with self.connection() as conn:
+            db_cursor = conn.cursor()
+            params = []
+
+            query = f'''
+                SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url
+            '''
+
+            if user_id:
+                query += ''',
+                       EXISTS (SELECT 1 FROM likes WHERE thought_id = t.id AND user_id = %s) as is_liked,
+                       EXISTS (SELECT 1 FROM saved_thoughts WHERE thought_id = t.id AND user_id = %s) as is_saved
+                '''
+                params.extend([user_id, user_id])
+
+            conditions, page_sql, page_params = keyset_clause(cursor, 't.created_at', 't.id', limit, '%s')
+            query += f'''
+                FROM thoughts t
+                JOIN users u ON t.user_id = u.id
+                {where_sql(conditions)}
+                {page_sql}
+            '''
+
+            db_cursor.execute(query, params + page_params)
+            thoughts = db_cursor.fetchall()
+            return [dict(thought) for thought in thoughts]
+
+    def get_all_thought_embeddings(self, model: str = None) -> List[dict]:
+        """
+        Return id, user_id and embedding for every thought (used to build the embedding index).
+        With model set, only rows embedded by that model are returned; untracked
+        (NULL) rows are skipped until backfill_embedding_model attributes them.
+        """
+        with self.connection() as conn:
+            # Named (server-side) cursor streams rows instead of materializing the table client-side
+            cursor = conn.cursor(name='all_thought_embeddings')
+            cursor.itersize = SERVER_CURSOR_ITERSIZE
+            if model:
+                cursor.execute(
+                    'SELECT id, user_id, embedding FROM thoughts WHERE embedding_model = %s ORDER BY id',
+                    (model,)
+                )
+            else:
+                cursor.execute('SELECT id, user_id, embedding FROM thoughts ORDER BY id')
+            result = [
+                {'id': row['id'], 'user_id': row['user_id'], 'embedding': decode_embedding(row['embedding'])}
+                for row in cursor
+            ]
+            cursor.close()
+            conn.commit()
+            return result
+
+    def backfill_embedding_model(self, model: str, dim: int = None) -> int:
+        """
+        Attribute thoughts with no embedding_model (stored before it was tracked)
+        to model. With dim, only embeddings of that dimension are claimed; the
+        rest stay untracked for `manage.py reembed`. Returns rows updated.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if dim is None:
+                cursor.execute(
+                    'UPDATE thoughts SET embedding_model = %s WHERE embedding_model IS NULL AND embedding IS NOT NULL',
+                    (model,)
+                )
+            else:
+                cursor.execute(
+                    'UPDATE thoughts SET embedding_model = %s '
+                    'WHERE embedding_model IS NULL AND octet_length(embedding) = %s',
+                    (model, embedding_size(dim))
+                )
+            updated = cursor.rowcount
+            conn.commit()
+            return updated
+
+    def get_thoughts_by_ids(self, thought_ids: List[int]) -> List[dict]:
+        """Fetch thoughts with author and counts for the given ids, in the order given."""
+        if not thought_ids:
+            return []
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url
+                FROM thoughts t
+                JOIN users u ON t.user_id = u.id
+                WHERE t.id = ANY(%s)
+            ''', (list(thought_ids),))
+            thoughts = {row['id']: dict(row) for row in cursor.fetchall()}
+            return [thoughts[tid] for tid in thought_ids if tid in thoughts]
+
+    def get_user_thoughts(self, user_id: int, include_embedding: bool = False,
+                          cursor: str = None, limit: int = None) -> List[dict]:
+        with self.connection() as conn:
+            db_cursor = conn.cursor()
+            columns = THOUGHT_FULL_COLUMNS if include_embedding else THOUGHT_CARD_COLUMNS
+            conditions, page_sql, page_params = keyset_clause(cursor, 't.created_at', 't.id', limit, '%s')
+            db_cursor.execute(f'''
+                SELECT {columns}
+                FROM thoughts t
+                {where_sql(['t.user_id = %s'] + conditions)}
+                {page_sql}
+            ''', [user_id] + page_params)
+            thoughts = db_cursor.fetchall()
+            result = []
+            for thought in thoughts:
+                thought_dict = dict(thought)
+                if include_embedding:
+                    thought_dict['embedding'] = decode_embedding(thought_dict['embedding'])
+                result.append(thought_dict)
+            return result
+
+    def count_user_thoughts(self, user_id: int) -> int:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) as count FROM thoughts WHERE user_id = %s', (user_id,))
+            result = cursor.fetchone()
+            return result['count']
+
+    def get_following_thoughts(self, user_id: int, cursor: str = None, limit: int = None) -> List[dict]:
+        with self.connection() as conn:
+            db_cursor = conn.cursor()
+            conditions, page_sql, page_params = keyset_clause(cursor, 't.created_at', 't.id', limit, '%s')
+            conditions = ['t.user_id IN (SELECT following_id FROM follows WHERE follower_id = %s)'] + conditions
+            db_cursor.execute(f'''
+                SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url,
+                       EXISTS (SELECT 1 FROM likes WHERE thought_id = t.id AND user_id = %s) as is_liked,
+                       EXISTS (SELECT 1 FROM saved_thoughts WHERE thought_id = t.id AND user_id = %s) as is_saved
+                FROM thoughts t
+                JOIN users u ON t.user_id = u.id
+                {where_sql(conditions)}
+                {page_sql}
+            ''', [user_id, user_id, user_id] + page_params)
+            thoughts = db_cursor.fetchall()
+            return [dict(thought) for thought in thoughts]
+
+    def get_trending_thoughts(self, user_id: int = None, hours: int = 24) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            params = []
+
+            query = f'''
+                SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url,
+                       (t.like_count + t.comment_count * 2) as engagement_score
+            '''
+
+            if user_id:
+                query += ''',
+                       EXISTS (SELECT 1 FROM likes WHERE thought_id = t.id AND user_id = %s) as is_liked,
+                       EXISTS (SELECT 1 FROM saved_thoughts WHERE thought_id = t.id AND user_id = %s) as is_saved
+                '''
+                params.extend([user_id, user_id])
+
+            query += '''
+                FROM thoughts t
+                JOIN users u ON t.user_id = u.id
+                WHERE t.created_at >= NOW() - %s * INTERVAL '1 hour'
+                ORDER BY engagement_score DESC, t.created_at DESC
+                LIMIT 50
+            '''
+            params.append(hours)
+
+            cursor.execute(query, params)
+            thoughts = cursor.fetchall()
+            return [dict(thought) for thought in thoughts]
+
+    # Like operations
+    def like_thought(self, thought_id: int, user_id: int) -> Optional[dict]:
+        """
+        Like a thought. Returns the thought's counters after the write as
+        {changed, like_count, comment_count, counts_version}, or None if the
+        thought does not exist.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    'INSERT INTO likes (thought_id, user_id) VALUES (%s, %s) ON CONFLICT DO NOTHING',
+                    (thought_id, user_id)
+                )
+            except psycopg2.errors.ForeignKeyViolation:
+                return None  # no such thought (or user)
+            counts = self._update_like_count(cursor, thought_id, 1 if cursor.rowcount > 0 else 0)
+            conn.commit()
+            return counts
+
+    def unlike_thought(self, thought_id: int, user_id: int) -> Optional[dict]:
+        """Unlike a thought. Returns the thought's counters after the write, like like_thought."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM likes WHERE thought_id = %s AND user_id = %s',
+                (thought_id, user_id)
+            )
+            counts = self._update_like_count(cursor, thought_id, -1 if cursor.rowcount > 0 else 0)
+            conn.commit()
+            return counts
+
+    def _update_like_count(self, cursor, thought_id: int, delta: int) -> Optional[dict]:
+        # The version is bumped and returned by the same UPDATE as the counts, so
+        # concurrent writers on any worker hand out distinct, ordered snapshots
+        if delta:
+            cursor.execute('''
+                UPDATE thoughts SET like_count = like_count + %s, counts_version = counts_version + 1
+                WHERE id = %s
+                RETURNING like_count, comment_count, counts_version
+            ''', (delta, thought_id))
+        else:
+            cursor.execute('SELECT like_count, comment_count, counts_version FROM thoughts WHERE id = %s', (thought_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            'changed': delta != 0,
+            'like_count': row['like_count'],
+            'comment_count': row['comment_count'],
+            'counts_version': row['counts_version'],
+        }
+
+    def get_thought_likes(self, thought_id: int) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.id, u.username, u.avatar_url, l.created_at
+                FROM likes l
+                JOIN users u ON l.user_id = u.id
+                WHERE l.thought_id = %s
+                ORDER BY l.created_at DESC
+            ''', (thought_id,))
+            likes = cursor.fetchall()
+            return [dict(like) for like in likes]
+
+    # Comment operations
+    def create_comment(self, thought_id: int, user_id: int, content: str) -> Optional[int]:
+        """Add a comment; returns its id, or None if the thought does not exist."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    'INSERT INTO comments (thought_id, user_id, content) VALUES (%s, %s, %s) RETURNING id',
+                    (thought_id, user_id, content)
+                )
+            except psycopg2.errors.ForeignKeyViolation:
+                return None
+            comment_id = cursor.fetchone()['id']
+            cursor.execute(
+                'UPDATE thoughts SET comment_count = comment_count + 1, counts_version = counts_version + 1 WHERE id = %s',
+                (thought_id,)
+            )
+            conn.commit()
+            return comment_id
+
+    def get_comment(self, comment_id: int) -> Optional[dict]:
+        """
+        A comment with its author's username and avatar and the thought's
+        counters (thought_like_count, thought_comment_count, thought_counts_version).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.*, u.username, u.avatar_url,
+                       t.like_count AS thought_like_count, t.comment_count AS thought_comment_count,
+                       t.counts_version AS thought_counts_version
+                FROM comments c
+                JOIN users u ON c.user_id = u.id
+                JOIN thoughts t ON c.thought_id = t.id
+                WHERE c.id = %s
+            ''', (comment_id,))
+            comment = cursor.fetchone()
+            return dict(comment) if comment else None
+
+    def get_thought_comments(self, thought_id: int) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.*, u.username, u.avatar_url
+                FROM comments c
+                JOIN users u ON c.user_id = u.id
+                WHERE c.thought_id = %s
+                ORDER BY c.created_at ASC
+            ''', (thought_id,))
+            comments = cursor.fetchall()
+            return [dict(comment) for comment in comments]
+
+    def delete_comment(self, comment_id: int, user_id: int) -> bool:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM comments WHERE id = %s AND user_id = %s RETURNING thought_id',
+                (comment_id, user_id)
+            )
+            comment = cursor.fetchone()
+            if not comment:
+                return False
+            cursor.execute(
+                'UPDATE thoughts SET comment_count = comment_count - 1, counts_version = counts_version + 1 WHERE id = %s',
+                (comment['thought_id'],)
+            )
+            conn.commit()
+            return True
+
+    # Thought deletion
+    def delete_thought(self, thought_id: int, user_id: int) -> bool:
+        """Delete a thought if it belongs to the user. Likes and comments cascade."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM thoughts WHERE id = %s AND user_id = %s',
+                (thought_id, user_id)
+            )
+            deleted = cursor.rowcount > 0
+            conn.commit()
+            return deleted
+
+    def delete_all_user_thoughts(self, user_id: int) -> int:
+        """Delete all thoughts for a user (likes and comments cascade). Returns count of deleted thoughts."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM thoughts WHERE user_id = %s', (user_id,))
+            count = cursor.rowcount
+            conn.commit()
+            return count
+
+    def repair_thought_counters(self) -> int:
+        """Recompute like_count/comment_count from likes and comments. Returns rows fixed."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(REPAIR_THOUGHT_COUNTERS_SQL)
+            fixed = cursor.rowcount
+            conn.commit()
+            return fixed
+
+    # Follow operations
+    def follow_user(self, follower_id: int, following_id: int):
+        if follower_id == following_id:
+            return False
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO follows (follower_id, following_id) VALUES (%s, %s) ON CONFLICT DO NOTHING',
+                (follower_id, following_id)
+            )
+            followed = cursor.rowcount > 0
+            conn.commit()
+            return followed
+
+    def unfollow_user(self, follower_id: int, following_id: int):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM follows WHERE follower_id = %s AND following_id = %s',
+                (follower_id, following_id)
+            )
+            conn.commit()
+
+    def is_following(self, follower_id: int, following_id: int) -> bool:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT COUNT(*) as count FROM follows WHERE follower_id = %s AND following_id = %s',
+                (follower_id, following_id)
+            )
+            result = cursor.fetchone()
+            return result['count'] > 0
+
+    def get_following(self, user_id: int) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.*, f.created_at as followed_at
+                FROM follows f
+                JOIN users u ON f.following_id = u.id
+                WHERE f.follower_id = %s
+                ORDER BY f.created_at DESC
+            ''', (user_id,))
+            following = cursor.fetchall()
+            return [dict(f) for f in following]
+
+    def get_followers(self, user_id: int) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.*, f.created_at as followed_at
+                FROM follows f
+                JOIN users u ON f.follower_id = u.id
+                WHERE f.following_id = %s
+                ORDER BY f.created_at DESC
+            ''', (user_id,))
+            followers = cursor.fetchall()
+            return [dict(f) for f in followers]
+
+    def get_follow_counts(self, user_id: int) -> dict:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM follows WHERE follower_id = %s) as following_count,
+                    (SELECT COUNT(*) FROM follows WHERE following_id = %s) as followers_count
+            ''', (user_id, user_id))
+            result = cursor.fetchone()
+            return dict(result)
+
+    # Saved thoughts operations
+    def save_thought(self, user_id: int, thought_id: int) -> bool:
+        """Save a thought for the user; returns False if the thought does not exist."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    'INSERT INTO saved_thoughts (user_id, thought_id) VALUES (%s, %s) ON CONFLICT DO NOTHING',
+                    (user_id, thought_id)
+                )
+            except psycopg2.errors.ForeignKeyViolation:
+                return False
+            conn.commit()
+            return True
+
+    def unsave_thought(self, user_id: int, thought_id: int):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'DELETE FROM saved_thoughts WHERE user_id = %s AND thought_id = %s',
+                (user_id, thought_id)
+            )
+            conn.commit()
+
+    def get_saved_thoughts(self, user_id: int, cursor: str = None, limit: int = None) -> List[dict]:
+        with self.connection() as conn:
+            db_cursor = conn.cursor()
+            # (user_id, thought_id) is unique, so thought_id breaks ties between saves
+            conditions, page_sql, page_params = keyset_clause(cursor, 'st.created_at', 'st.thought_id', limit, '%s')
+            db_cursor.execute(f'''
+                SELECT {THOUGHT_CARD_COLUMNS}, u.username, u.avatar_url,
+                       EXISTS (SELECT 1 FROM likes WHERE thought_id = t.id AND user_id = %s) as is_liked,
+                       TRUE as is_saved,
+                       st.created_at as saved_at
+                FROM saved_thoughts st
+                JOIN thoughts t ON st.thought_id = t.id
+                JOIN users u ON t.user_id = u.id
+                {where_sql(['st.user_id = %s'] + conditions)}
+                {page_sql}
+            ''', [user_id, user_id] + page_params)
+            thoughts = db_cursor.fetchall()
+            return [dict(thought) for thought in thoughts]
+
+    # Match operations
+    def create_or_update_match(self, user_id: int, matched_user_id: int, similarity_score: float):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO matches (user_id, matched_user_id, similarity_score)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id, matched_user_id)
+                DO UPDATE SET similarity_score = EXCLUDED.similarity_score, created_at = CURRENT_TIMESTAMP
+            ''', (user_id, matched_user_id, similarity_score))
+            conn.commit()
+
+    def replace_user_matches(self, user_matches: dict, scored_users: Optional[dict] = None):
+        """
+        Replace the stored matches of each user with freshly computed scores.
+        user_matches maps user_id -> {matched_user_id: similarity_score}. Rows are
+        written in both directions with one multi-row upsert, in one transaction.
+
+        scored_users maps user_id -> the other user ids it was scored against, when
+        that was only a candidate set. Only rows between the user and those ids are
+        replaced; a user without an entry has every row replaced.
+        """
+        if not user_matches:
+            return
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            user_ids, pairs = replaced_match_pairs(user_matches, scored_users)
+            if user_ids:
+                cursor.execute(
+                    'DELETE FROM matches WHERE user_id = ANY(%s) OR matched_user_id = ANY(%s)',
+                    (user_ids, user_ids)
+                )
+            if pairs:
+                cursor.execute('''
+                    DELETE FROM matches m
+                    USING unnest(%s::bigint[], %s::bigint[]) AS p(user_id, matched_user_id)
+                    WHERE m.user_id = p.user_id AND m.matched_user_id = p.matched_user_id
+                ''', ([user_id for user_id, _ in pairs], [matched_user_id for _, matched_user_id in pairs]))
+            # A multi-row upsert may not touch the same key twice, so dedupe pairs
+            # that appear from both sides of the batch
+            rows = {}
+            for user_id, matches in user_matches.items():
+                for matched_user_id, score in matches.items():
+                    rows[(user_id, matched_user_id)] = score
+                    rows[(matched_user_id, user_id)] = score
+            execute_values(cursor, '''
+                INSERT INTO matches (user_id, matched_user_id, similarity_score)
+                VALUES %s
+                ON CONFLICT (user_id, matched_user_id)
+                DO UPDATE SET similarity_score = EXCLUDED.similarity_score, created_at = CURRENT_TIMESTAMP
+            ''', [(user_id, matched_user_id, float(score)) for (user_id, matched_user_id), score in rows.items()],
+                page_size=1000)
+            conn.commit()
+
+    def get_match_partner_ids(self, user_ids: List[int]) -> Dict[int, Set[int]]:
+        """Users each of user_ids has a stored match with, in either direction."""
+        partners = {user_id: set() for user_id in user_ids}
+        if not user_ids:
+            return partners
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, matched_user_id FROM matches WHERE user_id = ANY(%s)
+                UNION
+                SELECT matched_user_id, user_id FROM matches WHERE matched_user_id = ANY(%s)
+            ''', (list(user_ids), list(user_ids)))
+            for row in cursor.fetchall():
+                partners[row['user_id']].add(row['matched_user_id'])
+            return partners
+        """
+        Replace the whole matches table with (user_id, matched_user_id, similarity_score)
+        rows in one transaction. Rows are written as given (one direction each).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM matches')
+            execute_values(
+                cursor,
+                'INSERT INTO matches (user_id, matched_user_id, similarity_score) VALUES %s',
+                [(user_id, matched_user_id, float(score)) for user_id, matched_user_id, score in rows],
+                page_size=1000
+            )
+            conn.commit()
+
+    def is_conversation_member(self, conversation_id: int, user_id: int) -> bool:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT 1 FROM conversations WHERE id = %s AND (user1_id = %s OR user2_id = %s)',
+                (conversation_id, user_id, user_id)
+            )
+            result = cursor.fetchone()
+            return result is not None
+
+    def get_conversation_member_ids(self, conversation_id: int) -> List[int]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user1_id, user2_id FROM conversations WHERE id = %s', (conversation_id,))
+            row = cursor.fetchone()
+            return [row['user1_id'], row['user2_id']] if row else []
+
+    def get_thoughtmates(self, user_id: int, limit: int = 10) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.*, m.similarity_score,
+                       EXISTS (SELECT 1 FROM follows WHERE follower_id = %s AND following_id = u.id) as is_following
+                FROM matches m
+                JOIN users u ON m.matched_user_id = u.id
+                WHERE m.user_id = %s
+                ORDER BY m.similarity_score DESC
+                LIMIT %s
+            ''', (user_id, user_id, limit))
+            thoughtmates = cursor.fetchall()
+            return [dict(tm) for tm in thoughtmates]
+
+    # Conversation operations
+    def create_or_get_conversation(self, user1_id: int, user2_id: int) -> int:
+        # Ensure consistent ordering
+        if user1_id > user2_id:
+            user1_id, user2_id = user2_id, user1_id
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # Check if conversation exists
+            cursor.execute(
+                'SELECT id FROM conversations WHERE user1_id = %s AND user2_id = %s',
+                (user1_id, user2_id)
+            )
+            result = cursor.fetchone()
+
+            if not result:
+                # Another instance may create it concurrently; fall back to reading theirs
+                cursor.execute(
+                    'INSERT INTO conversations (user1_id, user2_id) VALUES (%s, %s) ON CONFLICT DO NOTHING RETURNING id',
+                    (user1_id, user2_id)
+                )
+                result = cursor.fetchone()
+                if not result:
+                    cursor.execute(
+                        'SELECT id FROM conversations WHERE user1_id = %s AND user2_id = %s',
+                        (user1_id, user2_id)
+                    )
+                    result = cursor.fetchone()
+                conn.commit()
+
+            conversation_id = result['id']
+            return conversation_id
+
+    def get_user_conversations(self, user_id: int) -> List[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.*,
+                       CASE
+                           WHEN c.user1_id = %s THEN u2.id
+                           ELSE u1.id
+                       END as other_user_id,
+                       CASE
+                           WHEN c.user1_id = %s THEN u2.username
+                           ELSE u1.username
+                       END as other_username,
+                       CASE
+                           WHEN c.user1_id = %s THEN u2.avatar_url
+                           ELSE u1.avatar_url
+                       END as other_avatar_url,
+                       (SELECT content FROM messages WHERE conversation_id = c.id ORDER BY created_at DESC LIMIT 1) as last_message,
+                       (SELECT COUNT(*) FROM messages WHERE conversation_id = c.id AND sender_id != %s AND NOT is_read) as unread_count
+                FROM conversations c
+                JOIN users u1 ON c.user1_id = u1.id
+                JOIN users u2 ON c.user2_id = u2.id
+                WHERE c.user1_id = %s OR c.user2_id = %s
+                ORDER BY c.last_message_at DESC
+            ''', (user_id, user_id, user_id, user_id, user_id, user_id))
+            conversations = cursor.fetchall()
+            return [dict(conv) for conv in conversations]
+
+    def send_message(self, conversation_id: int, sender_id: int, content: str) -> Optional[dict]:
+        """
+        Insert a message; returns the new row with the sender's username and avatar_url,
+        or None (nothing inserted) if sender_id is not a user.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                WITH m AS (
+                    INSERT INTO messages (conversation_id, sender_id, content) VALUES (%s, %s, %s)
+                    RETURNING *
+                )
+                SELECT {MESSAGE_COLUMNS}
+                FROM m
+                JOIN users u ON m.sender_id = u.id
+            ''', (conversation_id, sender_id, content))
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            message = dict(row)
+
+            # Update conversation last_message_at
+            cursor.execute(
+                'UPDATE conversations SET last_message_at = CURRENT_TIMESTAMP WHERE id = %s',
+                (conversation_id,)
+            )
+
+            conn.commit()
+            return message
+
+    def get_conversation_messages(self, conversation_id: int, user_id: int, since_id: int = None,
+                                  before_id: int = None, limit: int = None) -> List[dict]:
+        """
+        Messages of a conversation in id (send) order, oldest first.
+
+        since_id: only messages after it, the oldest `limit` of them (catching up).
+        before_id: only messages before it, the newest `limit` of them (older history).
+        Neither: the newest `limit` messages, or all of them without a limit.
+
+        Unless before_id is given, messages from the other member up to the newest
+        one returned (or since_id, which the caller has already seen) are marked read.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            conditions, window_sql, window_params, newest_first = message_window_clause(
+                since_id, before_id, limit, placeholder='%s'
+            )
+            cursor.execute(f'''
+                SELECT {MESSAGE_COLUMNS}
+                FROM messages m
+                JOIN users u ON m.sender_id = u.id
+                {where_sql(['m.conversation_id = %s'] + conditions)}
+                {window_sql}
+            ''', [conversation_id] + window_params)
+            messages = [dict(msg) for msg in cursor.fetchall()]
+            if newest_first:
+                messages.reverse()
+
+            # Mark read receipts; only unread rows from the other member are touched
+            read_up_to = messages[-1]['id'] if messages else since_id
+            if before_id is None and read_up_to is not None:
+                cursor.execute('''
+                    UPDATE messages
+                    SET is_read = TRUE
+                    WHERE conversation_id = %s AND NOT is_read AND sender_id != %s AND id <= %s
+                ''', (conversation_id, user_id, read_up_to))
+
+            conn.commit()
+            return messages
+
+    def get_unread_message_count(self, user_id: int) -> int:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COUNT(*) as count
+                FROM messages m
+                JOIN conversations c ON m.conversation_id = c.id
+                WHERE (c.user1_id = %s OR c.user2_id = %s)
+                  AND m.sender_id != %s
+                  AND NOT m.is_read
+            ''', (user_id, user_id, user_id))
+            result = cursor.fetchone()
+            return result['count']
+
+    def clear_conversation(self, conversation_id: int) -> int:
+        """Clear all messages in a conversation. Returns count of deleted messages."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM messages WHERE conversation_id = %s', (conversation_id,))
+            count = cursor.rowcount
+            conn.commit()
+            return count
+
+    def delete_conversation(self, conversation_id: int) -> bool:
+        """Delete a conversation and all its messages. Returns True if deleted."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM conversations WHERE id = %s', (conversation_id,))
+            deleted = cursor.rowcount > 0
+            conn.commit()
+            return deleted
+
+    # Re-embedding operations
+    def get_thoughts_for_reembedding(self, model: str, after_id: int = 0, limit: int = 500) -> List[dict]:
+        """Next chunk (by id) of thoughts whose embedding was not produced by model."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, content FROM thoughts
+                WHERE id > %s AND embedding_model IS DISTINCT FROM %s
+                ORDER BY id
+                LIMIT %s
+            ''', (after_id, model, limit))
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+
+    def update_thought_embeddings(self, embeddings: List[tuple], model: str, job: str,
+                                  last_thought_id: int, processed: int):
+        """
+        Store (thought_id, embedding) pairs produced by model and advance the
+        job's checkpoint, all in one transaction.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            execute_values(
+                cursor,
+                'UPDATE thoughts SET embedding = data.embedding, embedding_model = data.model '
+                'FROM (VALUES %s) AS data (id, embedding, model) WHERE thoughts.id = data.id',
+                [(thought_id, psycopg2.Binary(encode_embedding(embedding)), model) for thought_id, embedding in embeddings]
+            )
+            cursor.execute('''
+                INSERT INTO reembed_checkpoints (job, model, last_thought_id, processed, updated_at)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (job) DO UPDATE SET
+                    model = EXCLUDED.model,
+                    last_thought_id = EXCLUDED.last_thought_id,
+                    processed = EXCLUDED.processed,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (job, model, last_thought_id, processed))
+            conn.commit()
+
+    def get_reembed_checkpoint(self, job: str) -> Optional[dict]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM reembed_checkpoints WHERE job = %s', (job,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def delete_reembed_checkpoint(self, job: str):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM reembed_checkpoints WHERE job = %s', (job,))
+            conn.commit()
+
+    # Embedding cache operations
+    def get_cached_embedding(self, content_hash: str):
+        """Return the cached embedding for a content hash, or None."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT embedding FROM embedding_cache WHERE content_hash = %s', (content_hash,))
+            row = cursor.fetchone()
+            return decode_embedding(row['embedding']) if row else None
+
+    def put_cached_embedding(self, content_hash: str, model: str, embedding):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT INTO embedding_cache (content_hash, model, embedding) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING',
+                (content_hash, model, psycopg2.Binary(encode_embedding(embedding)))
+            )
+            conn.commit()
+
+    # User profile operations
+    def get_all_user_profiles(self, model: str) -> List[dict]:
+        """Every stored user profile built from embeddings of the given model."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT user_id, thought_count, sums, counts FROM user_profiles WHERE model = %s',
+                (model,)
+            )
+            rows = [
+                {**row, 'sums': bytes(row['sums']), 'counts': bytes(row['counts'])}
+                for row in cursor.fetchall()
+            ]
+            return rows
+
+    def save_user_profiles(self, profiles: List[tuple], model: str):
+        """Upsert (user_id, thought_count, sums, counts) profile rows in one transaction."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            execute_values(cursor, '''
+                INSERT INTO user_profiles (user_id, model, thought_count, sums, counts)
+                VALUES %s
+                ON CONFLICT (user_id) DO UPDATE SET
+                    model = EXCLUDED.model,
+                    thought_count = EXCLUDED.thought_count,
+                    sums = EXCLUDED.sums,
+                    counts = EXCLUDED.counts,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', [
+                (user_id, model, thought_count, psycopg2.Binary(sums), psycopg2.Binary(counts))
+                for user_id, thought_count, sums, counts in profiles
+            ])
+            conn.commit()
+
+    def delete_user_profile(self, user_id: int):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM user_profiles WHERE user_id = %s', (user_id,))
+            conn.commit()
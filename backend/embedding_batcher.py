@@ -0,0 +1,131 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding calls into batched API requests.
+
+    Callers block in embed(). A dispatcher thread takes the first waiting text,
+    keeps collecting for up to window_ms (or until max_batch_size texts are
+    queued) and sends them as one provider.embed([...]) call. At most
+    max_in_flight requests run at once. If a batched request fails, each
+    of its texts is retried on its own so one bad input only fails its caller.
+    """
+
+    def __init__(self, provider, max_batch_size: int = 16, window_ms: float = 10.0,
+                 max_in_flight: int = 4, timeout: float = 30.0):
+        self.provider = provider
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self.timeout = timeout
+
+        self._condition = threading.Condition()
+        self._queue = []  # (text, future)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='embedding-batch')
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+
+        self._requests = 0
+        self._items = 0
+        self._batch_failures = 0
+        self._item_failures = 0
+        self._timeouts = 0
+        self._largest_batch = 0
+
+    def embed(self, text: str) -> List[float]:
+        """Embed one text, sharing an API request with other concurrent callers."""
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Embedding batcher is stopped")
+            self._queue.append((text, future))
+            self._condition.notify()
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Leave the request running; its result is simply dropped
+            with self._condition:
+                self._timeouts += 1
+            raise TimeoutError(f"Embedding request timed out after {self.timeout}s")
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def get_metrics(self) -> dict:
+        with self._condition:
+            return {
+                'queued': len(self._queue),
+                'requests': self._requests,
+                'items': self._items,
+                'avg_batch_size': round(self._items / self._requests, 2) if self._requests else 0.0,
+                'largest_batch': self._largest_batch,
+                'batch_failures': self._batch_failures,
+                'item_failures': self._item_failures,
+                'timeouts': self._timeouts,
+            }
+
+    def _take_batch(self) -> list:
+        with self._condition:
+            while self._running and not self._queue:
+                self._condition.wait()
+            if not self._queue:
+                return []
+            # Give concurrent callers a short window to join this batch
+            deadline = time.monotonic() + self.window
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = self._queue[:self.max_batch_size]
+            del self._queue[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._executor.submit(self._send, batch)
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        with self._condition:
+            self._requests += 1
+            self._items += len(texts)
+            self._largest_batch = max(self._largest_batch, len(texts))
+        return self.provider.embed(texts)
+
+    def _send(self, batch: list):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = self._request(texts)
+        except Exception as e:
+            if len(batch) == 1:
+                self._fail(batch[0][1], e)
+                return
+            print(f"Batched embedding request of {len(batch)} texts failed, retrying individually: {e}")
+            with self._condition:
+                self._batch_failures += 1
+            for text, future in batch:
+                try:
+                    future.set_result(self._request([text])[0])
+                except Exception as item_error:
+                    self._fail(future, item_error)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+
+    def _fail(self, future: Future, error: Exception):
+        with self._condition:
+            self._item_failures += 1
+        future.set_exception(error)
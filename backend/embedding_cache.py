@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+
+
+def normalize_content(text: str) -> str:
+    """Canonical form used for cache keys: NFC, trimmed, whitespace runs collapsed."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def content_hash(text: str, deployment: str) -> str:
+    """Cache key for an embedding: sha256 of the deployment name and normalized content."""
+    raw = f"{deployment or ''}\0{normalize_content(text)}".encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by content_hash().
+
+    The first tier is an in-process LRU bounded by the total size of the stored
+    vectors. Misses fall through to the persistent embedding_cache table (via
+    the database's get_cached_embedding/put_cached_embedding), so entries
+    survive restarts and are shared by every instance on the same database.
+    Pass store=None for a memory-only cache.
+    """
+
+    def __init__(self, store=None, max_bytes: int = 64 * 1024 * 1024):
+        self.store = store
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> float32 vector, least recently used first
+        self._bytes = 0
+
+        self._memory_hits = 0
+        self._store_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._store_errors = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self._memory_hits += 1
+                return embedding
+
+        embedding = None
+        if self.store is not None:
+            try:
+                embedding = self.store.get_cached_embedding(key)
+            except Exception as e:
+                print(f"Error reading embedding cache: {e}")
+                with self._lock:
+                    self._store_errors += 1
+
+        with self._lock:
+            if embedding is None:
+                self._misses += 1
+                return None
+            self._store_hits += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, key: str, embedding, model: str = None):
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+        if self.store is not None:
+            try:
+                self.store.put_cached_embedding(key, model, vector)
+            except Exception as e:
+                print(f"Error writing embedding cache: {e}")
+                with self._lock:
+                    self._store_errors += 1
+
+    def clear(self):
+        """Drop the in-memory tier (the persistent table is left alone)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            lookups = self._memory_hits + self._store_hits + self._misses
+            hits = self._memory_hits + self._store_hits
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'memory_hits': self._memory_hits,
+                'store_hits': self._store_hits,
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'store_errors': self._store_errors,
+            }
+
+    def _remember(self, key: str, vector: np.ndarray):
+        # Caller holds the lock
+        if vector.nbytes > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        self._entries[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self._evictions += 1
@@ -0,0 +1,55 @@
+import json
+import struct
+import numpy as np
+
+# Binary embedding layout: 8-byte header followed by little-endian float32 values.
+# Header is magic (2 bytes), format version (1 byte), padding (1 byte) and the
+# dimension as uint32, so the float payload stays 4-byte aligned.
+EMBEDDING_MAGIC = b'HE'
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_DTYPE = np.dtype('<f4')
+_HEADER = struct.Struct('<2sBxI')
+
+
+def encode_embedding(embedding) -> bytes:
+    """
+    Pack an embedding into the versioned binary float32 format.
+
+    Raises ValueError for a missing embedding or anything but a non-empty
+    1-D vector, rather than storing it as a NaN or flattened vector.
+    """
+    if embedding is None:
+        raise ValueError("Embedding is missing")
+    vector = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+    if vector.ndim != 1 or vector.size == 0:
+        raise ValueError(f"Embedding must be a non-empty 1-D vector, got shape {vector.shape}")
+    return _HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_FORMAT_VERSION, vector.size) + vector.tobytes()
+
+
+def decode_embedding(data) -> np.ndarray:
+    """
+    Unpack a stored embedding as a read-only float32 array.
+
+    Binary values are decoded zero-copy with np.frombuffer. Legacy JSON text
+    (rows not yet migrated) is still accepted.
+    """
+    if isinstance(data, str):
+        return np.asarray(json.loads(data), dtype=np.float32)
+
+    buffer = memoryview(data)
+    magic, version, dim = _HEADER.unpack_from(buffer)
+    if magic != EMBEDDING_MAGIC:
+        raise ValueError("Not a binary embedding")
+    if version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version {version}")
+    return np.frombuffer(buffer, dtype=EMBEDDING_DTYPE, count=dim, offset=_HEADER.size)
+
+
+def embedding_size(dim: int) -> int:
+    """Byte length of a binary embedding with dim values."""
+    return _HEADER.size + dim * EMBEDDING_DTYPE.itemsize
+
+
+def embedding_dimension(data) -> int:
+    """Read the dimension from a binary embedding header without decoding it."""
+    return _HEADER.unpack_from(memoryview(data))[2]
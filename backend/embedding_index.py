@@ -0,0 +1,198 @@
+from collections import Counter
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row of a float32 matrix to unit length (zero rows stay zero)."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingIndex:
+    """
+    Process-wide in-memory index of every thought embedding.
+
+    Rows are stored normalized in one contiguous float32 matrix so cosine
+    similarity against any set of thoughts is a single matrix product.
+    The matrix grows by doubling and deletes swap the last row into the
+    freed slot, so inserts and deletes are amortized O(dim).
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._dim = None
+        self._size = 0
+        self._matrix = None
+        self._thought_ids = np.zeros(0, dtype=np.int64)
+        self._user_ids = np.zeros(0, dtype=np.int64)
+        self._positions = {}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    def load(self, rows: Iterable[dict]):
+        """Replace the index contents with rows of {id, user_id, embedding}."""
+        rows = list(rows)
+        with self._lock:
+            self._dim = None
+            self._size = 0
+            self._matrix = None
+            self._positions = {}
+            if not rows:
+                return
+
+            # Untracked legacy rows may come from a model with another dimension; keep the majority
+            dims = Counter(len(r['embedding']) for r in rows)
+            if len(dims) > 1:
+                dim = dims.most_common(1)[0][0]
+                print(f"Skipping {len(rows) - dims[dim]} embeddings whose dimension is not {dim}")
+                rows = [r for r in rows if len(r['embedding']) == dim]
+
+            matrix = normalize_rows(np.vstack([np.asarray(r['embedding'], dtype=np.float32) for r in rows]))
+            self._dim = matrix.shape[1]
+            capacity = max(self._initial_capacity, len(rows))
+            self._allocate(capacity)
+            self._matrix[:len(rows)] = matrix
+            self._thought_ids[:len(rows)] = [r['id'] for r in rows]
+            self._user_ids[:len(rows)] = [r['user_id'] for r in rows]
+            self._size = len(rows)
+            self._positions = {int(tid): pos for pos, tid in enumerate(self._thought_ids[:self._size])}
+
+    def add(self, thought_id: int, user_id: int, embedding):
+        """Insert (or replace) a single thought embedding."""
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32))[0]
+        with self._lock:
+            if self._dim is None:
+                self._dim = vector.shape[0]
+                self._allocate(self._initial_capacity)
+            elif vector.shape[0] != self._dim:
+                raise ValueError(f"Embedding dimension {vector.shape[0]} does not match index dimension {self._dim}")
+
+            pos = self._positions.get(thought_id)
+            if pos is None:
+                if self._size == self._matrix.shape[0]:
+                    self._allocate(self._matrix.shape[0] * 2)
+                pos = self._size
+                self._size += 1
+                self._positions[thought_id] = pos
+
+            self._matrix[pos] = vector
+            self._thought_ids[pos] = thought_id
+            self._user_ids[pos] = user_id
+
+    def remove(self, thought_id: int) -> bool:
+        """Remove a thought from the index. Returns True if it was present."""
+        with self._lock:
+            pos = self._positions.pop(thought_id, None)
+            if pos is None:
+                return False
+
+            last = self._size - 1
+            if pos != last:
+                # Move the last row into the freed slot to keep rows contiguous
+                self._matrix[pos] = self._matrix[last]
+                self._thought_ids[pos] = self._thought_ids[last]
+                self._user_ids[pos] = self._user_ids[last]
+                self._positions[int(self._thought_ids[pos])] = pos
+            self._size = last
+            return True
+
+    def remove_user(self, user_id: int) -> int:
+        """Remove every thought belonging to a user. Returns the count removed."""
+        with self._lock:
+            thought_ids = self._thought_ids[:self._size][self._user_ids[:self._size] == user_id]
+            for thought_id in thought_ids.tolist():
+                self.remove(thought_id)
+            return len(thought_ids)
+
+    def get(self, thought_id: int) -> Optional[np.ndarray]:
+        """Copy of a thought's normalized embedding, or None if it is not indexed."""
+        with self._lock:
+            pos = self._positions.get(thought_id)
+            return None if pos is None else self._matrix[pos].copy()
+
+    def snapshot(self):
+        """Return copies of (matrix, thought_ids, user_ids) for the live rows."""
+        with self._lock:
+            if self._size == 0:
+                return np.zeros((0, self._dim or 0), dtype=np.float32), self._thought_ids[:0].copy(), self._user_ids[:0].copy()
+            return (self._matrix[:self._size].copy(),
+                    self._thought_ids[:self._size].copy(),
+                    self._user_ids[:self._size].copy())
+
+    def rows_for_users(self, user_ids: Iterable[int]):
+        """Copies of (matrix, user_ids) for the rows owned by any of user_ids only."""
+        wanted = np.fromiter(user_ids, dtype=np.int64)
+        with self._lock:
+            if self._size == 0 or wanted.size == 0:
+                return np.zeros((0, self._dim or 0), dtype=np.float32), self._user_ids[:0].copy()
+            rows = np.flatnonzero(np.isin(self._user_ids[:self._size], wanted))
+            return self._matrix[rows], self._user_ids[rows]
+
+    def get_user_matrix(self, user_id: int) -> np.ndarray:
+        """Normalized embeddings of all thoughts by a user, one per row."""
+        with self._lock:
+            if self._size == 0:
+                return np.zeros((0, self._dim or 0), dtype=np.float32)
+            mask = self._user_ids[:self._size] == user_id
+            return self._matrix[:self._size][mask]
+
+    def max_similarity_to_user(self, user_id: int, thought_ids: Optional[List[int]] = None) -> Dict[int, float]:
+        """
+        For every thought not written by the user, the highest cosine similarity
+        to any of the user's own thoughts. Restricted to thought_ids when given.
+        """
+        with self._lock:
+            user_matrix = self.get_user_matrix(user_id)
+            if user_matrix.shape[0] == 0:
+                return {}
+
+            if thought_ids is None:
+                rows = np.flatnonzero(self._user_ids[:self._size] != user_id)
+            else:
+                rows = np.array([self._positions[tid] for tid in thought_ids if tid in self._positions], dtype=np.int64)
+                rows = rows[self._user_ids[rows] != user_id]
+            if rows.size == 0:
+                return {}
+
+            scores = (self._matrix[rows] @ user_matrix.T).max(axis=1)
+            return dict(zip(self._thought_ids[rows].tolist(), scores.tolist()))
+
+    def similar_to_user(self, user_id: int, threshold: float = 0.7, limit: int = 20) -> List[tuple]:
+        """(thought_id, similarity) pairs of other users' thoughts above threshold, best first."""
+        scores = self.max_similarity_to_user(user_id)
+        if not scores:
+            return []
+
+        ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+        keep = values >= threshold
+        ids, values = ids[keep], values[keep]
+        if limit and values.size > limit:
+            top = np.argpartition(-values, limit - 1)[:limit]
+            ids, values = ids[top], values[top]
+        order = np.argsort(-values, kind='stable')
+        return list(zip(ids[order].tolist(), values[order].tolist()))
+
+    def _allocate(self, capacity: int):
+        matrix = np.zeros((capacity, self._dim), dtype=np.float32)
+        thought_ids = np.zeros(capacity, dtype=np.int64)
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        if self._matrix is not None and self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            thought_ids[:self._size] = self._thought_ids[:self._size]
+            user_ids[:self._size] = self._user_ids[:self._size]
+        self._matrix = matrix
+        self._thought_ids = thought_ids
+        self._user_ids = user_ids
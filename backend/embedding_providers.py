@@ -0,0 +1,101 @@
+import hashlib
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import List
+import numpy as np
+
+LOCAL_EMBEDDING_DIM = 1024
+
+_TOKEN_RE = re.compile(r"[\w']+", re.UNICODE)
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into vectors. `model` names the vector space, and is stored per thought.
+    Subclasses must implement embed(); one that doesn't can't be constructed.
+    """
+
+    model: str = None
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in input order."""
+
+
+class AzureOpenAIProvider(EmbeddingProvider):
+    """
+    Azure OpenAI embeddings deployment. client defaults to an AzureOpenAI client
+    built from the environment; any object with the same embeddings.create()
+    call works (see fake_embeddings).
+    """
+
+    def __init__(self, client=None, deployment: str = None):
+        if client is None:
+            from openai import AzureOpenAI
+            client = AzureOpenAI(
+                api_version=os.getenv('AZURE_OPENAI_API_VERSION'),
+                azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
+                api_key=os.getenv('AZURE_OPENAI_API_KEY')
+            )
+        self.client = client
+        self.model = deployment or os.getenv('AZURE_OPENAI_DEPLOYMENT')
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=list(texts))
+        embeddings = [None] * len(texts)
+        for item in response.data:
+            embeddings[item.index] = item.embedding
+        if any(embedding is None for embedding in embeddings):
+            raise ValueError("Embedding response is missing items")
+        return embeddings
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic local embeddings with no network or model files.
+
+    Lower-cased word unigrams and bigrams are hashed into `dim` signed buckets
+    (the hashing trick), counts are dampened with log(1 + tf) and the vector
+    is L2-normalized. Texts that share words get a positive cosine, so feeds,
+    thoughtmates and benchmarks see realistic similarity structure. Vectors
+    are not comparable with any remote model's.
+    """
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.model = f'local-hashing-{dim}'
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        return [self._embed_one(text) for text in texts]
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little') for f in features],
+            dtype=np.uint64
+        )
+        buckets = (hashes % np.uint64(self.dim)).astype(np.intp)
+        signs = np.where(hashes >> np.uint64(63), 1.0, -1.0).astype(np.float32)
+        np.add.at(vector, buckets, signs)
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def create_provider(name: str = None) -> EmbeddingProvider:
+    """
+    Build the provider named by EMBEDDING_PROVIDER: 'azure' (default) or
+    'local' (HashingEmbeddingProvider, dimension from LOCAL_EMBEDDING_DIM).
+    """
+    name = (name or os.getenv('EMBEDDING_PROVIDER', 'azure')).lower()
+    if name == 'azure':
+        return AzureOpenAIProvider()
+    if name == 'local':
+        return HashingEmbeddingProvider(int(os.getenv('LOCAL_EMBEDDING_DIM', LOCAL_EMBEDDING_DIM)))
+    raise ValueError(f"Unknown embedding provider: {name}")
@@ -1,27 +1,124 @@
-import os
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 import numpy as np
-from typing import List
+from typing import Dict, List, Tuple
+from embedding_index import normalize_rows
+from embedding_cache import content_hash
+from embedding_providers import create_provider
 
 load_dotenv()
 
+
+def owner_segments(owners: np.ndarray):
+    """(owner_ids, first_column, column_counts) of a sorted owner array."""
+    return np.unique(owners, return_index=True, return_counts=True)
+
+
+def top_k_average_by_owner(scores: np.ndarray, owners: np.ndarray, top_k: int = 5, segments=None):
+    """
+    Top-K average of a score matrix per column owner.
+
+    scores is (user thoughts x candidate thoughts) and owners gives the owner
+    of each column, sorted so every owner's columns are contiguous. segments
+    may pass owner_segments(owners) precomputed when the same columns are
+    scored repeatedly. Returns (owner_ids, similarities) arrays.
+    """
+    # Only the K best rows of each column can reach a user's overall top K
+    rows = scores.shape[0]
+    if rows > top_k:
+        best = np.argpartition(scores, rows - top_k, axis=0)[rows - top_k:]
+        scores = np.take_along_axis(scores, best, axis=0)
+
+    # Flatten column-major: every candidate user is one contiguous segment
+    per_column = scores.shape[0]
+    values = np.ascontiguousarray(scores.T).ravel()
+    user_ids, first_column, column_counts = segments if segments is not None else owner_segments(owners)
+    starts = first_column * per_column
+    lengths = column_counts * per_column
+
+    # K rounds of segmented max; each round removes one winner per segment
+    totals = np.zeros(len(user_ids), dtype=np.float64)
+    positions = np.arange(values.size)
+    for _ in range(min(top_k, int(lengths.max()))):
+        segment_max = np.maximum.reduceat(values, starts)
+        valid = np.isfinite(segment_max)
+        totals[valid] += segment_max[valid]
+        is_max = values == np.repeat(segment_max, lengths)
+        winners = np.minimum.reduceat(np.where(is_max, positions, values.size), starts)
+        values[winners[valid]] = -np.inf
+
+    return user_ids, totals / np.minimum(lengths, top_k)
+
+
 class EmbeddingService:
-    def __init__(self):
-        self.client = AzureOpenAI(
-            api_version=os.getenv('AZURE_OPENAI_API_VERSION'),
-            azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
-            api_key=os.getenv('AZURE_OPENAI_API_KEY')
-        )
-        self.deployment = os.getenv('AZURE_OPENAI_DEPLOYMENT')
+    def __init__(self, provider=None, cache=None, batcher=None, fallback=None):
+        """
+        provider defaults to the one selected by EMBEDDING_PROVIDER (see embedding_providers).
+        cache is an optional EmbeddingCache consulted before calling the provider.
+        batcher is an optional EmbeddingBatcher that single-text cache misses go through.
+        fallback is an optional provider used by embed_for_storage when the primary fails.
+        """
+        self.provider = provider or create_provider()
+        self.cache = cache
+        self.batcher = batcher
+        self.fallback = fallback
+
+    @property
+    def model(self) -> str:
+        return self.provider.model
 
     def get_embedding(self, text: str) -> List[float]:
-        """Generate embedding for a single text."""
-        response = self.client.embeddings.create(
-            model=self.deployment,
-            input=text
-        )
-        return response.data[0].embedding
+        """Generate embedding for a single text, served from the cache when possible."""
+        key = None
+        if self.cache is not None:
+            key = content_hash(text, self.model)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self.batcher is not None:
+            embedding = self.batcher.embed(text)
+        else:
+            embedding = self.provider.embed([text])[0]
+        if key is not None:
+            self.cache.put(key, embedding, self.model)
+        return embedding
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several texts with one provider call (bypasses the batcher).
+        Texts already in the cache are not sent.
+        """
+        results = [None] * len(texts)
+        keys = [content_hash(text, self.model) for text in texts] if self.cache is not None else None
+        missing = []
+        for i in range(len(texts)):
+            cached = self.cache.get(keys[i]) if keys else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.append(i)
+
+        if missing:
+            embeddings = self.provider.embed([texts[i] for i in missing])
+            for i, embedding in zip(missing, embeddings):
+                results[i] = embedding
+                if keys:
+                    self.cache.put(keys[i], embedding, self.model)
+        return results
+
+    def embed_for_storage(self, text: str) -> Tuple[List[float], str]:
+        """
+        Embed a new thought. Returns (embedding, model). If the primary provider
+        fails or times out and a fallback is configured, the fallback's vector is
+        returned with its own model name so the thought can be re-embedded later.
+        """
+        try:
+            return self.get_embedding(text), self.model
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"Embedding provider {self.model} failed ({e}), using {self.fallback.model}")
+            return self.fallback.embed([text])[0], self.fallback.model
 
     def cosine_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """Calculate cosine similarity between two embeddings."""
@@ -37,10 +134,24 @@ class EmbeddingService:
 
         return float(dot_product / (norm1 * norm2))
 
-    def find_similar_thoughts(self, target_embedding: List[float], all_thoughts: List[dict], threshold: float = 0.7) -> List[dict]:
-        """Find thoughts similar to the target embedding."""
+    def find_similar_thoughts(self, target_embedding: List[float], all_thoughts: List[dict], threshold: float = 0.7,
+                              ann_index=None, limit: int = 20) -> List[dict]:
+        """
+        Find thoughts similar to the target embedding.
+        With an ann_index, only its approximate top `limit` neighbours are considered.
+        """
         similar_thoughts = []
 
+        if ann_index is not None:
+            scores = dict(ann_index.search(target_embedding, k=limit, threshold=threshold))
+            for thought in all_thoughts:
+                if thought['id'] in scores:
+                    thought_copy = thought.copy()
+                    thought_copy['similarity_score'] = scores[thought['id']]
+                    similar_thoughts.append(thought_copy)
+            similar_thoughts.sort(key=lambda x: x['similarity_score'], reverse=True)
+            return similar_thoughts
+
         for thought in all_thoughts:
             similarity = self.cosine_similarity(target_embedding, thought['embedding'])
             if similarity >= threshold:
@@ -61,20 +172,39 @@ class EmbeddingService:
         if not user1_thoughts or not user2_thoughts:
             return 0.0
 
-        similarities = []
-
-        # Compare each thought from user1 with each thought from user2
-        for t1 in user1_thoughts:
-            for t2 in user2_thoughts:
-                similarity = self.cosine_similarity(t1['embedding'], t2['embedding'])
-                similarities.append(similarity)
+        matrix1 = normalize_rows(np.vstack([np.asarray(t['embedding'], dtype=np.float32) for t in user1_thoughts]))
+        matrix2 = normalize_rows(np.vstack([np.asarray(t['embedding'], dtype=np.float32) for t in user2_thoughts]))
+        return self.top_k_similarity(matrix1, matrix2, top_k)
 
-        if not similarities:
+    def top_k_similarity(self, matrix1: np.ndarray, matrix2: np.ndarray, top_k: int = 5) -> float:
+        """
+        Top-K average cosine similarity between two stacks of normalized embeddings.
+        One matrix product, then a partial selection of the K best pairs.
+        """
+        if len(matrix1) == 0 or len(matrix2) == 0:
             return 0.0
 
-        # Sort similarities in descending order and take top K
-        similarities.sort(reverse=True)
-        top_similarities = similarities[:min(top_k, len(similarities))]
+        scores = (matrix1 @ matrix2.T).ravel()
+        k = min(top_k, scores.size)
+        top = scores[np.argpartition(scores, scores.size - k)[scores.size - k:]]
+        return float(top.mean())
+
+    def calculate_user_similarities(self, user_matrix: np.ndarray, candidate_matrix: np.ndarray,
+                                    candidate_user_ids: np.ndarray, top_k: int = 5) -> Dict[int, float]:
+        """
+        Top-K average similarity between one user and many candidate users at once.
+
+        user_matrix holds the user's normalized thought embeddings, candidate_matrix
+        the normalized embeddings of every candidate thought and candidate_user_ids
+        the owner of each candidate row. Returns {candidate_user_id: similarity}.
+        """
+        if len(user_matrix) == 0 or len(candidate_matrix) == 0:
+            return {}
+
+        # Group candidate rows by owner so each user's scores are contiguous
+        order = np.argsort(candidate_user_ids, kind='stable')
+        owners = np.asarray(candidate_user_ids)[order]
+        scores = user_matrix @ candidate_matrix[order].T
 
-        # Return average of top K similarities
-        return sum(top_similarities) / len(top_similarities)
+        user_ids, similarities = top_k_average_by_owner(scores, owners, top_k)
+        return dict(zip(user_ids.tolist(), similarities.tolist()))
@@ -0,0 +1,270 @@
+"""
+Coalesced and paced delivery of high-rate Socket.IO state events.
+
+Like counts on a popular thought can change many times a second. Sending
+every change to every subscriber floods sockets and keeps the event loop
+busy with encoding and writes. Two layers keep that bounded:
+
+  EmitScheduler   sender side. State events are queued per (room, entity)
+                  and emitted once per flush interval; a newer event for
+                  the same entity replaces the queued one (last count wins).
+
+  PacedDelivery   receiving side, mixed into the Socket.IO client manager of
+                  every worker. Paced events reach each socket through a
+                  token bucket (rate per second, burst). A socket that is out
+                  of tokens, or whose Engine.IO send queue is backed up (a
+                  slow consumer), gets the event deferred instead; deferred
+                  events are kept per room, newest only, and sent as tokens
+                  come back. Past max_deferred rooms the oldest is dropped.
+
+Only events whose payload supersedes earlier ones (absolute counts) may be
+paced or coalesced; everything else is emitted and delivered unchanged.
+"""
+import threading
+import time
+from collections import OrderedDict
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+
+
+class _SocketPace:
+    """Token bucket and deferred events of one socket."""
+    __slots__ = ('tokens', 'updated', 'deferred')
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.deferred = OrderedDict()  # room -> (eio_sid, Engine.IO packets)
+
+    def refill(self, now: float, rate: float, burst: float):
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class PacedDelivery(socketio.Manager):
+    """
+    Socket.IO manager that rate-limits paced events per socket.
+
+    Use directly for a single process, or through paced_manager_class() on
+    top of a message-queue manager so delivery on every worker is paced.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pacing_lock = threading.Lock()
+        self._paces = {}  # sid -> _SocketPace
+        self.configure_pacing()
+
+        self._delivered = 0
+        self._deferred = 0
+        self._pace_coalesced = 0
+        self._dropped = 0
+        self._backpressured = 0
+
+    def configure_pacing(self, events=(), rate: float = 20.0, burst: float = 40.0,
+                         max_queued_packets: int = 64, max_deferred: int = 200):
+        """
+        events: event names to pace. rate/burst: paced events per second and
+        bucket size per socket. max_queued_packets: Engine.IO send queue length
+        beyond which a socket counts as slow. max_deferred: rooms with a
+        deferred event kept per socket.
+        """
+        self.paced_events = frozenset(events)
+        self.rate = rate
+        self.burst = burst
+        self.max_queued_packets = max_queued_packets
+        self.max_deferred = max_deferred
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs):
+        if event not in self.paced_events or callback is not None or not isinstance(room, str):
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, **kwargs)
+        if namespace not in self.rooms:
+            return
+
+        eio_pkts = self._encode(event, data, namespace)
+        skip_sid = skip_sid if isinstance(skip_sid, list) else [skip_sid]
+        now = time.monotonic()
+        sends = []
+        with self._pacing_lock:
+            for sid, eio_sid in self.get_participants(namespace, room):
+                if sid in skip_sid:
+                    continue
+                pace = self._paces.get(sid)
+                if pace is None:
+                    pace = self._paces[sid] = _SocketPace(self.burst, now)
+                pace.refill(now, self.rate, self.burst)
+
+                slow = self._backed_up(eio_sid)
+                if slow:
+                    self._backpressured += 1
+                if pace.tokens >= 1 and not slow:
+                    pace.tokens -= 1
+                    if pace.deferred.pop(room, None) is not None:
+                        self._pace_coalesced += 1
+                    sends.append(eio_sid)
+                    continue
+
+                if room in pace.deferred:
+                    self._pace_coalesced += 1
+                else:
+                    self._deferred += 1
+                pace.deferred[room] = (eio_sid, eio_pkts)
+                if len(pace.deferred) > self.max_deferred:
+                    pace.deferred.popitem(last=False)
+                    self._dropped += 1
+            self._delivered += len(sends)
+
+        for eio_sid in sends:
+            self._send(eio_sid, eio_pkts)
+
+    def flush_deferred(self) -> int:
+        """Send deferred events for which sockets have tokens again. Returns the number sent."""
+        now = time.monotonic()
+        sends = []
+        with self._pacing_lock:
+            for pace in self._paces.values():
+                if not pace.deferred:
+                    continue
+                pace.refill(now, self.rate, self.burst)
+                while pace.deferred and pace.tokens >= 1:
+                    _, (eio_sid, eio_pkts) = next(iter(pace.deferred.items()))
+                    if self._backed_up(eio_sid):
+                        break
+                    pace.deferred.popitem(last=False)
+                    pace.tokens -= 1
+                    sends.append((eio_sid, eio_pkts))
+            self._delivered += len(sends)
+
+        for eio_sid, eio_pkts in sends:
+            self._send(eio_sid, eio_pkts)
+        return len(sends)
+
+    def disconnect(self, sid, namespace, **kwargs):
+        with self._pacing_lock:
+            self._paces.pop(sid, None)
+        return super().disconnect(sid, namespace, **kwargs)
+
+    def get_pacing_metrics(self) -> dict:
+        with self._pacing_lock:
+            return {
+                'delivered': self._delivered,
+                'deferred': self._deferred,
+                'coalesced': self._pace_coalesced,
+                'dropped': self._dropped,
+                'backpressured': self._backpressured,
+                'deferred_pending': sum(len(pace.deferred) for pace in self._paces.values()),
+            }
+
+    def _encode(self, event, data, namespace):
+        # Same encoding as socketio.Manager.emit: one packet shared by every recipient
+        data = list(data) if isinstance(data, tuple) else ([] if data is None else [data])
+        encoded = self.server.packet_class(packet.EVENT, namespace=namespace, data=[event] + data).encode()
+        if not isinstance(encoded, list):
+            encoded = [encoded]
+        return [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded]
+
+    def _backed_up(self, eio_sid) -> bool:
+        eio_socket = self.server.eio.sockets.get(eio_sid)
+        return eio_socket is not None and eio_socket.queue.qsize() >= self.max_queued_packets
+
+    def _send(self, eio_sid, eio_pkts):
+        for p in eio_pkts:
+            self.server._send_eio_packet(eio_sid, p)
+
+
+def paced_manager_class(manager_class):
+    """manager_class (e.g. socketio.RedisManager) with PacedDelivery on its local delivery."""
+    if issubclass(manager_class, PacedDelivery):
+        return manager_class
+    if manager_class is socketio.Manager:
+        return PacedDelivery
+    # MRO: manager_class, ..., PubSubManager, PacedDelivery, Manager, so events
+    # received from the queue are delivered through PacedDelivery.emit
+    return type(f'Paced{manager_class.__name__}', (manager_class, PacedDelivery), {})
+
+
+class EmitScheduler:
+    """
+    Emits state events at most once per flush interval per (room, entity).
+
+    Runs as a Socket.IO background task, so it yields to the event loop
+    between flushes; each flush also sends events deferred by a
+    PacedDelivery manager.
+    """
+
+    def __init__(self, socketio_server, flush_interval: float = 0.1, delivery=None):
+        self.socketio = socketio_server
+        self.flush_interval = flush_interval
+        self.delivery = delivery if isinstance(delivery, PacedDelivery) else None
+
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # (room, entity) -> (event, data)
+        self._running = False
+
+        self._scheduled = 0
+        self._coalesced = 0
+        self._emitted = 0
+        self._flushes = 0
+        self._flush_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self.socketio.start_background_task(self._run)
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+        self.flush()
+
+    def emit(self, event: str, data, room: str, entity):
+        """Queue event for room; replaces an event for the same entity queued since the last flush."""
+        with self._lock:
+            self._scheduled += 1
+            if (room, entity) in self._pending:
+                self._coalesced += 1
+            self._pending[(room, entity)] = (event, data)
+
+    def flush(self) -> int:
+        """Emit every queued event. Returns the number emitted."""
+        started = time.perf_counter()
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            self._flushes += 1
+            self._emitted += len(pending)
+        for (room, _), (event, data) in pending.items():
+            self.socketio.emit(event, data, to=room)
+        if self.delivery is not None:
+            self.delivery.flush_deferred()
+        with self._lock:
+            self._flush_seconds += time.perf_counter() - started
+        return len(pending)
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            metrics = {
+                'pending': len(self._pending),
+                'scheduled': self._scheduled,
+                'coalesced': self._coalesced,
+                'emitted': self._emitted,
+                'flushes': self._flushes,
+                'flush_seconds': round(self._flush_seconds, 3),
+                'flush_interval_ms': round(self.flush_interval * 1000, 1),
+            }
+        if self.delivery is not None:
+            metrics['delivery'] = self.delivery.get_pacing_metrics()
+        return metrics
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.flush_interval)
+            with self._lock:
+                if not self._running:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[EMIT SCHEDULER] Flush failed: {e}")
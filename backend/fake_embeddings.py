@@ -0,0 +1,147 @@
+"""
+Local stand-in for the Azure OpenAI embeddings client.
+
+FakeEmbeddingClient exposes the same client.embeddings.create(model=, input=)
+call as the openai SDK and returns deterministic vectors derived from a hash
+of each input, so EmbeddingService and everything built on it can run without
+network access or credentials. It counts requests and inputs so callers can
+check how much work reached the "API".
+
+FakeEmbeddingServer serves the same vectors over HTTP in the shape of the
+Azure OpenAI embeddings endpoint, with configurable latency, for exercising
+the real openai client (benchmarks, bulk jobs).
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List, Union
+import numpy as np
+
+FAKE_EMBEDDING_DIM = 1536
+
+
+def fake_embedding(text: str, dim: int = FAKE_EMBEDDING_DIM) -> List[float]:
+    """Deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model: str, input: Union[str, List[str]]):
+        inputs = [input] if isinstance(input, str) else list(input)
+        with self._owner._lock:
+            self._owner.requests += 1
+            self._owner.inputs += len(inputs)
+        data = [
+            SimpleNamespace(index=i, embedding=fake_embedding(text, self._owner.dim))
+            for i, text in enumerate(inputs)
+        ]
+        return SimpleNamespace(data=data, model=model)
+
+
+class FakeEmbeddingClient:
+    def __init__(self, dim: int = FAKE_EMBEDDING_DIM):
+        self.dim = dim
+        self.requests = 0
+        self.inputs = 0
+        self._lock = threading.Lock()
+        self.embeddings = _FakeEmbeddings(self)
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # bursts of concurrent clients connect at once
+
+
+class FakeEmbeddingServer:
+    """
+    Threaded HTTP stub of POST /openai/deployments/<deployment>/embeddings.
+
+    Each request sleeps latency_ms plus per_item_ms per input before
+    answering. At most max_concurrency requests are served at once (a stand-in
+    for the deployment's rate limit); the rest wait their turn. Inputs
+    containing fail_marker make the whole request fail with 400, like the real
+    API does for an invalid item.
+    """
+
+    def __init__(self, latency_ms: float = 50.0, per_item_ms: float = 0.0, dim: int = FAKE_EMBEDDING_DIM,
+                 max_concurrency: int = None, fail_marker: str = None, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.dim = dim
+        self.fail_marker = fail_marker
+        self.requests = 0
+        self.inputs = 0
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_concurrency) if max_concurrency else None
+        self._server = _StubHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-embeddings', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+                with server._lock:
+                    server.requests += 1
+                    server.inputs += len(inputs)
+                if server._slots:
+                    with server._slots:
+                        time.sleep(server.latency + server.per_item * len(inputs))
+                else:
+                    time.sleep(server.latency + server.per_item * len(inputs))
+
+                if server.fail_marker and any(server.fail_marker in text for text in inputs):
+                    self._reply(400, {'error': {'message': 'Invalid input', 'type': 'invalid_request_error'}})
+                    return
+                vectors = [fake_embedding(text, server.dim) for text in inputs]
+                if body.get('encoding_format') == 'base64':
+                    # The openai SDK asks for base64 float32 when numpy is available
+                    vectors = [base64.b64encode(np.asarray(v, dtype='<f4').tobytes()).decode('ascii') for v in vectors]
+                self._reply(200, {
+                    'object': 'list',
+                    'model': body.get('model'),
+                    'data': [
+                        {'object': 'embedding', 'index': i, 'embedding': vector}
+                        for i, vector in enumerate(vectors)
+                    ],
+                    'usage': {'prompt_tokens': len(inputs), 'total_tokens': len(inputs)},
+                })
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,127 @@
+import threading
+import time
+from typing import Dict, List, Optional
+import requests
+from jose import jwk
+
+
+class JWKSKeyStore:
+    """
+    Signing keys from a JWKS endpoint, constructed once and looked up by kid.
+
+    Keys are refreshed in a background thread once they are older than ttl;
+    requests keep using the current keys meanwhile. A token with an unknown
+    kid (e.g. after a key rotation) triggers a synchronous refetch, at most
+    once every min_refetch_interval seconds. Concurrent refetches are
+    single-flight: threads that wait on an in-progress fetch reuse its result.
+    If a refresh fails, the previous keys stay in use.
+    """
+
+    def __init__(self, jwks_url: str, algorithms: List[str], ttl: float = 600.0, timeout: float = 5.0,
+                 min_refetch_interval: float = 30.0):
+        self.jwks_url = jwks_url
+        self.algorithms = algorithms
+        self.ttl = ttl
+        self.timeout = timeout
+        self.min_refetch_interval = min_refetch_interval
+
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._keys: Dict[str, object] = {}
+        self._fetched_at = None
+        self._attempted_at = None
+        self._generation = 0
+        self._refreshing = False
+
+        self._fetches = 0
+        self._fetch_errors = 0
+        self._unknown_kids = 0
+
+    def get_key(self, kid: str):
+        """Constructed key for kid, or None if the JWKS does not contain it."""
+        if self._fetched_at is None:
+            if not self._recently_attempted():
+                self.refresh(self._generation)
+        elif time.time() - self._fetched_at > self.ttl and not self._recently_attempted():
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        with self._lock:
+            self._unknown_kids += 1
+            generation = self._generation
+        if not self._recently_attempted():
+            self.refresh(generation)
+        return self._keys.get(kid)
+
+    def refresh(self, seen_generation: Optional[int] = None) -> bool:
+        """
+        Fetch the JWKS and swap in its keys. With seen_generation, the fetch is
+        skipped if another thread finished one since that generation was read.
+        """
+        with self._fetch_lock:
+            if seen_generation is not None and self._generation != seen_generation:
+                return True
+            with self._lock:
+                self._attempted_at = time.time()
+                self._fetches += 1
+            try:
+                response = requests.get(self.jwks_url, timeout=self.timeout)
+                response.raise_for_status()
+                keys = self._construct_keys(response.json())
+            except Exception as e:
+                print(f"Error fetching JWKS from {self.jwks_url}: {e}")
+                with self._lock:
+                    self._fetch_errors += 1
+                return False
+
+            with self._lock:
+                self._keys = keys
+                self._fetched_at = time.time()
+                self._generation += 1
+            return True
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {
+                'keys': len(self._keys),
+                'age_seconds': round(time.time() - self._fetched_at, 1) if self._fetched_at else None,
+                'fetches': self._fetches,
+                'fetch_errors': self._fetch_errors,
+                'unknown_kids': self._unknown_kids,
+            }
+
+    def _recently_attempted(self) -> bool:
+        attempted_at = self._attempted_at
+        return attempted_at is not None and time.time() - attempted_at < self.min_refetch_interval
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh(self._generation)
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name='jwks-refresh', daemon=True).start()
+
+    def _construct_keys(self, jwks: dict) -> Dict[str, object]:
+        keys = {}
+        for key in jwks.get('keys', []):
+            if key.get('use', 'sig') != 'sig' or 'kid' not in key:
+                continue
+            algorithm = key.get('alg') or self.algorithms[0]
+            if algorithm not in self.algorithms:
+                continue
+            try:
+                keys[key['kid']] = jwk.construct(key, algorithm)
+            except Exception as e:
+                print(f"Skipping JWKS key {key['kid']}: {e}")
+        return keys
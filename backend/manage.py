@@ -0,0 +1,126 @@
+"""
+Maintenance commands for the HTLY backend.
+
+Usage:
+    python manage.py repair-counters
+    python manage.py check-queries
+    python manage.py reembed [--model DEPLOYMENT] [--concurrency 4] [--rps 10] [--restart]
+    python manage.py rebuild-matches [--block-size 4096] [--workers 4] [--top-n 50] [--dry-run]
+    python manage.py fake-embeddings-server [--port 8089]
+"""
+import argparse
+import sys
+import time
+from database import create_database
+
+
+def repair_counters(args):
+    """Recompute denormalized like/comment counters on every thought"""
+    db = create_database()
+    fixed = db.repair_thought_counters()
+    print(f"Repaired counters on {fixed} thoughts")
+
+
+def check_queries(args):
+    """Report full table scans in the query plans of every Database query"""
+    from query_plan_check import check_query_plans, print_report
+    report = check_query_plans()
+    print_report(report)
+    if report['full_scans']:
+        sys.exit(1)
+
+
+def reembed(args):
+    """Re-embed thoughts produced by another model, then rebuild matches"""
+    from embedding_cache import EmbeddingCache
+    from embedding_providers import AzureOpenAIProvider, create_provider
+    from embedding_service import EmbeddingService
+    from reembed import ReembedPipeline
+    db = create_database()
+    provider = AzureOpenAIProvider(deployment=args.model) if args.model else create_provider()
+    service = EmbeddingService(provider=provider, cache=EmbeddingCache(db))
+    pipeline = ReembedPipeline(
+        db,
+        service,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        requests_per_second=args.rps
+    )
+    stats = pipeline.run(restart=args.restart, rebuild_matches=not args.skip_matches)
+    print(f"Done: {stats}")
+
+
+def rebuild_matches(args):
+    """Recompute the whole matches table with blocked matrix products"""
+    from embedding_providers import create_provider
+    from match_rebuild import MatchRebuildJob
+    db = create_database()
+    job = MatchRebuildJob(
+        db,
+        model=args.model or create_provider().model,
+        block_size=args.block_size,
+        workers=args.workers,
+        top_n=args.top_n,
+        top_k=args.top_k
+    )
+    stats = job.run(dry_run=args.dry_run)
+    print(f"Done: {stats}")
+
+
+def fake_embeddings_server(args):
+    """Serve deterministic fake embeddings; point AZURE_OPENAI_ENDPOINT at it for local runs"""
+    from fake_embeddings import FakeEmbeddingServer
+    server = FakeEmbeddingServer(latency_ms=args.latency_ms, dim=args.dim, port=args.port).start()
+    print(f"Fake embeddings server listening on {server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTLY maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    repair_parser = subparsers.add_parser('repair-counters', help='Backfill like/comment counters on thoughts')
+    repair_parser.set_defaults(func=repair_counters)
+
+    check_parser = subparsers.add_parser('check-queries', help='Run EXPLAIN QUERY PLAN over every Database query')
+    check_parser.set_defaults(func=check_queries)
+
+    reembed_parser = subparsers.add_parser('reembed', help='Re-embed thoughts with the current embedding model')
+    reembed_parser.add_argument('--model', default=None,
+                                help='Azure deployment to move every thought to (default: the EMBEDDING_PROVIDER model)')
+    reembed_parser.add_argument('--chunk-size', type=int, default=500, help='Thoughts per committed chunk')
+    reembed_parser.add_argument('--batch-size', type=int, default=64, help='Texts per embeddings request')
+    reembed_parser.add_argument('--concurrency', type=int, default=4, help='Embeddings requests in flight')
+    reembed_parser.add_argument('--rps', type=float, default=None, help='Max embeddings requests per second')
+    reembed_parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint')
+    reembed_parser.add_argument('--skip-matches', action='store_true', help="Don't rebuild matches afterwards")
+    reembed_parser.set_defaults(func=reembed)
+
+    rebuild_parser = subparsers.add_parser('rebuild-matches', help='Rebuild thoughtmate matches for every user')
+    rebuild_parser.add_argument('--model', default=None,
+                                help='Only use embeddings from this model (default: the EMBEDDING_PROVIDER model)')
+    rebuild_parser.add_argument('--block-size', type=int, default=4096,
+                                help='Thoughts scored per matrix product (bounds memory)')
+    rebuild_parser.add_argument('--workers', type=int, default=1, help='Processes scoring blocks in parallel')
+    rebuild_parser.add_argument('--top-n', type=int, default=50, help='Matches kept per user')
+    rebuild_parser.add_argument('--top-k', type=int, default=5, help='Thought pairs averaged per user pair')
+    rebuild_parser.add_argument('--dry-run', action='store_true', help="Score everything but don't write matches")
+    rebuild_parser.set_defaults(func=rebuild_matches)
+
+    fake_parser = subparsers.add_parser('fake-embeddings-server', help='Run a local stub of the embeddings API')
+    fake_parser.add_argument('--port', type=int, default=8089)
+    fake_parser.add_argument('--latency-ms', type=float, default=20.0)
+    fake_parser.add_argument('--dim', type=int, default=1536)
+    fake_parser.set_defaults(func=fake_embeddings_server)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import multiprocessing
+import resource
+import sys
+import time
+from typing import List
+import numpy as np
+from embedding_index import EmbeddingIndex
+from embedding_service import owner_segments, top_k_average_by_owner
+from match_worker import MATCH_THRESHOLD
+
+# Set by _init_block_state in the parent (single process) or in each pool worker
+_block_state = {}
+
+
+def _init_block_state(matrix, owners, block_bounds, top_k, threshold, top_n):
+    _block_state.update(
+        matrix=matrix,
+        owners=owners,
+        segments=owner_segments(owners),
+        block_bounds=block_bounds,
+        top_k=top_k,
+        threshold=threshold,
+        top_n=top_n,
+    )
+
+
+def _score_block(block: int) -> List[tuple]:
+    """
+    Score every user of one block against all thoughts with a single GEMM.
+    Returns (user_id, matched_user_id, similarity) rows, top_n per user.
+    """
+    state = _block_state
+    matrix, owners = state['matrix'], state['owners']
+    user_ids, first_row, row_counts = state['segments']
+    first_user, last_user = state['block_bounds'][block]
+    row_start = first_row[first_user]
+    row_stop = first_row[last_user - 1] + row_counts[last_user - 1]
+
+    scores = matrix[row_start:row_stop] @ matrix.T
+    rows = []
+    for u in range(first_user, last_user):
+        lo = first_row[u] - row_start
+        candidates, similarities = top_k_average_by_owner(
+            scores[lo:lo + row_counts[u]], owners, state['top_k'], state['segments']
+        )
+        keep = (candidates != user_ids[u]) & (similarities > state['threshold'])
+        candidates, similarities = candidates[keep], similarities[keep]
+        if similarities.size > state['top_n']:
+            top = np.argpartition(-similarities, state['top_n'] - 1)[:state['top_n']]
+            candidates, similarities = candidates[top], similarities[top]
+        user_id = int(user_ids[u])
+        rows.extend((user_id, other_id, score) for other_id, score in zip(candidates.tolist(), similarities.tolist()))
+    return rows
+
+
+def peak_memory_mb(who=resource.RUSAGE_SELF) -> float:
+    """Peak resident set size in MB (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class MatchRebuildJob:
+    """
+    Rebuilds the whole matches table from the thought embeddings.
+
+    Thoughts are loaded into one normalized float32 matrix sorted by author
+    and users are grouped into blocks of about block_size thoughts. Each block
+    is scored against every thought with one matrix product, so the score
+    buffer is bounded by block_size x thoughts floats (a single user with
+    more thoughts than block_size gets a block of their own). The same top-K
+    average as MatchRecomputeWorker is applied per user pair and only each
+    user's top_n matches above threshold are kept. With workers > 1, blocks
+    are scored in a multiprocessing pool.
+
+    The table is replaced in one transaction, which also prunes rows left
+    behind by deleted thoughts and users.
+    """
+
+    def __init__(self, db, model: str = None, block_size: int = 4096, workers: int = 1, top_n: int = 50,
+                 top_k: int = 5, threshold: float = MATCH_THRESHOLD):
+        self.db = db
+        self.model = model
+        self.block_size = block_size
+        self.workers = workers
+        self.top_n = top_n
+        self.top_k = top_k
+        self.threshold = threshold
+
+    def run(self, dry_run: bool = False) -> dict:
+        started = time.time()
+        index = EmbeddingIndex()
+        index.load(self.db.get_all_thought_embeddings(model=self.model))
+        matrix, _, owner_ids = index.snapshot()
+        del index
+        order = np.argsort(owner_ids, kind='stable')
+        matrix, owners = matrix[order], owner_ids[order]
+        loaded = time.time()
+
+        block_bounds = self._block_bounds(owners)
+        rows = self._score_blocks(matrix, owners, block_bounds)
+        scored = time.time()
+
+        if not dry_run:
+            self.db.replace_all_matches(rows)
+        finished = time.time()
+
+        return {
+            'thoughts': int(len(owners)),
+            'users': int(block_bounds[-1][1]) if block_bounds else 0,
+            'blocks': len(block_bounds),
+            'workers': self.workers,
+            'matches_written': 0 if dry_run else len(rows),
+            'load_seconds': round(loaded - started, 2),
+            'score_seconds': round(scored - loaded, 2),
+            'write_seconds': round(finished - scored, 2),
+            'wall_seconds': round(finished - started, 2),
+            'peak_memory_mb': round(peak_memory_mb(), 1),
+            'peak_worker_memory_mb': round(peak_memory_mb(resource.RUSAGE_CHILDREN), 1),
+        }
+
+    def _block_bounds(self, owners: np.ndarray) -> List[tuple]:
+        """[first_user, last_user) index ranges whose thoughts total about block_size rows."""
+        if len(owners) == 0:
+            return []
+        _, _, row_counts = owner_segments(owners)
+        bounds = []
+        first, rows = 0, 0
+        for u, count in enumerate(row_counts.tolist()):
+            if rows and rows + count > self.block_size:
+                bounds.append((first, u))
+                first, rows = u, 0
+            rows += count
+        bounds.append((first, len(row_counts)))
+        return bounds
+
+    def _score_blocks(self, matrix: np.ndarray, owners: np.ndarray, block_bounds: List[tuple]) -> List[tuple]:
+        initargs = (matrix, owners, block_bounds, self.top_k, self.threshold, self.top_n)
+        rows = []
+        if self.workers > 1 and len(block_bounds) > 1:
+            # fork shares the matrix copy-on-write instead of pickling it per worker
+            method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+            context = multiprocessing.get_context(method)
+            with context.Pool(self.workers, initializer=_init_block_state, initargs=initargs) as pool:
+                for done, block_rows in enumerate(pool.imap_unordered(_score_block, range(len(block_bounds))), 1):
+                    rows.extend(block_rows)
+                    self._report(done, len(block_bounds))
+        else:
+            _init_block_state(*initargs)
+            try:
+                for block in range(len(block_bounds)):
+                    rows.extend(_score_block(block))
+                    self._report(block + 1, len(block_bounds))
+            finally:
+                _block_state.clear()
+        return rows
+
+    def _report(self, done: int, total: int):
+        if done % max(1, total // 10) == 0 or done == total:
+            print(f"Scored {done}/{total} blocks ({peak_memory_mb():.0f} MB peak)")
@@ -0,0 +1,286 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+import numpy as np
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
+# Only store meaningful matches
+MATCH_THRESHOLD = 0.25
+
+
+def run_off_loop(fn, *args):
+    """
+    Call fn(*args) on a native OS thread when eventlet has monkey-patched
+    threading (the worker thread is then a green thread, and NumPy work on it
+    would block every request until it finished); otherwise call it directly.
+    fn must not take locks or connections shared with green threads.
+    """
+    if tpool is not None and patcher.is_monkey_patched('thread'):
+        return tpool.execute(fn, *args)
+    return fn(*args)
+
+
+class MatchRecomputeWorker:
+    """
+    Background worker that recomputes thoughtmate matches.
+
+    Thought creation and deletion enqueue the author's user id. Repeated jobs
+    for a user that is already waiting are coalesced into one, and each pass
+    drains up to batch_size users, scores them against the embedding index and
+    writes all resulting rows to the matches table in a single transaction.
+
+    Candidate generation keeps recompute cost proportional to the number of
+    candidates rather than all users. With user_profiles, the candidate_users
+    users whose profile vectors are closest are considered; with an ann_index,
+    so are the authors of the approximate nearest neighbours of the user's
+    thoughts (candidate_neighbours per thought). Users the user already has a
+    stored match with are always candidates too, so existing matches are
+    rescored rather than left stale. The top-K scoring against the candidates'
+    thoughts stays exact, and only the stored matches between the user and its
+    candidates are replaced.
+
+    Candidates are gathered on the worker thread; the scoring matrix products
+    run through run_off_loop, so under eventlet they don't stall the server.
+
+    If a batch fails, its users are retried one by one so only the failing
+    ones are affected. Those go back in the queue with their original enqueue
+    times; the worker backs off (retry_delay, doubling per consecutive failed
+    pass, up to max_retry_delay) and gives up on a user after max_retries.
+    """
+
+    def __init__(self, db, embedding_index, embedding_service, batch_size: int = 32,
+                 threshold: float = MATCH_THRESHOLD, top_k: int = 5, ann_index=None,
+                 candidate_neighbours: int = 50, user_profiles=None, candidate_users: int = 100,
+                 max_retries: int = 5, retry_delay: float = 1.0, max_retry_delay: float = 60.0):
+        self.db = db
+        self.embedding_index = embedding_index
+        self.embedding_service = embedding_service
+        self.ann_index = ann_index
+        self.candidate_neighbours = candidate_neighbours
+        self.user_profiles = user_profiles
+        self.candidate_users = candidate_users
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.top_k = top_k
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._condition = threading.Condition()
+        self._pending = {}  # user_id -> time the oldest outstanding job was enqueued
+        self._attempts = {}  # user_id -> failed attempts of its outstanding job
+        self._retry_at = 0.0  # after a failed pass, no batch is taken before this time
+        self._consecutive_failures = 0
+        self._thread = None
+        self._running = False
+
+        self._enqueued = 0
+        self._coalesced = 0
+        self._processed = 0
+        self._batches = 0
+        self._failures = 0
+        self._retried = 0
+        self._dropped = 0
+        self._last_completed_at = None
+        self._last_batch_seconds = 0.0
+        self._last_lag_seconds = 0.0
+
+    def start(self):
+        """Start the worker thread (no-op if already running)."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='match-recompute', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enqueue(self, user_id: int):
+        """Schedule a match recompute for a user."""
+        with self._condition:
+            self._enqueued += 1
+            if user_id in self._pending:
+                self._coalesced += 1
+            else:
+                self._pending[user_id] = time.time()
+            self._condition.notify()
+
+    def drain(self):
+        """
+        Process every pending job synchronously (used by scripts and shutdown).
+        Failed jobs are retried without backoff, up to max_retries each.
+        """
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._process(batch)
+
+    def get_metrics(self) -> dict:
+        with self._condition:
+            now = time.time()
+            oldest = min(self._pending.values()) if self._pending else None
+            return {
+                'pending': len(self._pending),
+                'enqueued': self._enqueued,
+                'coalesced': self._coalesced,
+                'processed': self._processed,
+                'batches': self._batches,
+                'failures': self._failures,
+                'retried': self._retried,
+                'dropped': self._dropped,
+                'retry_in_seconds': round(max(0.0, self._retry_at - now), 3),
+                'oldest_pending_seconds': round(now - oldest, 3) if oldest else 0.0,
+                'last_batch_seconds': round(self._last_batch_seconds, 3),
+                'last_lag_seconds': round(self._last_lag_seconds, 3),
+                'last_completed_at': self._last_completed_at,
+            }
+
+    def compute_matches(self, user_ids: Iterable[int]) -> Tuple[Dict[int, Dict[int, float]], Dict[int, Set[int]]]:
+        """
+        Score each user against other users' thoughts in the index. Returns
+        ({user_id: {matched_user_id: score}}, {user_id: candidate ids scored}),
+        the latter only for users scored against a candidate set.
+        """
+        user_ids = list(user_ids)
+        # Copy only the batch users' rows, then their candidates' rows; the whole
+        # index is copied only when every user is scored against everyone
+        batch_matrix, batch_owners = self.embedding_index.rows_for_users(user_ids)
+        partners = self.db.get_match_partner_ids(user_ids) if self._prunes else {}
+        jobs, results, scored_users = [], {}, {}
+        for user_id in user_ids:
+            user_matrix = batch_matrix[batch_owners == user_id]
+            if len(user_matrix) == 0:
+                # No thoughts left: any existing matches are stale
+                results[user_id] = {}
+                continue
+
+            candidates = self._candidates(user_id, user_matrix, partners.get(user_id, set()))
+            if candidates is not None:
+                scored_users[user_id] = set(candidates.tolist())
+            jobs.append((user_id, user_matrix, candidates))
+
+        if self._prunes:
+            matrix, owner_ids = self.embedding_index.rows_for_users(set().union(*scored_users.values()))
+        else:
+            matrix, _, owner_ids = self.embedding_index.snapshot()
+        results.update(run_off_loop(self._score, matrix, owner_ids, jobs))
+        return results, scored_users
+
+    def _score(self, matrix: np.ndarray, owner_ids: np.ndarray, jobs: List[tuple]) -> Dict[int, Dict[int, float]]:
+        """Exact top-K scores above the threshold for (user_id, user_matrix, candidates) jobs."""
+        results = {}
+        for user_id, user_matrix, candidates in jobs:
+            others = owner_ids != user_id
+            if candidates is not None:
+                others &= np.isin(owner_ids, candidates)
+            similarities = self.embedding_service.calculate_user_similarities(
+                user_matrix,
+                matrix[others],
+                owner_ids[others],
+                self.top_k
+            )
+            results[user_id] = {
+                other_id: score for other_id, score in similarities.items()
+                if score > self.threshold
+            }
+        return results
+
+    @property
+    def _prunes(self) -> bool:
+        return self.ann_index is not None or self.user_profiles is not None
+
+    def _candidates(self, user_id: int, user_matrix: np.ndarray, partners: Set[int]):
+        """Candidate thoughtmate ids, or None to score against every user."""
+        if not self._prunes:
+            return None
+        candidates = set(partners)
+        if self.user_profiles is not None:
+            candidates.update(self.user_profiles.candidate_users(user_id, self.candidate_users).tolist())
+        if self.ann_index is not None:
+            candidates |= self.ann_index.neighbour_users(user_matrix, self.candidate_neighbours, exclude_user_id=user_id)
+        return np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+
+    def _take_batch(self) -> List[tuple]:
+        with self._condition:
+            batch = []
+            for user_id in list(self._pending)[:self.batch_size]:
+                batch.append((user_id, self._pending.pop(user_id)))
+            return batch
+
+    def _store(self, batch: List[tuple]) -> List[tuple]:
+        """Recompute and write matches for batch. Returns the jobs that failed."""
+        try:
+            results, scored_users = self.compute_matches([user_id for user_id, _ in batch])
+            self.db.replace_user_matches(results, scored_users)
+            return []
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"Error recomputing matches for user {batch[0][0]}: {e}")
+                return batch
+            print(f"Recomputing matches for {len(batch)} users failed, retrying individually: {e}")
+        failed = []
+        for job in batch:
+            failed.extend(self._store([job]))
+        return failed
+
+    def _process(self, batch: List[tuple]):
+        started = time.time()
+        failed = self._store(batch)
+        failed_ids = {user_id for user_id, _ in failed}
+        done = [(user_id, enqueued_at) for user_id, enqueued_at in batch if user_id not in failed_ids]
+
+        finished = time.time()
+        with self._condition:
+            if failed:
+                self._failures += 1
+                self._retry(failed, finished)
+            else:
+                self._consecutive_failures = 0
+            if not done:
+                return
+            for user_id, _ in done:
+                self._attempts.pop(user_id, None)
+            self._processed += len(done)
+            self._batches += 1
+            self._last_batch_seconds = finished - started
+            self._last_lag_seconds = finished - min(enqueued_at for _, enqueued_at in done)
+            self._last_completed_at = finished
+
+    def _retry(self, failed: List[tuple], now: float):
+        # Caller holds the condition
+        self._consecutive_failures += 1
+        delay = self.retry_delay * 2 ** (self._consecutive_failures - 1)
+        self._retry_at = now + min(self.max_retry_delay, delay)
+        for user_id, enqueued_at in failed:
+            attempts = self._attempts.get(user_id, 0) + 1
+            if attempts > self.max_retries:
+                print(f"Giving up recomputing matches for user {user_id} after {self.max_retries} retries")
+                self._attempts.pop(user_id, None)
+                self._dropped += 1
+                continue
+            self._attempts[user_id] = attempts
+            self._retried += 1
+            # Keep the original enqueue time; a job enqueued since is coalesced into the retry
+            self._pending[user_id] = min(enqueued_at, self._pending.get(user_id, enqueued_at))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._pending or time.time() < self._retry_at):
+                    self._condition.wait(max(0.0, self._retry_at - time.time()) if self._pending else None)
+                if not self._running:
+                    return
+            batch = self._take_batch()
+            if batch:
+                self._process(batch)
@@ -0,0 +1,189 @@
+"""
+EXPLAIN QUERY PLAN checks for every query issued by the SQLite Database.
+
+Each public Database method is run against a scratch database seeded with a
+little sample data while a trace callback records the SQL it executes. Every
+distinct statement is then explained and any step that scans a whole table
+(instead of searching an index) is reported.
+"""
+import inspect
+import os
+import re
+import sqlite3
+import tempfile
+from typing import Dict, List
+
+from database import Database
+
+# Methods whose job is to read or rewrite every row
+FULL_SCAN_ALLOWED = {
+    'get_all_users',
+    'get_all_thought_embeddings',
+    'backfill_embedding_model',
+    'get_all_user_profiles',
+    'repair_thought_counters',
+    'replace_all_matches',
+}
+
+# Sample value per parameter name used to call each Database method
+SAMPLE_ARGUMENTS = {
+    'user_id': 1,
+    'follower_id': 1,
+    'following_id': 2,
+    'matched_user_id': 2,
+    'user1_id': 1,
+    'user2_id': 2,
+    'sender_id': 1,
+    'thought_id': 1,
+    'comment_id': 1,
+    'conversation_id': 1,
+    'username': 'planner',
+    'auth0_id': 'auth0|planner',
+    'email': 'planner_auth0@example.com',
+    'content': 'query planner sample',
+    'bio': '',
+    'avatar_url': None,
+    'avatar_data': '',
+    'embedding': [0.1] * 8,
+    'similarity_score': 0.5,
+    'user_matches': {1: {2: 0.5}},
+    'scored_users': {1: [2]},
+    'rows': [(1, 2, 0.5)],
+    'thought_ids': [1, 2],
+    'user_ids': [1, 2],
+    'hours': 24,
+    'limit': 10,
+    'content_hash': 'f' * 64,
+    'model': 'text-embedding-3-small',
+    'embedding_model': 'text-embedding-3-small',
+    'after_id': 0,
+    'job': 'reembed:planner',
+    'embeddings': [(1, [0.1] * 8)],
+    'last_thought_id': 1,
+    'processed': 1,
+    'profiles': [(1, 1, b'\x00' * 16, b'\x01\x00\x00\x00')],
+}
+
+_CONNECTION_METHODS = ('get_connection', 'release_connection', 'close', 'init_db')
+
+# Destructive methods run last so earlier methods still see the sample rows
+_DESTRUCTIVE_PREFIXES = ('delete_', 'clear_', 'unlike_', 'unfollow_', 'unsave_')
+
+_SCAN_RE = re.compile(r'^SCAN (?!CONSTANT ROW)(\w+)(?!.*USING (COVERING )?INDEX)')
+
+
+class _TracingDatabase(Database):
+    """Database that records every statement executed on its connections"""
+
+    def __init__(self, db_path):
+        self.statements: List[tuple] = []
+        self.current_method = 'init_db'
+        super().__init__(db_path)
+
+    def get_connection(self):
+        conn = super().get_connection()
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def _trace(self, statement):
+        self.statements.append((self.current_method, statement))
+
+
+def _seed(db: Database):
+    """Insert enough rows for every method to find something to work on"""
+    user1 = db.create_user('planner_a')
+    user2 = db.create_user('planner_b')
+    db.create_thought(user1, 'first sample thought', [0.1] * 8)
+    db.create_thought(user2, 'second sample thought', [0.2] * 8)
+    db.follow_user(user1, user2)
+    db.save_thought(user1, 2)
+    db.like_thought(2, user1)
+    db.create_comment(2, user1, 'sample comment')
+    conversation_id = db.create_or_get_conversation(user1, user2)
+    db.send_message(conversation_id, user2, 'sample message')
+
+
+def _call_methods(db: _TracingDatabase) -> List[str]:
+    """Call every public Database method with sample arguments. Returns skipped method names."""
+    skipped = []
+    methods = [
+        (name, method) for name, method in inspect.getmembers(Database, inspect.isfunction)
+        if not name.startswith('_') and name not in _CONNECTION_METHODS
+    ]
+    methods.sort(key=lambda item: (item[0].startswith(_DESTRUCTIVE_PREFIXES), item[0]))
+
+    for name, method in methods:
+        parameters = list(inspect.signature(method).parameters.values())[1:]
+        kwargs = {}
+        for parameter in parameters:
+            if parameter.name in SAMPLE_ARGUMENTS:
+                kwargs[parameter.name] = SAMPLE_ARGUMENTS[parameter.name]
+            elif parameter.default is inspect.Parameter.empty:
+                skipped.append(name)
+                break
+        else:
+            db.current_method = name
+            try:
+                getattr(db, name)(**kwargs)
+            except sqlite3.IntegrityError:
+                pass  # the query was still issued, e.g. a duplicate insert
+    return skipped
+
+
+def _explain(conn: sqlite3.Connection, statement: str) -> List[str]:
+    # Older Python versions trace the unexpanded statement; bind NULLs for the plan
+    placeholders = statement.count('?')
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {statement}', [None] * placeholders).fetchall()
+    return [row[3] for row in rows]
+
+
+def check_query_plans() -> Dict[str, list]:
+    """
+    Explain every statement issued by the Database methods.
+
+    Returns {'full_scans': [...], 'allowed_scans': [...], 'skipped': [...]}, where
+    scan entries are dicts with method, table, detail and sql.
+    """
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        db = _TracingDatabase(path)
+        db.current_method = '_seed'
+        _seed(db)
+        db.statements.clear()
+        skipped = _call_methods(db)
+
+        conn = sqlite3.connect(path)
+        report = {'full_scans': [], 'allowed_scans': [], 'skipped': skipped}
+        seen = set()
+        for method, statement in db.statements:
+            sql = ' '.join(statement.split())
+            if (method, sql) in seen or not sql.upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT')):
+                continue
+            seen.add((method, sql))
+            for detail in _explain(conn, statement):
+                match = _SCAN_RE.match(detail)
+                if not match:
+                    continue
+                entry = {'method': method, 'table': match.group(1), 'detail': detail, 'sql': sql}
+                bucket = 'allowed_scans' if method in FULL_SCAN_ALLOWED else 'full_scans'
+                report[bucket].append(entry)
+        conn.close()
+        db.close()
+        return report
+    finally:
+        os.remove(path)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def print_report(report: Dict[str, list]):
+    for entry in report['full_scans']:
+        print(f"[QUERY PLAN] Full table scan of {entry['table']} in Database.{entry['method']}: {entry['detail']}")
+        print(f"             {entry['sql']}")
+    for entry in report['allowed_scans']:
+        print(f"[QUERY PLAN] Expected scan of {entry['table']} in Database.{entry['method']}")
+    for name in report['skipped']:
+        print(f"[QUERY PLAN] Skipped Database.{name} (no sample arguments)")
+    print(f"[QUERY PLAN] {len(report['full_scans'])} unexpected full table scans")
@@ -0,0 +1,162 @@
+"""
+Socket.IO rooms for targeted real-time delivery.
+
+Sockets authenticate in the handshake (auth={'token': <access token>}) and
+are refused otherwise. Each socket joins its user's room on connect and
+subscribes to further rooms with 'subscribe'/'unsubscribe' events:
+
+  feed                - new thoughts and bulk deletions for the feed
+  thought:<id>        - likes, comments and deletion of one thought
+  conversation:<id>   - messages of a conversation (members only)
+  user:<id>           - joined automatically; events for that user
+
+Routes emit to the rooms an event concerns, so delivery cost scales with
+the audience rather than with every connected client.
+
+Like and comment events are deltas built from the write itself and carry
+the schema version 'v' (EVENT_SCHEMA_VERSION):
+
+  thought_liked / thought_unliked  {v, thought_id, actor_id, like_count, comment_count, counts_version}
+  comment_posted                   {v, thought_id, actor_id, like_count, comment_count, counts_version, comment}
+
+Counts are the values after the write, not increments. counts_version is
+the thought's counter version, bumped in the same UPDATE that changes a
+count, so it orders snapshots across workers and message-queue hops. A
+client keeps the highest version it has seen per thought (rows from the
+API carry it too) and ignores events at or below it; replaying an event
+is harmless. Like events (COALESCED_EVENTS) may be coalesced and paced
+(see emit_scheduler).
+"""
+import threading
+from typing import Callable, List, Optional
+from flask import request
+from flask_socketio import join_room, leave_room
+
+FEED_ROOM = 'feed'
+
+# Rooms one socket may hold through 'subscribe' (a feed page is at most 100 thoughts)
+MAX_SUBSCRIPTIONS_PER_SOCKET = 500
+
+
+def user_room(user_id: int) -> str:
+    return f'user:{user_id}'
+
+
+def thought_room(thought_id: int) -> str:
+    return f'thought:{thought_id}'
+
+
+def conversation_room(conversation_id: int) -> str:
+    return f'conversation:{conversation_id}'
+
+
+# State events where only the latest per thought matters; may be coalesced, deferred or dropped
+COALESCED_EVENTS = ('thought_liked', 'thought_unliked')
+
+# Bump when a delta payload changes shape so clients can skip events they do not understand
+EVENT_SCHEMA_VERSION = 1
+
+
+def thought_counts_event(thought_id: int, actor_id: int, counts: dict, **extra) -> dict:
+    """Delta payload for a change to a thought's counters; counts holds like_count, comment_count and counts_version."""
+    return {
+        'v': EVENT_SCHEMA_VERSION,
+        'thought_id': thought_id,
+        'actor_id': actor_id,
+        'like_count': counts['like_count'],
+        'comment_count': counts['comment_count'],
+        'counts_version': counts['counts_version'],
+        **extra,
+    }
+
+
+class SocketRooms:
+    """Handshake authentication and room subscriptions for one Socket.IO server."""
+
+    def __init__(self, socketio, db, authenticate: Callable[[Optional[dict]], Optional[dict]]):
+        self.socketio = socketio
+        self.db = db
+        self.authenticate = authenticate
+        self._lock = threading.Lock()
+        self._socket_users = {}  # sid -> user id
+        self._subscriptions = {}  # sid -> rooms joined through 'subscribe'
+
+        socketio.on_event('connect', self._on_connect)
+        socketio.on_event('disconnect', self._on_disconnect)
+        socketio.on_event('subscribe', self._on_subscribe)
+        socketio.on_event('unsubscribe', self._on_unsubscribe)
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {
+                'sockets': len(self._socket_users),
+                'users': len(set(self._socket_users.values())),
+                'subscriptions': sum(len(rooms) for rooms in self._subscriptions.values()),
+            }
+
+    def _on_connect(self, auth=None):
+        user = self.authenticate(auth)
+        if user is None:
+            return False
+        with self._lock:
+            self._socket_users[request.sid] = user['id']
+            self._subscriptions[request.sid] = set()
+        join_room(user_room(user['id']))
+
+    def _on_disconnect(self):
+        with self._lock:
+            self._socket_users.pop(request.sid, None)
+            self._subscriptions.pop(request.sid, None)
+
+    def _on_subscribe(self, data):
+        """Join the requested rooms the user may see; returns the rooms joined."""
+        with self._lock:
+            user_id = self._socket_users.get(request.sid)
+            subscribed = set(self._subscriptions.get(request.sid, ()))
+        if user_id is None:
+            return []
+
+        allowed = [room for room in self._requested_rooms(data)
+                   if room in subscribed or self._may_join(user_id, room)]
+        joined = []
+        with self._lock:
+            subscribed = self._subscriptions.get(request.sid)
+            if subscribed is None:
+                return []
+            for room in allowed:
+                if room not in subscribed:
+                    if len(subscribed) >= MAX_SUBSCRIPTIONS_PER_SOCKET:
+                        break
+                    join_room(room)
+                    subscribed.add(room)
+                joined.append(room)
+        return joined
+
+    def _on_unsubscribe(self, data):
+        with self._lock:
+            subscribed = self._subscriptions.get(request.sid)
+            if subscribed is None:
+                return
+            for room in self._requested_rooms(data):
+                if room in subscribed:
+                    leave_room(room)
+                    subscribed.discard(room)
+
+    def _requested_rooms(self, data) -> List[str]:
+        rooms = data.get('rooms') if isinstance(data, dict) else None
+        if not isinstance(rooms, list):
+            return []
+        return [room for room in rooms if isinstance(room, str)][:MAX_SUBSCRIPTIONS_PER_SOCKET]
+
+    def _may_join(self, user_id: int, room: str) -> bool:
+        if room == FEED_ROOM:
+            return True
+        kind, _, key = room.partition(':')
+        if not key.isdigit():
+            return False
+        if kind == 'thought':
+            return True
+        if kind == 'conversation':
+            return self.db.is_conversation_member(int(key), user_id)
+        # user rooms are only joined on connect
+        return False
@@ -0,0 +1,132 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from match_rebuild import MatchRebuildJob
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second across threads."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ReembedPipeline:
+    """
+    Re-embeds every thought whose embedding was produced by another model.
+
+    Thoughts are streamed in id order, chunk_size at a time. Each chunk is
+    split into batches of batch_size texts that are embedded with up to
+    concurrency requests in flight (optionally capped at requests_per_second).
+    The chunk's embeddings and the job checkpoint are written in one
+    transaction, so an interrupted run resumes after the last committed chunk.
+    Once every thought is on the new model, matches are rebuilt for all users.
+    """
+
+    def __init__(self, db, embedding_service, model: str = None, chunk_size: int = 500, batch_size: int = 64,
+                 concurrency: int = 4, requests_per_second: Optional[float] = None, max_retries: int = 3,
+                 job: str = None):
+        self.db = db
+        self.embedding_service = embedding_service
+        self.model = model or embedding_service.model
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.job = job or f'reembed:{self.model}'
+        self.rate_limiter = RateLimiter(requests_per_second, burst=concurrency) if requests_per_second else None
+
+    def run(self, restart: bool = False, rebuild_matches: bool = True) -> dict:
+        if restart:
+            self.db.delete_reembed_checkpoint(self.job)
+        checkpoint = self.db.get_reembed_checkpoint(self.job)
+        last_id = checkpoint['last_thought_id'] if checkpoint else 0
+        processed = checkpoint['processed'] if checkpoint else 0
+        if checkpoint:
+            print(f"Resuming {self.job} after thought {last_id} ({processed} already re-embedded)")
+
+        started = time.time()
+        embedded_this_run = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='reembed') as executor:
+            while True:
+                rows = self.db.get_thoughts_for_reembedding(self.model, last_id, self.chunk_size)
+                if not rows:
+                    break
+                batches = [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+                embeddings = []
+                for batch, vectors in zip(batches, executor.map(self._embed_batch, batches)):
+                    embeddings.extend(zip((row['id'] for row in batch), vectors))
+
+                last_id = rows[-1]['id']
+                processed += len(rows)
+                embedded_this_run += len(rows)
+                self.db.update_thought_embeddings(embeddings, self.model, self.job, last_id, processed)
+                rate = embedded_this_run / max(time.time() - started, 1e-9)
+                print(f"Re-embedded {processed} thoughts with {self.model} (through id {last_id}, {rate:.1f}/s)")
+
+        stats = {
+            'job': self.job,
+            'model': self.model,
+            'reembedded': embedded_this_run,
+            'total_processed': processed,
+            'seconds': round(time.time() - started, 2),
+        }
+        if rebuild_matches:
+            stats['users_rematched'] = self.rebuild_matches()
+        return stats
+
+    def rebuild_matches(self) -> int:
+        """Rebuild the matches table from embeddings produced by the current model."""
+        stats = MatchRebuildJob(self.db, model=self.model).run()
+        print(f"Rebuilt matches for {stats['users']} users in {stats['wall_seconds']}s")
+        return stats['users']
+
+    def _embed_batch(self, rows: List[dict]) -> List[List[float]]:
+        texts = [row['content'] for row in rows]
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                return self.embedding_service.get_embeddings(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = 2 ** attempt
+                print(f"Embedding batch starting at thought {rows[0]['id']} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+
+
+def backfill_untracked_embeddings(db, embedding_service, legacy_model: str = None) -> int:
+    """
+    Attribute thoughts stored before embedding_model was tracked. With
+    legacy_model (the deployment that embedded them) every untracked row goes
+    to it. Otherwise rows with the current model's dimension are attributed to
+    the current model, probed with one (cached) embedding; rows of any other
+    dimension stay untracked until reembed. Returns the rows attributed.
+    """
+    if legacy_model:
+        return db.backfill_embedding_model(legacy_model)
+    try:
+        dim = len(embedding_service.get_embedding('embedding dimension probe'))
+    except Exception as e:
+        print(f"[REEMBED] Could not probe {embedding_service.model} for its dimension ({e}); "
+              f"untracked thoughts stay out of the index")
+        return 0
+    return db.backfill_embedding_model(embedding_service.model, dim=dim)
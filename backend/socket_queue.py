@@ -0,0 +1,116 @@
+"""
+Message-queue backends that let several server processes share Socket.IO rooms.
+
+With SOCKETIO_MESSAGE_QUEUE set, every worker publishes its emits to the
+queue and delivers the ones addressed to sockets it holds, so any worker
+(or a maintenance script) can emit to any room. The URL scheme picks the
+backend:
+
+  redis:// rediss://   Redis pub/sub (the deployment default)
+  kafka://             Kafka
+  zmq+tcp://           ZeroMQ (needs a separate zmq forwarder)
+  amqp:// and others   Kombu (RabbitMQ, ...)
+  local://<channel>    in-process bus for tests and benchmarks
+
+Without it, a single process serves every socket and no queue is used.
+"""
+import os
+import pickle
+import queue
+import threading
+from typing import Optional
+import socketio
+from emit_scheduler import paced_manager_class
+
+DEFAULT_CHANNEL = 'htly-socketio'
+
+
+class LocalMessageBus:
+    """In-process publish/subscribe channels standing in for a broker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> list of queue.Queue
+
+    def subscribe(self, channel: str) -> queue.Queue:
+        inbox = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(inbox)
+        return inbox
+
+    def unsubscribe(self, channel: str, inbox: queue.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, [])
+            if inbox in subscribers:
+                subscribers.remove(inbox)
+
+    def publish(self, channel: str, message: bytes) -> int:
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for inbox in subscribers:
+            inbox.put(message)
+        return len(subscribers)
+
+
+# Shared by every LocalPubSubManager that is not given its own bus
+local_bus = LocalMessageBus()
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    Socket.IO client manager whose pub/sub backend is a LocalMessageBus.
+
+    Several socketio.Server instances in one process, each with its own
+    manager on the same bus and channel, behave like workers sharing Redis.
+    Messages are pickled like the Redis backend does. The listener blocks on
+    a queue.Queue, so this is meant for the threading async mode.
+    """
+    name = 'local'
+
+    def __init__(self, channel: str = DEFAULT_CHANNEL, write_only: bool = False, logger=None,
+                 bus: Optional[LocalMessageBus] = None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus or local_bus
+        self._inbox = None
+
+    def initialize(self):
+        if not self.write_only:
+            self._inbox = self.bus.subscribe(self.channel)
+        super().initialize()
+
+    def close(self):
+        """Stop receiving messages; the listener stays idle on its empty inbox."""
+        if self._inbox is not None:
+            self.bus.unsubscribe(self.channel, self._inbox)
+
+    def _publish(self, data):
+        self.bus.publish(self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        inbox = self._inbox
+        while True:
+            yield inbox.get()
+
+
+def create_client_manager(url: str = None, channel: str = DEFAULT_CHANNEL, write_only: bool = False,
+                          paced: bool = False):
+    """
+    Client manager for a message-queue URL (SOCKETIO_MESSAGE_QUEUE by default),
+    or None when no queue is configured. write_only managers can emit but hold
+    no sockets, for processes that only send events. paced managers deliver
+    through emit_scheduler.PacedDelivery; without a queue that is a plain
+    in-process PacedDelivery instead of None.
+    """
+    url = url or os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    wrap = paced_manager_class if paced else (lambda manager_class: manager_class)
+    if not url:
+        return wrap(socketio.Manager)() if paced else None
+    if url.startswith('local://'):
+        return wrap(LocalPubSubManager)(channel=url[len('local://'):] or channel, write_only=write_only)
+    if url.startswith(('redis://', 'rediss://')):
+        return wrap(socketio.RedisManager)(url, channel=channel, write_only=write_only)
+    if url.startswith('kafka://'):
+        return wrap(socketio.KafkaManager)(url, channel=channel, write_only=write_only)
+    if url.startswith('zmq'):
+        return wrap(socketio.ZmqManager)(url, channel=channel, write_only=write_only)
+    return wrap(socketio.KombuManager)(url, channel=channel, write_only=write_only)
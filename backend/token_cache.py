@@ -0,0 +1,77 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def token_hash(token: str) -> str:
+    """Cache key for a bearer token, so raw tokens are never held as keys."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class VerifiedTokenCache:
+    """
+    LRU cache of decoded payloads for tokens whose signature was verified.
+
+    Entries are keyed by token_hash() and kept until the token's exp claim;
+    an entry at or past exp is dropped instead of being returned, so a cached
+    token is never accepted after it expires. Tokens without exp are not
+    cached. At most max_entries payloads are kept.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (exp, payload), least recently used first
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_hash(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            exp, payload = entry
+            if time.time() >= exp:
+                del self._entries[key]
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(payload)
+
+    def put(self, token: str, payload: dict):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)) or exp <= time.time() or self.max_entries <= 0:
+            return
+        key = token_hash(token)
+        with self._lock:
+            self._entries[key] = (exp, dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'expired': self._expired,
+                'evictions': self._evictions,
+            }
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class UserCache:
+    """
+    Short-lived auth0_id -> local user cache in front of a lookup function.
+
+    Hits younger than ttl seconds are served from memory; anything older goes
+    back to lookup (normally db.get_user_by_auth0_id). Unknown auth0 ids are
+    not cached, so a user created on first login is found immediately.
+    Callers that change a user row invalidate it by auth0_id or user id.
+    Returned dicts are copies and may be modified freely.
+    """
+
+    def __init__(self, lookup: Callable[[str], Optional[dict]], ttl: float = 30.0, max_entries: int = 10000):
+        self.lookup = lookup
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # auth0_id -> (cached_at, user), least recently used first
+        self._auth0_ids = {}  # user id -> auth0_id
+
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, auth0_id: str) -> Optional[dict]:
+        if not auth0_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(auth0_id)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self._entries.move_to_end(auth0_id)
+                self._hits += 1
+                return dict(entry[1])
+            self._misses += 1
+
+        user = self.lookup(auth0_id)
+        if user is None:
+            return None
+        with self._lock:
+            self._entries[auth0_id] = (time.time(), dict(user))
+            self._entries.move_to_end(auth0_id)
+            self._auth0_ids[user['id']] = auth0_id
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._auth0_ids.pop(evicted['id'], None)
+        return dict(user)
+
+    def invalidate(self, auth0_id: str = None, user_id: int = None):
+        """Drop the cached user with this auth0_id or local user id."""
+        with self._lock:
+            if auth0_id is None and user_id is not None:
+                auth0_id = self._auth0_ids.get(user_id)
+            entry = self._entries.pop(auth0_id, None) if auth0_id is not None else None
+            if entry is not None:
+                self._auth0_ids.pop(entry[1]['id'], None)
+                self._invalidations += 1
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self._invalidations,
+            }
@@ -0,0 +1,263 @@
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from embedding_index import normalize_rows
+
+# Sub-centroids kept per user besides the overall mean
+DEFAULT_SUB_CENTROIDS = 3
+
+# A thought less similar than this to every sub-centroid starts a new one (while slots remain)
+SPLIT_THRESHOLD = 0.5
+
+
+class UserProfileIndex:
+    """
+    Small per-user profile vectors for thoughtmate candidate generation.
+
+    Each user gets 1 + sub_centroids slots: the sum of all their (normalized)
+    thought embeddings, and the sums of a few clusters of them found by leader
+    clustering. A new thought joins the most similar sub-centroid, or starts a
+    new one when it is less similar than split_threshold to all of them and a
+    slot is free. Adding a thought updates sums and counts in place in O(dim).
+    Deleting one rebuilds the user's profile from their remaining thoughts,
+    because the slot a thought joined can't be recovered once clusters have
+    moved. Profiles are written through to the user_profiles table.
+    candidate_users() scores one user's slots against every other user's slots
+    with a single matrix product and returns the closest users; exact top-K
+    scoring then only runs against those.
+    """
+
+    def __init__(self, store=None, model: str = None, sub_centroids: int = DEFAULT_SUB_CENTROIDS,
+                 split_threshold: float = SPLIT_THRESHOLD, initial_capacity: int = 256):
+        self.store = store
+        self.model = model
+        self.slots = 1 + sub_centroids
+        self.split_threshold = split_threshold
+        self._initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._reset(None)
+
+        self._candidate_queries = 0
+        self._store_errors = 0
+
+    def _reset(self, dim: Optional[int]):
+        self._dim = dim
+        self._size = 0
+        self._positions: Dict[int, int] = {}
+        self._user_ids = np.zeros(0, dtype=np.int64)
+        self._sums = None
+        self._counts = None
+        self._norms = None
+        if dim:
+            self._allocate(self._initial_capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def sync(self, thought_ids, user_ids, matrix: np.ndarray) -> int:
+        """
+        Load stored profiles and rebuild (and store) those whose thought count
+        no longer matches the embedding index, or whose sub-centroids no longer
+        add up to the overall sum. Returns the number rebuilt.
+        """
+        stored = []
+        if self.store is not None:
+            try:
+                stored = self.store.get_all_user_profiles(self.model)
+            except Exception as e:
+                print(f"Error reading user profiles: {e}")
+
+        matrix = normalize_rows(matrix) if len(matrix) else matrix
+        users, counts = np.unique(np.asarray(user_ids, dtype=np.int64), return_counts=True)
+        expected = dict(zip(users.tolist(), counts.tolist()))
+
+        with self._lock:
+            self._reset(matrix.shape[1] if len(matrix) else None)
+            if self._dim is None:
+                return 0
+            for row in stored:
+                sums = np.frombuffer(row['sums'], dtype=np.float32)
+                if expected.get(row['user_id']) != row['thought_count'] or sums.size != self.slots * self._dim:
+                    continue
+                sums = sums.reshape(self.slots, self._dim)
+                slot_counts = np.frombuffer(row['counts'], dtype=np.int32)
+                if slot_counts[1:].sum() != slot_counts[0] or not np.allclose(sums[1:].sum(axis=0), sums[0], atol=1e-3):
+                    continue
+                pos = self._row(row['user_id'])
+                self._sums[pos] = sums
+                self._counts[pos] = slot_counts
+                self._norms[pos] = np.linalg.norm(self._sums[pos], axis=1)
+
+            stale = [user_id for user_id in expected if user_id not in self._positions]
+            if stale:
+                order = np.argsort(user_ids, kind='stable')
+                sorted_users = np.asarray(user_ids)[order]
+                for user_id in stale:
+                    lo, hi = np.searchsorted(sorted_users, [user_id, user_id + 1])
+                    self._build(self._row(user_id), matrix[order[lo:hi]])
+            rows = [self._profile_row(user_id) for user_id in stale]
+
+        if rows:
+            self._persist(rows)
+        print(f"Loaded {self._size - len(stale)} user profiles, rebuilt {len(stale)}")
+        return len(stale)
+
+    def add_thought(self, user_id: int, embedding):
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32))[0]
+        with self._lock:
+            if self._dim is None:
+                self._reset(vector.shape[0])
+            elif vector.shape[0] != self._dim:
+                raise ValueError(f"Embedding dimension {vector.shape[0]} does not match profile dimension {self._dim}")
+            self._fold(self._row(user_id), vector)
+            row = self._profile_row(user_id)
+        self._persist([row])
+
+    def rebuild_user(self, user_id: int, matrix: np.ndarray):
+        """Rebuild a user's profile from the embeddings of the thoughts they have left (after a delete)."""
+        with self._lock:
+            if self._dim is None or (len(matrix) and matrix.shape[1] != self._dim):
+                return
+            present = user_id in self._positions
+            if not len(matrix):
+                if present:
+                    self._drop(user_id)
+                row = None
+            else:
+                pos = self._row(user_id)
+                self._sums[pos] = 0
+                self._counts[pos] = 0
+                self._norms[pos] = 0
+                self._build(pos, normalize_rows(matrix))
+                row = self._profile_row(user_id)
+        if row:
+            self._persist([row])
+        elif present:
+            self._delete(user_id)
+
+    def remove_user(self, user_id: int):
+        with self._lock:
+            present = user_id in self._positions
+            if present:
+                self._drop(user_id)
+        if present:
+            self._delete(user_id)
+
+    def candidate_users(self, user_id: int, limit: int = 100) -> np.ndarray:
+        """Ids of the (up to) limit users whose profile slots best match this user's."""
+        with self._lock:
+            pos = self._positions.get(user_id)
+            if pos is None or self._size < 2:
+                return np.zeros(0, dtype=np.int64)
+            active = self._counts[pos] > 0
+            queries = self._sums[pos][active] / self._norms[pos][active, None]
+
+            # One product over every slot of every user; divide by slot norms afterwards
+            raw = self._sums[:self._size].reshape(-1, self._dim) @ queries.T
+            norms = self._norms[:self._size]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                slot_scores = np.where(norms > 0, raw.max(axis=1).reshape(norms.shape) / norms, -np.inf)
+            scores = slot_scores.max(axis=1)
+            scores[pos] = -np.inf
+            user_ids = self._user_ids[:self._size]
+            self._candidate_queries += 1
+
+        others = np.isfinite(scores)
+        scores, user_ids = scores[others], user_ids[others]
+        if scores.size > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            user_ids = user_ids[top]
+        return user_ids.copy()
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {
+                'users': self._size,
+                'slots_per_user': self.slots,
+                'candidate_queries': self._candidate_queries,
+                'store_errors': self._store_errors,
+            }
+
+    def _fold(self, pos: int, vector: np.ndarray):
+        """Add a unit vector to a user's overall slot and its sub-centroid. Caller holds the lock."""
+        sums, counts = self._sums[pos], self._counts[pos]
+        active = np.flatnonzero(counts[1:] > 0) + 1
+        slot = 1
+        if active.size:
+            similarity = (sums[active] @ vector) / self._norms[pos, active]
+            slot = int(active[np.argmax(similarity)])
+            if similarity.max() < self.split_threshold and active.size < self.slots - 1:
+                slot = int(np.flatnonzero(counts[1:] == 0)[0]) + 1
+
+        for index in (0, slot):
+            counts[index] += 1
+            sums[index] += vector
+            self._norms[pos, index] = np.linalg.norm(sums[index])
+
+    def _build(self, pos: int, matrix: np.ndarray):
+        # Caller holds the lock; pos is an empty profile row
+        for vector in matrix:
+            self._fold(pos, vector)
+
+    def _row(self, user_id: int) -> int:
+        """Row of a user's profile, allocating an empty one if needed. Caller holds the lock."""
+        pos = self._positions.get(user_id)
+        if pos is None:
+            if self._size == len(self._user_ids):
+                self._allocate(2 * self._size)
+            pos = self._size
+            self._size += 1
+            self._positions[user_id] = pos
+            self._user_ids[pos] = user_id
+            self._sums[pos] = 0
+            self._counts[pos] = 0
+            self._norms[pos] = 0
+        return pos
+
+    def _drop(self, user_id: int):
+        # Caller holds the lock; the last row moves into the freed slot
+        pos = self._positions.pop(user_id)
+        last = self._size - 1
+        if pos != last:
+            self._sums[pos] = self._sums[last]
+            self._counts[pos] = self._counts[last]
+            self._norms[pos] = self._norms[last]
+            self._user_ids[pos] = self._user_ids[last]
+            self._positions[int(self._user_ids[pos])] = pos
+        self._size = last
+
+    def _profile_row(self, user_id: int) -> tuple:
+        pos = self._positions[user_id]
+        return (user_id, int(self._counts[pos, 0]), self._sums[pos].tobytes(), self._counts[pos].tobytes())
+
+    def _persist(self, rows: List[tuple]):
+        if self.store is None:
+            return
+        try:
+            self.store.save_user_profiles(rows, self.model)
+        except Exception as e:
+            print(f"Error writing user profiles: {e}")
+            with self._lock:
+                self._store_errors += 1
+
+    def _delete(self, user_id: int):
+        if self.store is None:
+            return
+        try:
+            self.store.delete_user_profile(user_id)
+        except Exception as e:
+            print(f"Error deleting user profile: {e}")
+            with self._lock:
+                self._store_errors += 1
+
+    def _allocate(self, capacity: int):
+        sums = np.zeros((capacity, self.slots, self._dim), dtype=np.float32)
+        counts = np.zeros((capacity, self.slots), dtype=np.int32)
+        norms = np.zeros((capacity, self.slots), dtype=np.float32)
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        if self._sums is not None and self._size:
+            sums[:self._size] = self._sums[:self._size]
+            counts[:self._size] = self._counts[:self._size]
+            norms[:self._size] = self._norms[:self._size]
+            user_ids[:self._size] = self._user_ids[:self._size]
+        self._sums, self._counts, self._norms, self._user_ids = sums, counts, norms, user_ids
@@ -3,10 +3,18 @@ import { motion } from 'framer-motion'
 import { ArrowLeft, Send, Sparkles, Trash2 } from 'lucide-react'
 import axios from 'axios'
 import { UserContext } from '../context/UserContext'
-import { useSocket } from '../context/SocketContext'
+import { useSocket, useRooms } from '../context/SocketContext'
 
 const API_BASE = import.meta.env.VITE_API_BASE || 'http://localhost:5001/api'
 
+// Merge fetched or pushed messages into the list, keeping it in id (send) order without duplicates
+const mergeMessages = (prevMessages, incoming) => {
+  const known = new Set(prevMessages.map(m => m.id))
+  const added = incoming.filter(m => !known.has(m.id))
+  if (!added.length) return prevMessages
+  return [...prevMessages, ...added].sort((a, b) => a.id - b.id)
+}
+
 const ChatWindow = ({ conversation, onBack }) => {
   const { currentUser } = useContext(UserContext)
   const { socket } = useSocket()
@@ -14,14 +22,21 @@ const ChatWindow = ({ conversation, onBack }) => {
   const [newMessage, setNewMessage] = useState('')
   const [loading, setLoading] = useState(true)
   const [sending, setSending] = useState(false)
+  // before_id for the next page of older history (X-Next-Cursor), null once it is all loaded
+  const [olderCursor, setOlderCursor] = useState(null)
+  const [loadingOlder, setLoadingOlder] = useState(false)
+  const lastMessageIdRef = useRef(null)
   const messagesEndRef = useRef(null)
   const messagesContainerRef = useRef(null)
   const shouldAutoScrollRef = useRef(true)
 
   useEffect(() => {
+    setMessages([])
+    lastMessageIdRef.current = null
     fetchMessages(true) // Show loading on initial fetch
 
-    // Poll for new messages every 3 seconds as fallback for WebSocket
+    // Poll for new messages every 3 seconds as fallback for WebSocket; only
+    // messages after the newest one we have are fetched
     const pollInterval = setInterval(() => {
       fetchMessages(false) // Don't show loading on polling
     }, 3000)
@@ -29,6 +44,12 @@ const ChatWindow = ({ conversation, onBack }) => {
     return () => clearInterval(pollInterval)
   }, [conversation.conversation_id])
 
+  useEffect(() => {
+    lastMessageIdRef.current = messages.length ? messages[messages.length - 1].id : null
+  }, [messages])
+
+  useRooms([`conversation:${conversation.conversation_id}`])
+
   // Real-time message listener
   useEffect(() => {
     if (!socket) return
@@ -36,12 +57,7 @@ const ChatWindow = ({ conversation, onBack }) => {
     const handleMessageSent = (data) => {
       // Only add message if it's for this conversation
       if (data.conversation_id === conversation.conversation_id) {
-        setMessages(prevMessages => {
-          // Check if message already exists to avoid duplicates
-          const exists = prevMessages.some(m => m.id === data.message.id)
-          if (exists) return prevMessages
-          return [...prevMessages, data.message]
-        })
+        setMessages(prevMessages => mergeMessages(prevMessages, [data.message]))
       }
     }
 
@@ -71,6 +87,9 @@ const ChatWindow = ({ conversation, onBack }) => {
   // Update scroll position tracking
   const handleScroll = () => {
     shouldAutoScrollRef.current = checkIfAtBottom()
+    if (messagesContainerRef.current?.scrollTop < 50) {
+      fetchOlderMessages()
+    }
   }
 
   // Auto-scroll to bottom when new messages arrive (only if user was at bottom)
@@ -87,19 +106,20 @@ const ChatWindow = ({ conversation, onBack }) => {
 
   const fetchMessages = async (showLoading = true) => {
     if (showLoading) setLoading(true)
+    const sinceId = lastMessageIdRef.current
     try {
+      const params = { user_id: currentUser.id }
+      if (sinceId !== null) params.since_id = sinceId
       const response = await axios.get(
-        `${API_BASE}/conversations/${conversation.conversation_id}/messages?user_id=${currentUser.id}`
+        `${API_BASE}/conversations/${conversation.conversation_id}/messages`,
+        { params }
       )
 
-      // Only update state if messages actually changed (prevent unnecessary re-renders)
-      setMessages(prevMessages => {
-        const newMessages = response.data
-        if (JSON.stringify(prevMessages) === JSON.stringify(newMessages)) {
-          return prevMessages
-        }
-        return newMessages
-      })
+      // The first page is the newest messages; its cursor points at older history
+      if (sinceId === null) {
+        setOlderCursor(response.headers['x-next-cursor'] || null)
+      }
+      setMessages(prevMessages => mergeMessages(prevMessages, response.data))
     } catch (error) {
       console.error('Error fetching messages:', error)
     } finally {
@@ -107,6 +127,31 @@ const ChatWindow = ({ conversation, onBack }) => {
     }
   }
 
+  const fetchOlderMessages = async () => {
+    if (!olderCursor || loadingOlder) return
+    setLoadingOlder(true)
+    const container = messagesContainerRef.current
+    const previousHeight = container?.scrollHeight || 0
+    try {
+      const response = await axios.get(
+        `${API_BASE}/conversations/${conversation.conversation_id}/messages`,
+        { params: { user_id: currentUser.id, before_id: olderCursor } }
+      )
+      setOlderCursor(response.headers['x-next-cursor'] || null)
+      shouldAutoScrollRef.current = false
+      setMessages(prevMessages => mergeMessages(prevMessages, response.data))
+
+      // Keep the message the user was looking at in place
+      requestAnimationFrame(() => {
+        if (container) container.scrollTop += container.scrollHeight - previousHeight
+      })
+    } catch (error) {
+      console.error('Error fetching older messages:', error)
+    } finally {
+      setLoadingOlder(false)
+    }
+  }
+
   const handleSend = async (e) => {
     e.preventDefault()
     if (!newMessage.trim() || sending) return
@@ -116,13 +161,13 @@ const ChatWindow = ({ conversation, onBack }) => {
     setNewMessage('') // Clear input immediately for better UX
 
     try {
-      await axios.post(`${API_BASE}/conversations/${conversation.conversation_id}/messages`, {
+      const response = await axios.post(`${API_BASE}/conversations/${conversation.conversation_id}/messages`, {
         sender_id: currentUser.id,
         content: messageContent
       })
 
-      // Fetch messages immediately after sending
-      fetchMessages(false)
+      // The response is the stored message; no refetch needed
+      setMessages(prevMessages => mergeMessages(prevMessages, [response.data]))
 
       // Force scroll to bottom after sending
       setTimeout(() => {
@@ -1,8 +1,8 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { motion } from 'framer-motion'
 import { X, Send, Sparkles } from 'lucide-react'
 import axios from 'axios'
-import { useSocket } from '../context/SocketContext'
+import { useSocket, useRooms, EVENT_SCHEMA_VERSION } from '../context/SocketContext'
 
 const API_BASE = import.meta.env.VITE_API_BASE || 'http://localhost:5001/api'
 
@@ -12,20 +12,28 @@ const CommentsModal = ({ thought, currentUser, onClose, onCommentAdded }) => {
   const [newComment, setNewComment] = useState('')
   const [loading, setLoading] = useState(true)
   const [submitting, setSubmitting] = useState(false)
+  // counts_version the fetched list reflects; comment_posted events at or below it are already
+  // in the list (or deleted since). Newer events each carry a different comment, so they are
+  // all kept, deduplicated by id, whatever order they arrive in
+  const listedVersionRef = useRef(-1)
 
   useEffect(() => {
     fetchComments()
   }, [thought.id])
 
+  useRooms([`thought:${thought.id}`])
+
   // Real-time comment listener
   useEffect(() => {
     if (!socket) return
 
     const handleCommentPosted = (data) => {
-      // Only add comment if it's for this thought
-      if (data.thought_id === thought.id) {
-        setComments(prevComments => [...prevComments, data.comment])
-      }
+      // Only add comment if it's for this thought, newer than the fetched list and not already listed
+      if (data.v !== EVENT_SCHEMA_VERSION || data.thought_id !== thought.id) return
+      if (data.counts_version <= listedVersionRef.current) return
+      setComments(prevComments =>
+        prevComments.some(c => c.id === data.comment.id) ? prevComments : [...prevComments, data.comment]
+      )
     }
 
     socket.on('comment_posted', handleCommentPosted)
@@ -38,7 +46,13 @@ const CommentsModal = ({ thought, currentUser, onClose, onCommentAdded }) => {
   const fetchComments = async () => {
     try {
       const response = await axios.get(`${API_BASE}/thoughts/${thought.id}/comments`)
-      setComments(response.data)
+      const version = Number(response.headers['x-counts-version'] ?? -1)
+      listedVersionRef.current = Math.max(listedVersionRef.current, version)
+      // Keep comments that arrived by event while the list was loading
+      setComments(prevComments => {
+        const listed = new Set(response.data.map(c => c.id))
+        return [...response.data, ...prevComments.filter(c => !listed.has(c.id))]
+      })
     } catch (error) {
       console.error('Error fetching comments:', error)
     } finally {
@@ -3,11 +3,12 @@ import { motion, AnimatePresence } from 'framer-motion'
 import { Search, Heart, MessageCircle, Sparkles, Bookmark, Trash2, ArrowUp } from 'lucide-react'
 import axios from 'axios'
 import { UserContext } from '../context/UserContext'
-import { useSocket } from '../context/SocketContext'
+import { useSocket, useRooms, EVENT_SCHEMA_VERSION } from '../context/SocketContext'
 import LoginPrompt from './LoginPrompt'
 import CommentsModal from './CommentsModal'
 
 const API_BASE = import.meta.env.VITE_API_BASE || 'http://localhost:5001/api'
+const FEED_ROOMS = ['feed']
 
 const Feed = () => {
   const { currentUser, loading: userLoading } = useContext(UserContext)
@@ -18,7 +19,10 @@ const Feed = () => {
   const [selectedThought, setSelectedThought] = useState(null)
   const [showScrollTop, setShowScrollTop] = useState(false)
   const [pendingThoughts, setPendingThoughts] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const scrollContainerRef = useRef(null)
+  const fetchIdRef = useRef(0)
 
   useEffect(() => {
     if (currentUser) {
@@ -31,38 +35,34 @@ const Feed = () => {
     setPendingThoughts([])
   }, [activeTab])
 
+  // New thoughts arrive through the feed room, held for as long as the feed is mounted;
+  // likes and comments through each shown thought's room, which change as the list does
+  useRooms(FEED_ROOMS)
+  useRooms(thoughts.map(t => `thought:${t.id}`))
+
   // Real-time event listeners
   useEffect(() => {
     if (!socket) return
 
+    // Like and comment events carry the thought's counts after the write and their
+    // counts_version (schema v1). Events may arrive late or out of order (coalescing,
+    // other workers), so one only applies if it is newer than what the thought holds
+    const applyEvent = (data, changes = {}) => {
+      if (data.v !== EVENT_SCHEMA_VERSION) return
+      setThoughts(prevThoughts => prevThoughts.map(t => applyCounts(t, data, changes)))
+    }
+
+    // is_liked only follows the current user's own likes (e.g. from another tab)
     const handleThoughtLiked = (data) => {
-      setThoughts(prevThoughts =>
-        prevThoughts.map(t =>
-          t.id === data.thought_id
-            ? { ...t, like_count: data.thought.like_count }  // Only update like count, preserve user's own is_liked state
-            : t
-        )
-      )
+      applyEvent(data, data.actor_id === currentUser?.id ? { is_liked: true } : {})
     }
 
     const handleThoughtUnliked = (data) => {
-      setThoughts(prevThoughts =>
-        prevThoughts.map(t =>
-          t.id === data.thought_id
-            ? { ...t, like_count: data.thought.like_count }  // Only update like count, preserve user's own is_liked state
-            : t
-        )
-      )
+      applyEvent(data, data.actor_id === currentUser?.id ? { is_liked: false } : {})
     }
 
     const handleCommentPosted = (data) => {
-      setThoughts(prevThoughts =>
-        prevThoughts.map(t =>
-          t.id === data.thought_id
-            ? { ...t, comment_count: (t.comment_count || 0) + 1 }
-            : t
-        )
-      )
+      applyEvent(data)
     }
 
     const handleThoughtCreated = (data) => {
@@ -109,35 +109,58 @@ const Feed = () => {
     }
   }, [socket])
 
+  const feedUrl = () => {
+    switch (activeTab) {
+      case 'trending':
+        return `${API_BASE}/thoughts?user_id=${currentUser.id}`
+      case 'news':
+        return `${API_BASE}/thoughts/trending?user_id=${currentUser.id}`
+      case 'following':
+        return `${API_BASE}/thoughts/following?user_id=${currentUser.id}`
+      case 'saved':
+        return `${API_BASE}/users/${currentUser.id}/saved`
+      default:
+        return `${API_BASE}/thoughts?user_id=${currentUser.id}`
+    }
+  }
+
   const fetchThoughts = async () => {
     if (!currentUser) return
 
+    // A newer fetch (e.g. after a tab switch) makes pages still loading for this one stale
+    const fetchId = ++fetchIdRef.current
     setLoading(true)
     try {
-      let url = ''
-      switch (activeTab) {
-        case 'trending':
-          url = `${API_BASE}/thoughts?user_id=${currentUser.id}`
-          break
-        case 'news':
-          url = `${API_BASE}/thoughts/trending?user_id=${currentUser.id}`
-          break
-        case 'following':
-          url = `${API_BASE}/thoughts/following?user_id=${currentUser.id}`
-          break
-        case 'saved':
-          url = `${API_BASE}/users/${currentUser.id}/saved`
-          break
-        default:
-          url = `${API_BASE}/thoughts?user_id=${currentUser.id}`
-      }
-      const response = await axios.get(url)
+      const response = await axios.get(feedUrl())
+      if (fetchId !== fetchIdRef.current) return
       setThoughts(response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
       setPendingThoughts([]) // Clear pending when fetching
     } catch (error) {
       console.error('Error fetching thoughts:', error)
     } finally {
-      setLoading(false)
+      if (fetchId === fetchIdRef.current) setLoading(false)
+    }
+  }
+
+  // Full pages carry the next page's cursor; keep appending until a page comes back without one
+  const fetchMoreThoughts = async () => {
+    if (!nextCursor || loadingMore || loading) return
+
+    const fetchId = fetchIdRef.current
+    setLoadingMore(true)
+    try {
+      const response = await axios.get(feedUrl(), { params: { cursor: nextCursor } })
+      if (fetchId !== fetchIdRef.current) return
+      setNextCursor(response.headers['x-next-cursor'] || null)
+      setThoughts(prevThoughts => {
+        const shown = new Set(prevThoughts.map(t => t.id))
+        return [...prevThoughts, ...response.data.filter(t => !shown.has(t.id))]
+      })
+    } catch (error) {
+      console.error('Error fetching more thoughts:', error)
+    } finally {
+      setLoadingMore(false)
     }
   }
 
@@ -162,21 +185,15 @@ const Feed = () => {
   const handleLike = async (thoughtId, isLiked) => {
     try {
       const endpoint = isLiked ? 'unlike' : 'like'
-      await axios.post(`${API_BASE}/thoughts/${thoughtId}/${endpoint}`, {
+      const response = await axios.post(`${API_BASE}/thoughts/${thoughtId}/${endpoint}`, {
         user_id: currentUser.id
       })
 
-      // Update local state
-      setThoughts(thoughts.map(t => {
-        if (t.id === thoughtId) {
-          return {
-            ...t,
-            is_liked: !isLiked,
-            like_count: isLiked ? t.like_count - 1 : t.like_count + 1
-          }
-        }
-        return t
-      }))
+      // The response is this user's own like state; its counts apply unless an event was newer
+      setThoughts(prevThoughts => prevThoughts.map(t => t.id === thoughtId
+        ? applyCounts({ ...t, is_liked: !isLiked }, { thought_id: thoughtId, ...response.data })
+        : t
+      ))
     } catch (error) {
       console.error('Error toggling like:', error)
     }
@@ -224,9 +241,12 @@ const Feed = () => {
   }
 
   const handleScroll = () => {
-    if (scrollContainerRef.current) {
-      const scrollTop = scrollContainerRef.current.scrollTop
-      setShowScrollTop(scrollTop > 300)
+    const container = scrollContainerRef.current
+    if (container) {
+      setShowScrollTop(container.scrollTop > 300)
+      if (container.scrollHeight - container.scrollTop - container.clientHeight < 400) {
+        fetchMoreThoughts()
+      }
     }
   }
 
@@ -239,14 +259,6 @@ const Feed = () => {
     }
   }
 
-  useEffect(() => {
-    const container = scrollContainerRef.current
-    if (container) {
-      container.addEventListener('scroll', handleScroll)
-      return () => container.removeEventListener('scroll', handleScroll)
-    }
-  }, [])
-
   if (userLoading) {
     return (
       <div className="flex items-center justify-center h-screen">
@@ -332,6 +344,7 @@ const Feed = () => {
       {/* Thoughts Feed - Scrollable */}
       <div
         ref={scrollContainerRef}
+        onScroll={handleScroll}
         className="flex-1 overflow-y-auto space-y-4 p-4 pb-28 scrollbar-hide"
         style={{
           overscrollBehavior: 'contain',
@@ -392,6 +405,16 @@ const Feed = () => {
             ))}
           </AnimatePresence>
         )}
+        {loadingMore && (
+          <div className="flex justify-center py-4">
+            <motion.div
+              animate={{ rotate: 360 }}
+              transition={{ duration: 1, repeat: Infinity, ease: "linear" }}
+            >
+              <Sparkles className="text-accent-blue" size={20} />
+            </motion.div>
+          </div>
+        )}
       </div>
 
       {/* Comments Modal */}
@@ -430,6 +453,21 @@ const Feed = () => {
   )
 }
 
+// Thought with a count snapshot ({thought_id, like_count, comment_count, counts_version})
+// and extra changes applied, unless the thought already holds a snapshot at least as new
+const applyCounts = (thought, data, changes = {}) => {
+  if (thought.id !== data.thought_id || data.counts_version <= (thought.counts_version ?? -1)) {
+    return thought
+  }
+  return {
+    ...thought,
+    ...changes,
+    like_count: data.like_count,
+    comment_count: data.comment_count,
+    counts_version: data.counts_version
+  }
+}
+
 const TabButton = ({ label, isActive, onClick }) => (
   <button
     onClick={onClick}
@@ -15,6 +15,8 @@ const Profile = () => {
   const { getAccessTokenSilently } = useAuth0()
   const [thoughtmates, setThoughtmates] = useState([])
   const [myThoughts, setMyThoughts] = useState([])
+  const [thoughtsCursor, setThoughtsCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [loading, setLoading] = useState(true)
   const [editingBio, setEditingBio] = useState(false)
   const [bio, setBio] = useState('')
@@ -49,6 +51,7 @@ const Profile = () => {
       // Only clear thoughts if they belong to current user
       if (data.user_id === currentUser.id) {
         setMyThoughts([])
+        setThoughtsCursor(null)
       }
     }
 
@@ -69,6 +72,7 @@ const Profile = () => {
       ])
       setThoughtmates(thoughtmatesRes.data)
       setMyThoughts(thoughtsRes.data)
+      setThoughtsCursor(thoughtsRes.headers['x-next-cursor'] || null)
     } catch (error) {
       console.error('Error fetching data:', error)
     } finally {
@@ -76,6 +80,37 @@ const Profile = () => {
     }
   }
 
+  // Thoughts come a page at a time; the next page loads as the list is scrolled to its end
+  const fetchMoreThoughts = async () => {
+    if (!thoughtsCursor || loadingMore) return
+
+    setLoadingMore(true)
+    try {
+      const response = await axios.get(`${API_BASE}/users/${currentUser.id}/thoughts`, {
+        params: { cursor: thoughtsCursor }
+      })
+      setThoughtsCursor(response.headers['x-next-cursor'] || null)
+      setMyThoughts(prevThoughts => {
+        const shown = new Set(prevThoughts.map(t => t.id))
+        return [...prevThoughts, ...response.data.filter(t => !shown.has(t.id))]
+      })
+    } catch (error) {
+      console.error('Error fetching more thoughts:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  const handleContentScroll = (e) => {
+    const container = e.currentTarget
+    if (activeSection === 'thoughts' && container.scrollHeight - container.scrollTop - container.clientHeight < 400) {
+      fetchMoreThoughts()
+    }
+  }
+
+  // Until every page is loaded, the list only holds part of the user's thoughts
+  const totalThoughts = thoughtsCursor ? (currentUser?.thoughts_count || myThoughts.length) : myThoughts.length
+
   const handleSaveBio = async () => {
     try {
       await axios.put(`${API_BASE}/users/${currentUser.id}/bio`, { bio })
@@ -105,7 +140,7 @@ const Profile = () => {
   }
 
   const handleDeleteAllThoughts = async () => {
-    if (!window.confirm(`⚠️ WARNING: This will permanently delete ALL ${myThoughts.length} of your thoughts. This action cannot be undone. Are you absolutely sure?`)) {
+    if (!window.confirm(`⚠️ WARNING: This will permanently delete ALL ${totalThoughts} of your thoughts. This action cannot be undone. Are you absolutely sure?`)) {
       return
     }
 
@@ -121,6 +156,7 @@ const Profile = () => {
 
       // Clear from local state
       setMyThoughts([])
+      setThoughtsCursor(null)
       alert(`Successfully deleted ${response.data.count} thoughts`)
 
       // Switch back to thoughts tab to show empty state
@@ -329,7 +365,7 @@ const Profile = () => {
       {/* Stats */}
       <div className="grid grid-cols-3 gap-4 px-4 mt-6">
         <div className="bg-dark-card rounded-xl p-3 text-center border border-dark-border">
-          <p className="text-2xl font-bold text-accent-blue">{currentUser.thoughts_count || myThoughts.length}</p>
+          <p className="text-2xl font-bold text-accent-blue">{currentUser.thoughts_count || totalThoughts}</p>
           <p className="text-xs text-gray-400 mt-1">Thoughts</p>
         </div>
         <div className="bg-dark-card rounded-xl p-3 text-center border border-dark-border">
@@ -375,7 +411,7 @@ const Profile = () => {
       </div>
 
       {/* Content - Scrollable */}
-      <div className="flex-1 overflow-y-auto px-4 mt-4 pb-28" style={{ overscrollBehavior: 'contain' }}>
+      <div className="flex-1 overflow-y-auto px-4 mt-4 pb-28" style={{ overscrollBehavior: 'contain' }} onScroll={handleContentScroll}>
         {activeSection === 'thoughts' && (
           <div className="space-y-4">
             {myThoughts.length === 0 ? (
@@ -387,6 +423,16 @@ const Profile = () => {
                 <ThoughtItem key={thought.id} thought={thought} onDelete={handleDeleteThought} />
               ))
             )}
+            {loadingMore && (
+              <div className="flex justify-center py-4">
+                <motion.div
+                  animate={{ rotate: 360 }}
+                  transition={{ duration: 1, repeat: Infinity, ease: "linear" }}
+                >
+                  <Sparkles className="text-accent-blue" size={20} />
+                </motion.div>
+              </div>
+            )}
           </div>
         )}
 
@@ -423,7 +469,7 @@ const Profile = () => {
                 </div>
                 <div className="p-3 bg-dark-bg rounded-lg">
                   <p className="text-xs text-gray-400">Total Thoughts</p>
-                  <p className="text-sm font-medium">{myThoughts.length}</p>
+                  <p className="text-sm font-medium">{totalThoughts}</p>
                 </div>
               </div>
             </div>
@@ -443,7 +489,7 @@ const Profile = () => {
                 disabled={myThoughts.length === 0}
               >
                 <Trash2 size={18} />
-                <span className="font-medium">Delete All Thoughts ({myThoughts.length})</span>
+                <span className="font-medium">Delete All Thoughts ({totalThoughts})</span>
               </motion.button>
 
               {myThoughts.length === 0 && (
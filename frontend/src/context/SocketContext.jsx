@@ -1,8 +1,13 @@
-import { createContext, useContext, useEffect, useState } from 'react'
+import { createContext, useCallback, useContext, useEffect, useRef, useState } from 'react'
 import { io } from 'socket.io-client'
+import { useAuth0 } from '@auth0/auth0-react'
+import { UserContext } from './UserContext'
 
 const SocketContext = createContext()
 
+// Version of the delta payloads on like and comment events; others are ignored
+export const EVENT_SCHEMA_VERSION = 1
+
 export const useSocket = () => {
   const context = useContext(SocketContext)
   if (!context) {
@@ -11,11 +16,44 @@ export const useSocket = () => {
   return context
 }
 
+// Keep the socket subscribed to rooms (e.g. 'feed', 'thought:12', 'conversation:3') while mounted.
+// When the list changes only the rooms that entered or left it are (un)subscribed, so a
+// growing feed does not leave and rejoin every room it already holds
+export const useRooms = (rooms) => {
+  const { subscribe, unsubscribe } = useSocket()
+  const held = useRef([])
+  const key = rooms.join(',')
+
+  useEffect(() => {
+    const next = new Set(rooms)
+    const previous = new Set(held.current)
+    const added = [...next].filter(room => !previous.has(room))
+    const removed = held.current.filter(room => !next.has(room))
+    if (added.length) subscribe(added)
+    if (removed.length) unsubscribe(removed)
+    held.current = [...next]
+  }, [key, subscribe, unsubscribe])
+
+  // Release every held room on unmount
+  useEffect(() => () => {
+    if (held.current.length) unsubscribe(held.current)
+    held.current = []
+  }, [unsubscribe])
+}
+
 export const SocketProvider = ({ children }) => {
+  const { getAccessTokenSilently } = useAuth0()
+  const { currentUser } = useContext(UserContext)
   const [socket, setSocket] = useState(null)
   const [connected, setConnected] = useState(false)
+  // Room -> number of mounted components using it; rejoined after every reconnect
+  const roomCounts = useRef(new Map())
+  const socketRef = useRef(null)
 
   useEffect(() => {
+    // The server only accepts authenticated sockets
+    if (!currentUser?.id) return
+
     // Initialize socket connection
     const apiBase = import.meta.env.VITE_API_BASE || 'http://localhost:5001/api'
     const socketUrl = apiBase.replace('/api', '')
@@ -24,12 +62,21 @@ export const SocketProvider = ({ children }) => {
       reconnection: true,
       reconnectionDelay: 1000,
       reconnectionDelayMax: 5000,
-      reconnectionAttempts: 5
+      reconnectionAttempts: 5,
+      auth: (cb) => {
+        getAccessTokenSilently()
+          .then(token => cb({ token }))
+          .catch(() => cb({}))
+      }
     })
 
     newSocket.on('connect', () => {
       console.log('WebSocket connected')
       setConnected(true)
+      const rooms = [...roomCounts.current.keys()]
+      if (rooms.length) {
+        newSocket.emit('subscribe', { rooms })
+      }
     })
 
     newSocket.on('disconnect', () => {
@@ -41,17 +88,51 @@ export const SocketProvider = ({ children }) => {
       console.error('WebSocket connection error:', error)
     })
 
+    socketRef.current = newSocket
     setSocket(newSocket)
 
     // Cleanup on unmount
     return () => {
+      socketRef.current = null
       newSocket.close()
+      setSocket(null)
+      setConnected(false)
+    }
+  }, [currentUser?.id, getAccessTokenSilently])
+
+  const subscribe = useCallback((rooms) => {
+    const added = []
+    for (const room of rooms) {
+      const count = roomCounts.current.get(room) || 0
+      roomCounts.current.set(room, count + 1)
+      if (count === 0) added.push(room)
+    }
+    if (added.length && socketRef.current?.connected) {
+      socketRef.current.emit('subscribe', { rooms: added })
+    }
+  }, [])
+
+  const unsubscribe = useCallback((rooms) => {
+    const removed = []
+    for (const room of rooms) {
+      const count = roomCounts.current.get(room) || 0
+      if (count <= 1) {
+        roomCounts.current.delete(room)
+        if (count === 1) removed.push(room)
+      } else {
+        roomCounts.current.set(room, count - 1)
+      }
+    }
+    if (removed.length && socketRef.current?.connected) {
+      socketRef.current.emit('unsubscribe', { rooms: removed })
     }
   }, [])
 
   const value = {
     socket,
-    connected
+    connected,
+    subscribe,
+    unsubscribe
   }
 
   return (